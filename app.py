@@ -3,21 +3,44 @@ from flask_login import LoginManager
 from flask_mail import Mail
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
+from werkzeug.middleware.proxy_fix import ProxyFix
 import logging
 import os
 from logging.handlers import RotatingFileHandler
 
 from config import config
-from models import db, User
+from models import db
+from utils.mail_queue import MailQueue
+from utils.audit import AuditLogWriter
+from utils.hashing import PasswordHasher, HashingBusyError
+from utils.identity import IdentityCache, load_identity
+from utils.roles import RoleRegistry
+from utils.mfa_store import MFACodeStore
+from utils.rate_limit import RateLimiter
+from utils.sql_inspector import SQLInspector
+from utils.statistics import StatisticsReconciler
 
 def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # Trust X-Forwarded-For only from the configured number of proxies
+    if app.config.get('PROXY_FIX_X_FOR'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+    
     # Initialize extensions
     db.init_app(app)
     migrate = Migrate(app, db)
     mail = Mail(app)
+    mail_queue = MailQueue(app)
+    audit_log = AuditLogWriter(app)
+    password_hasher = PasswordHasher(app)
+    identity_cache = IdentityCache(app)
+    role_registry = RoleRegistry(app)
+    mfa_store = MFACodeStore(app)
+    rate_limiter = RateLimiter(app)
+    sql_inspector = SQLInspector(app)
+    statistics_reconciler = StatisticsReconciler(app)
     csrf = CSRFProtect(app)
     
     # Flask-Login configuration
@@ -29,7 +52,8 @@ def create_app(config_name='default'):
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # One query for the user, role and profile, none on a cache hit
+        return load_identity(int(user_id))
     
     # Logging configuration
     if not app.debug and not app.testing:
@@ -65,10 +89,22 @@ def create_app(config_name='default'):
     from routes.admin import bp as admin_bp
     app.register_blueprint(admin_bp, url_prefix='/admin')
     
+    from routes.exports import bp as exports_bp
+    app.register_blueprint(exports_bp, url_prefix='/export')
+    
+    # Maintenance commands (flask --help)
+    from commands import register_commands
+    register_commands(app)
+    
     @app.errorhandler(404)
     def not_found_error(error):
         return render_template('errors/404.html'), 404
     
+    @app.errorhandler(HashingBusyError)
+    def hashing_busy_error(error):
+        app.logger.warning('Password hashing pool saturated, rejecting request')
+        return render_template('errors/503.html'), 503, {'Retry-After': '5'}
+
     @app.errorhandler(500)
     def internal_error(error):
         db.session.rollback()
@@ -78,8 +114,6 @@ def create_app(config_name='default'):
 
 if __name__ == '__main__':
     app = create_app()
-    with app.app_context():
-        db.create_all()
 
     cert = os.environ.get('SSL_CERT_FILE')
     key = os.environ.get('SSL_KEY_FILE')
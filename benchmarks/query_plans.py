@@ -0,0 +1,194 @@
+"""Query plans and timings of the dashboard queries, without and with indexes.
+
+Generates a large dataset (grades, absences, schedules) in a scratch
+database, then runs the hot query shapes of the dashboards twice: once
+with the composite indexes of ``Grade``, ``Absence`` and ``Schedule``
+dropped and once with them in place. For each query it prints the plan
+reported by the database and the median execution time.
+
+Usage::
+
+    python benchmarks/query_plans.py                       # SQLite file in /tmp
+    python benchmarks/query_plans.py --students 5000 --grades 80
+    python benchmarks/query_plans.py --url mysql+pymysql://user:pw@host/bench_db
+
+The target database is dropped and recreated: never point ``--url`` at
+a database holding real data.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, func, select
+
+from models import db, Absence, Grade, Schedule
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+GRADE_TYPES = ["Test", "Exam", "Homework"]
+BATCH = 10000
+
+
+def composite_indexes():
+    tables = (Grade.__table__, Absence.__table__, Schedule.__table__)
+    return [index for table in tables for index in table.indexes if len(index.columns) > 1]
+
+
+def build(engine, students, teachers, grades_per_student, absences_per_student, class_groups):
+    """Create the schema and fill it with random rows using core bulk inserts."""
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    rng = random.Random(42)
+    start = datetime(2024, 9, 1)
+    t = db.metadata.tables
+
+    with engine.begin() as conn:
+        conn.execute(t["roles"].insert(), [{"id": 1, "name": "student"}, {"id": 2, "name": "teacher"}])
+        users = [
+            {"id": i, "email": f"user{i}@bench.local", "password_hash": "x",
+             "first_name": "F", "last_name": "L",
+             "role_id": 2 if i <= teachers else 1}
+            for i in range(1, teachers + students + 1)
+        ]
+        conn.execute(t["users"].insert(), users)
+        conn.execute(t["teachers"].insert(),
+                     [{"id": i, "user_id": i, "employee_number": f"T{i:05d}",
+                       "department": "Sciences", "hire_date": date(2020, 9, 1)}
+                      for i in range(1, teachers + 1)])
+        conn.execute(t["students"].insert(), [
+            {"id": i, "user_id": teachers + i, "student_number": f"S{i:07d}",
+             "class_name": f"G{i % class_groups}", "enrollment_date": date(2024, 9, 1)}
+            for i in range(1, students + 1)
+        ])
+        conn.execute(t["courses"].insert(), [
+            {"id": i, "name": f"Course {i}", "code": f"C{i:04d}", "teacher_id": i}
+            for i in range(1, teachers + 1)
+        ])
+        conn.execute(t["schedules"].insert(), [
+            {"course_id": rng.randint(1, teachers), "day_of_week": day,
+             "start_time": dtime(8 + slot), "end_time": dtime(9 + slot),
+             "classroom": f"R{slot}", "class_group": f"G{group}"}
+            for group in range(class_groups) for day in DAYS for slot in range(8)
+        ])
+
+    def insert_batches(table, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH:
+                with engine.begin() as conn:
+                    conn.execute(table.insert(), batch)
+                batch = []
+        if batch:
+            with engine.begin() as conn:
+                conn.execute(table.insert(), batch)
+
+    insert_batches(t["grades"], (
+        {"student_id": s, "course_id": c, "teacher_id": c,
+         "grade_value": round(rng.uniform(0, 20), 1), "grade_type": rng.choice(GRADE_TYPES),
+         "date_recorded": start + timedelta(minutes=rng.randint(0, 300 * 24 * 60))}
+        for s in range(1, students + 1)
+        for c in (rng.randint(1, teachers) for _ in range(grades_per_student))
+    ))
+    insert_batches(t["absences"], (
+        {"student_id": s, "teacher_id": rng.randint(1, teachers),
+         "date": date(2024, 9, 1) + timedelta(days=rng.randint(0, 300)),
+         "period": "Morning", "is_justified": False, "created_at": start}
+        for s in range(1, students + 1) for _ in range(absences_per_student)
+    ))
+
+
+def queries(students, teachers):
+    student_id = students // 2
+    teacher_id = teachers // 2
+    return {
+        "student recent grades": select(Grade).where(Grade.student_id == student_id)
+        .order_by(Grade.date_recorded.desc()).limit(5),
+        "student grade history": select(Grade).where(Grade.student_id == student_id)
+        .order_by(Grade.date_recorded.desc()),
+        "student recent absences": select(Absence).where(Absence.student_id == student_id)
+        .order_by(Absence.date.desc()).limit(5),
+        "teacher recent grades": select(Grade).where(Grade.teacher_id == teacher_id)
+        .order_by(Grade.date_recorded.desc()).limit(10),
+        "teacher absence count": select(func.count()).select_from(Absence)
+        .where(Absence.teacher_id == teacher_id),
+        "class schedule": select(Schedule).where(Schedule.class_group == "G1")
+        .order_by(Schedule.day_of_week, Schedule.start_time),
+    }
+
+
+def analyze(engine):
+    """Refresh planner statistics so both runs see the same data."""
+    statement = {"sqlite": "ANALYZE", "postgresql": "ANALYZE"}.get(engine.dialect.name)
+    if statement:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(statement)
+
+
+def explain(conn, stmt):
+    sql = str(stmt.compile(conn.engine, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    return [" | ".join(str(col) for col in row) for row in conn.exec_driver_sql(prefix + sql)]
+
+
+def timed(conn, stmt, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        conn.execute(stmt).fetchall()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def run(engine, label, stmts, repeat):
+    print(f"\n=== {label} ===")
+    results = {}
+    with engine.connect() as conn:
+        for name, stmt in stmts.items():
+            results[name] = timed(conn, stmt, repeat)
+            print(f"\n-- {name}: {results[name]:.3f} ms (median of {repeat})")
+            for line in explain(conn, stmt):
+                print(f"   {line}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="sqlite:////tmp/query_plans.db")
+    parser.add_argument("--students", type=int, default=3000)
+    parser.add_argument("--teachers", type=int, default=60)
+    parser.add_argument("--grades", type=int, default=60, help="grades per student")
+    parser.add_argument("--absences", type=int, default=15, help="absences per student")
+    parser.add_argument("--class-groups", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    started = time.perf_counter()
+    build(engine, args.students, args.teachers, args.grades, args.absences, args.class_groups)
+    print(f"Generated {args.students * args.grades} grades and "
+          f"{args.students * args.absences} absences in {time.perf_counter() - started:.1f} s")
+
+    stmts = queries(args.students, args.teachers)
+    indexes = composite_indexes()
+    for index in indexes:
+        index.drop(engine)
+    analyze(engine)
+    before = run(engine, "without composite indexes", stmts, args.repeat)
+    for index in indexes:
+        index.create(engine)
+    analyze(engine)
+    after = run(engine, "with composite indexes", stmts, args.repeat)
+
+    print("\n=== summary (median ms) ===")
+    for name in stmts:
+        print(f"{name:<26} {before[name]:>9.3f} -> {after[name]:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Maintenance commands available through ``flask <command>``."""
+import time
+from datetime import date
+
+import click
+from flask import current_app
+
+from utils.auth_rollups import archive_auth_logs
+from utils.class_stats import rebuild_class_grade_stats
+from utils.report_cards import compute_report_cards
+from utils.school_generator import generate_school
+from utils.student_stats import rebuild_student_stats
+from utils.statistics import reconcile_statistics
+from utils.terms import term_bounds, term_for
+from utils.user_import import ImportFileError, import_users, read_rows
+
+
+def register_commands(app):
+    app.cli.add_command(archive_auth_logs_command)
+    app.cli.add_command(rebuild_student_stats_command)
+    app.cli.add_command(reconcile_statistics_command)
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(generate_school_command)
+    app.cli.add_command(compute_report_cards_command)
+
+
+@click.command("archive-auth-logs")
+@click.option("--days", type=int, default=None,
+              help="Archive rows older than this many days (AUTH_LOG_RETENTION_DAYS).")
+@click.option("--archive-dir", default=None,
+              help="Directory of the gzipped archives (AUTH_LOG_ARCHIVE_DIR).")
+@click.option("--batch-size", type=int, default=5000, show_default=True)
+def archive_auth_logs_command(days, archive_dir, batch_size):
+    """Move old auth logs to a gzipped archive and prune fine rollups."""
+    config = current_app.config
+    path, moved = archive_auth_logs(
+        days if days is not None else config["AUTH_LOG_RETENTION_DAYS"],
+        archive_dir or config["AUTH_LOG_ARCHIVE_DIR"],
+        batch_size=batch_size,
+        rollup_retention=config["AUTH_ROLLUP_RETENTION_DAYS"],
+    )
+    if moved:
+        click.echo(f"Archived {moved} auth log rows to {path}")
+    else:
+        click.echo("No auth logs to archive")
+
+
+@click.command("rebuild-student-stats")
+def rebuild_student_stats_command():
+    """Recompute student_stats and class_grade_stats from grades and absences."""
+    rows = rebuild_student_stats()
+    click.echo(f"Rebuilt statistics for {rows} students")
+    rows = rebuild_class_grade_stats()
+    click.echo(f"Rebuilt {rows} class grade statistics")
+
+
+@click.command("reconcile-statistics")
+def reconcile_statistics_command():
+    """Recount the tables behind the admin dashboard counters."""
+    drift = reconcile_statistics()
+    if drift:
+        for name, delta in drift.items():
+            click.echo(f"{name}: corrected by {delta:+d}")
+    else:
+        click.echo("Statistics snapshot is up to date")
+
+
+@click.command("import-users")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--dry-run", is_flag=True, help="Validate the file without saving anything.")
+@click.option("--errors", "errors_path", type=click.Path(dir_okay=False), default=None,
+              help="Write the rejected rows to this CSV file.")
+@click.option("--chunk-size", type=int, default=None,
+              help="Rows validated and inserted per batch (USER_IMPORT_CHUNK_SIZE).")
+def import_users_command(path, dry_run, errors_path, chunk_size):
+    """Create users, profiles and parent links from a CSV or XLSX file."""
+    with open(path, "rb") as stream:
+        try:
+            report = import_users(read_rows(stream, path), dry_run=dry_run,
+                                  chunk_size=chunk_size)
+        except ImportFileError as e:
+            raise click.ClickException(str(e))
+
+    verb = "would be created" if dry_run else "created"
+    click.echo(f"{report.rows} rows read, {report.valid} valid, {report.rejected} rejected")
+    for name, count in report.created.items():
+        click.echo(f"  {name}: {count} {verb}")
+    if errors_path and report.errors:
+        with open(errors_path, "w", newline="", encoding="utf-8") as out:
+            report.write_errors(out)
+        click.echo(f"Error report written to {errors_path}")
+    else:
+        for line, email, message in report.errors[:20]:
+            click.echo(f"  line {line} ({email}): {message}")
+
+
+@click.command("generate-school")
+@click.option("--students", type=int, default=1000, show_default=True)
+@click.option("--classes", type=int, default=None,
+              help="Class groups (default: one per 25 students).")
+@click.option("--teachers", type=int, default=None,
+              help="Teachers, one course each (default: one per 6 classes and subject).")
+@click.option("--years", type=int, default=1, show_default=True,
+              help="School years of grades and absences, the current one included.")
+@click.option("--seed", type=int, default=0, show_default=True,
+              help="Same seed, same data; accounts are suffixed with it.")
+@click.option("--batch-size", type=int, default=5000, show_default=True,
+              help="Rows per bulk insert and commit.")
+def generate_school_command(students, classes, teachers, years, seed, batch_size):
+    """Create a reproducible synthetic school for load testing."""
+    try:
+        created = generate_school(students=students, classes=classes, teachers=teachers,
+                                  years=years, seed=seed, batch_size=batch_size,
+                                  progress=click.echo)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for name, count in created.items():
+        click.echo(f"  {name}: {count} created")
+
+
+@click.command("compute-report-cards")
+@click.option("--term", default=None, help="Term id such as 2024-T2 (default: current term).")
+@click.option("--class-group", default=None, help="Only this class group (default: whole school).")
+def compute_report_cards_command(term, class_group):
+    """Compute course averages, weighted averages and ranks of a term."""
+    term = term or term_for(date.today())
+    try:
+        term_bounds(term)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--term")
+    start = time.perf_counter()
+    cards = compute_report_cards(term, class_group)
+    click.echo(f"{cards} report cards for {term} computed in {time.perf_counter() - start:.1f}s")
@@ -30,13 +30,97 @@ class Config:
     MAIL_PASSWORD     = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
 
+    # File d'envoi asynchrone des emails (MFA, réinitialisation). Le dossier
+    # contient des codes MFA et des liens de réinitialisation en clair : il
+    # doit rester privé (créé en 0700) et hors des sauvegardes partagées
+    MAIL_QUEUE_DIR          = os.environ.get('MAIL_QUEUE_DIR', 'mail_spool')
+    MAIL_QUEUE_WORKERS      = int(os.environ.get('MAIL_QUEUE_WORKERS', 2))
+    MAIL_QUEUE_MAX_RETRIES  = int(os.environ.get('MAIL_QUEUE_MAX_RETRIES', 5))
+    MAIL_QUEUE_RETRY_BACKOFF = float(os.environ.get('MAIL_QUEUE_RETRY_BACKOFF', 2.0))
+    MAIL_QUEUE_SYNC         = False
+
     # Sessions
     PERMANENT_SESSION_LIFETIME = timedelta(hours=2)
     WTF_CSRF_TIME_LIMIT        = 3600
 
+    # Codes MFA : stockage 'sql' (partagé entre les workers) ou 'memory' (un seul processus)
+    MFA_CODE_BACKEND   = os.environ.get('MFA_CODE_BACKEND', 'sql')
+    MFA_CODE_TTL       = 120
+    MFA_MAX_ATTEMPTS   = int(os.environ.get('MFA_MAX_ATTEMPTS', 5))
+    MFA_SWEEP_INTERVAL = 60
+
+    # MFA par application d'authentification (TOTP, RFC 6238)
+    TOTP_ISSUER       = 'François Mitterrand Middle School'
+    TOTP_VALID_WINDOW = 1  # pas de 30 s acceptés de part et d'autre
+    # Clé de chiffrement des secrets TOTP en base (SECRET_KEY par défaut).
+    # La changer rend les secrets existants illisibles : les utilisateurs
+    # concernés doivent réactiver leur application.
+    TOTP_ENCRYPTION_KEY = os.environ.get('TOTP_ENCRYPTION_KEY')
+
+    # Limitation du débit des endpoints d'authentification :
+    # (dimension, nombre de requêtes, fenêtre glissante en secondes)
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() in ['true','1','on']
+    # 'sql' partage les compteurs entre les workers ; 'memory' : un seul processus
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND', 'sql')
+    RATELIMIT_RULES   = {
+        'login': [('ip', 20, 60), ('email', 5, 300)],
+        'mfa':   [('ip', 20, 60), ('user', 10, 300)],
+        'reset': [('ip', 5, 300), ('email', 3, 3600)],
+    }
+    # Suppression des compteurs inactifs depuis deux fenêtres (secondes)
+    RATELIMIT_SWEEP_INTERVAL = 300
+
+    # Nombre de reverse proxies de confiance devant l'application (ProxyFix) :
+    # l'IP client est lue dans X-Forwarded-For seulement s'il est > 0
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+
+    # Cache des identités chargées par Flask-Login (secondes, 0 = désactivé).
+    # Le cache est propre à chaque worker : une modification n'est vue par
+    # les autres workers qu'à l'expiration de leur entrée.
+    IDENTITY_CACHE_TTL  = int(os.environ.get('IDENTITY_CACHE_TTL', 10))
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 10000))
+
     # Logs
     LOG_DIRECTORY = 'logs'
 
+    # Trimestres : mois de début (année scolaire commençant en septembre)
+    SCHOOL_TERM_START_MONTHS = (9, 12, 3)
+
+    # Exports CSV/NDJSON : lignes lues par aller-retour du curseur serveur
+    EXPORT_YIELD_PER = 2000
+
+    # Import d'utilisateurs (CSV/XLSX) : lignes validées et insérées par lot
+    USER_IMPORT_CHUNK_SIZE = int(os.environ.get('USER_IMPORT_CHUNK_SIZE', 500))
+
+    # Compteurs du tableau de bord admin (statistics_snapshot) : correction périodique (s)
+    STATS_RECONCILE_INTERVAL = int(os.environ.get('STATS_RECONCILE_INTERVAL', 3600))
+
+    # Instrumentation SQL par requête (détection N+1, budget de requêtes)
+    SQL_INSPECT_ENABLED      = os.environ.get('SQL_INSPECT_ENABLED', 'false').lower() in ['true','1','on']
+    SQL_N_PLUS_ONE_THRESHOLD = 5     # même requête répétée N fois => N+1 probable
+    SQL_QUERY_BUDGET         = None  # budget par défaut (None = illimité)
+    SQL_QUERY_BUDGETS        = {     # budgets par endpoint
+        'parent.dashboard': 6,
+    }
+    SQL_BUDGET_ENFORCE       = False # lever QueryBudgetExceeded au lieu de journaliser
+
+    # Pool de processus pour le hachage des mots de passe
+    PASSWORD_HASH_WORKERS       = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    PASSWORD_HASH_MAX_PENDING   = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 2 * (os.cpu_count() or 2)))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2.0))
+    PASSWORD_HASH_RESULT_TIMEOUT = float(os.environ.get('PASSWORD_HASH_RESULT_TIMEOUT', 30.0))
+    PASSWORD_HASH_INLINE        = False
+
+    # Écriture différée des logs d'authentification (auth_logs)
+    AUDIT_LOG_BATCH_SIZE     = int(os.environ.get('AUDIT_LOG_BATCH_SIZE', 100))
+    AUDIT_LOG_FLUSH_INTERVAL = float(os.environ.get('AUDIT_LOG_FLUSH_INTERVAL', 2.0))
+    AUDIT_LOG_SYNC           = False
+
+    # Rétention des auth_logs : archivage des lignes brutes (flask archive-auth-logs)
+    AUTH_LOG_RETENTION_DAYS    = int(os.environ.get('AUTH_LOG_RETENTION_DAYS', 90))
+    AUTH_LOG_ARCHIVE_DIR       = os.environ.get('AUTH_LOG_ARCHIVE_DIR', 'logs/auth_archive')
+    AUTH_ROLLUP_RETENTION_DAYS = {'minute': 2, 'hour': 90}  # 'day' conservé indéfiniment
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
@@ -47,6 +131,18 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    MAIL_QUEUE_SYNC = True
+    AUDIT_LOG_SYNC = True
+    PASSWORD_HASH_INLINE = True
+    MFA_CODE_BACKEND = 'memory'
+    MFA_SWEEP_INTERVAL = 0
+    STATS_RECONCILE_INTERVAL = 0
+    RATELIMIT_BACKEND = 'memory'
+    RATELIMIT_SWEEP_INTERVAL = 0
+    SQL_INSPECT_ENABLED = True
+    SQL_BUDGET_ENFORCE = True
+    SQL_QUERY_BUDGET = 30
+    MAIL_DEFAULT_SENDER = 'noreply@example.com'
 
 config = {
     'development': DevelopmentConfig,
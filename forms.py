@@ -1,16 +1,23 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import (
+    Form,
+    FieldList,
+    FormField,
     StringField,
     PasswordField,
     BooleanField,
     SubmitField,
     SelectField,
+    SelectMultipleField,
     TextAreaField,
     FloatField,
     DateField,
     IntegerField,
 )
+from wtforms.widgets import CheckboxInput, HiddenInput, ListWidget
 from wtforms.validators import (
+    AnyOf,
     DataRequired,
     Email,
     EqualTo,
@@ -34,8 +41,12 @@ def validate_password_strength(form, field):
         raise ValidationError(
             "Password must contain uppercase, lowercase, digit and symbol."
         )
-from models import User, Role, Student, Teacher
-
+from models import GRADE_TYPES
+from utils.roles import role_choices
+from utils.queries import (
+    class_groups, course_choices_for_teacher, student_choices, user_by_email,
+)
+from utils.gradebook import SORTS, class_groups_for_teacher
 
 class LoginForm(FlaskForm):
     email = StringField("Email", validators=[DataRequired(), Email()])
@@ -53,6 +64,21 @@ class MFAForm(FlaskForm):
     submit = SubmitField("Verify")
 
 
+class TOTPSetupForm(FlaskForm):
+    code = StringField(
+        "Authenticator code", validators=[DataRequired(), Length(min=6, max=6)]
+    )
+    submit = SubmitField("Enable authenticator app")
+
+
+class TOTPDisableForm(FlaskForm):
+    # The current authenticator code or the account password
+    confirmation = PasswordField(
+        "Authenticator code or password", validators=[DataRequired(), Length(max=128)]
+    )
+    submit = SubmitField("Disable authenticator app")
+
+
 class RegisterForm(FlaskForm):
     email = StringField("Email", validators=[DataRequired(), Email()])
     first_name = StringField(
@@ -76,10 +102,10 @@ class RegisterForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(RegisterForm, self).__init__(*args, **kwargs)
-        self.role_id.choices = [(r.id, r.name) for r in Role.query.all()]
+        self.role_id.choices = role_choices()
 
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
+        user = user_by_email(email.data)
         if user is not None:
             raise ValidationError("This email address is already in use.")
 
@@ -104,6 +130,64 @@ class UserForm(FlaskForm):
     submit = SubmitField("Save")
 
 
+class UserImportForm(FlaskForm):
+    file = FileField("CSV or Excel file", validators=[
+        FileRequired(), FileAllowed(["csv", "xlsx"], "CSV or XLSX files only."),
+    ])
+    dry_run = BooleanField("Dry run (validate only, nothing is saved)", default=True)
+    submit = SubmitField("Import")
+
+
+class UserImportRowForm(Form):
+    """One line of a user import file, with the rules of ``UserForm``.
+
+    Profile columns are required according to the role; the password may
+    be left blank, the user then sets one through the reset link.
+    """
+
+    email = StringField("email", validators=[DataRequired(), Email(), Length(max=120)])
+    first_name = StringField("first_name", validators=[DataRequired(), Length(min=2, max=50)])
+    last_name = StringField("last_name", validators=[DataRequired(), Length(min=2, max=50)])
+    phone = StringField("phone", validators=[Optional(), Length(max=20)])
+    address = StringField("address", validators=[Optional(), Length(max=200)])
+    birthdate = DateField("birthdate", validators=[Optional()])
+    password = StringField(
+        "password", validators=[Optional(), Length(min=8), validate_password_strength]
+    )
+    role = StringField("role", validators=[
+        DataRequired(), AnyOf(["student", "teacher", "parent", "admin"]),
+    ])
+    student_number = StringField("student_number", validators=[Optional(), Length(max=20)])
+    class_name = StringField("class_name", validators=[Optional(), Length(max=50)])
+    enrollment_date = DateField("enrollment_date", validators=[Optional()])
+    employee_number = StringField("employee_number", validators=[Optional(), Length(max=20)])
+    department = StringField("department", validators=[Optional(), Length(max=100)])
+    hire_date = DateField("hire_date", validators=[Optional()])
+    position = StringField("position", validators=[Optional(), Length(max=100)])
+    children = StringField("children")  # student numbers separated by ";"
+    relationship_type = StringField("relationship_type", validators=[
+        Optional(), AnyOf(["father", "mother", "guardian", "parent"]),
+    ])
+
+    REQUIRED = {
+        "student": ("student_number", "class_name"),
+        "teacher": ("employee_number", "department"),
+        "admin": ("employee_number",),
+        "parent": (),
+    }
+
+    def validate(self, extra_validators=None):
+        valid = super().validate(extra_validators)
+        for name in self.REQUIRED.get(self.role.data, ()):
+            if not self[name].data:
+                self[name].errors.append(f"Required for the {self.role.data} role.")
+                valid = False
+        return valid
+
+    def child_numbers(self):
+        return [n.strip() for n in (self.children.data or "").split(";") if n.strip()]
+
+
 class GradeForm(FlaskForm):
     student_id = SelectField("Student", coerce=int, validators=[DataRequired()])
     course_id = SelectField("Course", coerce=int, validators=[DataRequired()])
@@ -112,12 +196,7 @@ class GradeForm(FlaskForm):
     )
     grade_type = SelectField(
         "Type",
-        choices=[
-            ("Test", "Test"),
-            ("Exam", "Exam"),
-            ("Homework", "Homework"),
-            ("Participation", "Participation"),
-        ],
+        choices=GRADE_TYPES,
         validators=[DataRequired()],
     )
     comments = TextAreaField("Comments", validators=[Optional()])
@@ -125,11 +204,71 @@ class GradeForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(GradeForm, self).__init__(*args, **kwargs)
-        self.student_id.choices = [
-            (s.id, f"{s.user.first_name} {s.user.last_name}")
-            for s in Student.query.join(User)
+        self.student_id.choices = student_choices()
+
+
+class BulkGradeRowForm(Form):
+    """One student's line of the whole-class grade grid."""
+
+    student_id = IntegerField(widget=HiddenInput(), validators=[DataRequired()])
+    grade_value = FloatField("Grade", validators=[Optional(), NumberRange(min=0, max=20)])
+    comments = StringField("Comments", validators=[Optional(), Length(max=200)])
+
+
+class BulkGradeForm(FlaskForm):
+    """Grades of a whole class group for one course; blank grades are skipped."""
+
+    course_id = SelectField("Course", coerce=int, validators=[DataRequired()])
+    class_group = SelectField("Class", validators=[DataRequired()])
+    grade_type = SelectField("Type", choices=GRADE_TYPES, validators=[DataRequired()])
+    rows = FieldList(FormField(BulkGradeRowForm))
+    submit = SubmitField("Save grades")
+
+    def __init__(self, teacher_id, *args, **kwargs):
+        super(BulkGradeForm, self).__init__(*args, **kwargs)
+        self.course_id.choices = course_choices_for_teacher(teacher_id)
+        self.class_group.choices = [(name, name) for name in class_groups()]
+
+
+class GradebookFilterForm(FlaskForm):
+    """Filters and sort order of the teacher gradebook, read from the query string."""
+
+    class Meta:
+        csrf = False
+
+    course_id = SelectField("Course", coerce=int, validators=[Optional()])
+    class_group = SelectField("Class", validators=[Optional()])
+    grade_type = SelectField("Type", choices=[("", "All types")] + GRADE_TYPES,
+                             validators=[Optional()])
+    date_from = DateField("From", validators=[Optional()])
+    date_to = DateField("To", validators=[Optional()])
+    sort = SelectField("Sort by", choices=[(key, key.capitalize()) for key in SORTS],
+                       default="date")
+    direction = SelectField("Order", choices=[("desc", "Descending"), ("asc", "Ascending")],
+                            default="desc")
+    submit = SubmitField("Filter")
+
+    def __init__(self, teacher_id, *args, **kwargs):
+        super(GradebookFilterForm, self).__init__(*args, **kwargs)
+        self.course_id.choices = [(0, "All courses")] + course_choices_for_teacher(teacher_id)
+        self.class_group.choices = [("", "All classes")] + [
+            (name, name) for name in class_groups_for_teacher(teacher_id)
         ]
 
+    def validate_date_to(self, field):
+        if field.data and self.date_from.data and field.data < self.date_from.data:
+            raise ValidationError("The end date must not be before the start date.")
+
+    def filters(self):
+        """Keyword filters for ``utils.gradebook``."""
+        return {
+            "course_id": self.course_id.data or None,
+            "class_group": self.class_group.data or None,
+            "grade_type": self.grade_type.data or None,
+            "date_from": self.date_from.data,
+            "date_to": self.date_to.data,
+        }
+
 
 class AbsenceForm(FlaskForm):
     student_id = SelectField("Student", coerce=int, validators=[DataRequired()])
@@ -149,9 +288,21 @@ class AbsenceForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(AbsenceForm, self).__init__(*args, **kwargs)
-        self.student_id.choices = [
-            (s.id, f"{s.user.first_name} {s.user.last_name}")
-            for s in Student.query.join(User)
+        self.student_id.choices = student_choices()
+
+
+class RollCallForm(FlaskForm):
+    """Absent students of a class group for one timetable slot."""
+
+    absent = SelectMultipleField("Absent", coerce=int,
+                                 widget=ListWidget(prefix_label=False),
+                                 option_widget=CheckboxInput())
+    submit = SubmitField("Save roll call")
+
+    def __init__(self, students, *args, **kwargs):
+        super(RollCallForm, self).__init__(*args, **kwargs)
+        self.absent.choices = [
+            (s.id, f"{s.user.last_name} {s.user.first_name}") for s in students
         ]
 
 
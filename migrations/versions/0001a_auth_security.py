@@ -0,0 +1,104 @@
+"""mfa code store, rate limit windows, totp and auth log rollups
+
+Revision ID: 0001_auth_security
+Revises: 0001_baseline
+Create Date: 2026-10-18 16:02:11.482910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from utils.auth_rollups import KEY_COLUMNS, rollup_deltas
+from utils.counters import increment_many
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_auth_security'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 5000
+
+
+def upgrade():
+    op.create_table('mfa_codes',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('code_hash', sa.String(length=64), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('mfa_codes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_mfa_codes_expires_at'), ['expires_at'], unique=False)
+
+    op.create_table('rate_limit_windows',
+    sa.Column('key', sa.String(length=191), nullable=False),
+    sa.Column('window_index', sa.BigInteger(), nullable=False),
+    sa.Column('current', sa.Integer(), nullable=False),
+    sa.Column('previous', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_table('auth_log_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(length=6), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('dimension', sa.String(length=5), nullable=False),
+    sa.Column('value', sa.String(length=120), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('failures', sa.Integer(), nullable=False),
+    sa.Column('mfa_failures', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('granularity', 'bucket_start', 'dimension', 'value', name='uq_auth_log_rollups_bucket')
+    )
+    _backfill_rollups()
+
+    # Existing users keep email codes; the server default only fills them in
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('mfa_method', sa.String(length=10), nullable=False, server_default='email'))
+        batch_op.add_column(sa.Column('totp_last_step', sa.BigInteger(), nullable=True))
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('mfa_method', server_default=None)
+
+    with op.batch_alter_table('auth_logs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_auth_logs_email'), ['email'], unique=False)
+        batch_op.create_index(batch_op.f('ix_auth_logs_ip_address'), ['ip_address'], unique=False)
+        batch_op.create_index(batch_op.f('ix_auth_logs_timestamp'), ['timestamp'], unique=False)
+
+
+def _backfill_rollups():
+    """Count the existing auth logs the way the audit writer does"""
+    logs = sa.table('auth_logs', sa.column('id'), sa.column('email'), sa.column('action'),
+                    sa.column('ip_address'), sa.column('timestamp', sa.DateTime()),
+                    sa.column('success', sa.Boolean()))
+    rollups = sa.table('auth_log_rollups', *(sa.column(name) for name in KEY_COLUMNS),
+                       sa.column('attempts'), sa.column('failures'), sa.column('mfa_failures'))
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(logs).where(logs.c.id > last_id).order_by(logs.c.id).limit(BACKFILL_BATCH)
+        ).mappings().all()
+        if not rows:
+            break
+        increment_many(conn, rollups, KEY_COLUMNS, rollup_deltas(rows))
+        last_id = rows[-1]['id']
+
+
+def downgrade():
+    with op.batch_alter_table('auth_logs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_auth_logs_timestamp'))
+        batch_op.drop_index(batch_op.f('ix_auth_logs_ip_address'))
+        batch_op.drop_index(batch_op.f('ix_auth_logs_email'))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('totp_last_step')
+        batch_op.drop_column('mfa_method')
+
+    op.drop_table('auth_log_rollups')
+    op.drop_table('rate_limit_windows')
+    with op.batch_alter_table('mfa_codes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_mfa_codes_expires_at'))
+
+    op.drop_table('mfa_codes')
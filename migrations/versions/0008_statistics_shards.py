@@ -0,0 +1,52 @@
+"""shard statistics_snapshot counters
+
+Revision ID: 0008_statistics_shards
+Revises: 0007_class_grade_stats
+Create Date: 2026-10-18 16:31:07.215406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_statistics_shards'
+down_revision = '0007_class_grade_stats'
+branch_labels = None
+depends_on = None
+
+BACKFILL = """
+    INSERT INTO statistics_snapshot ({columns})
+    SELECT 'total_users', {shard}COUNT(*), CURRENT_TIMESTAMP FROM users
+    UNION ALL SELECT 'total_students', {shard}COUNT(*), CURRENT_TIMESTAMP FROM students
+    UNION ALL SELECT 'total_teachers', {shard}COUNT(*), CURRENT_TIMESTAMP FROM teachers
+    UNION ALL SELECT 'total_parents', {shard}COUNT(*), CURRENT_TIMESTAMP FROM parents
+    UNION ALL SELECT 'total_courses', {shard}COUNT(*), CURRENT_TIMESTAMP FROM courses
+    UNION ALL SELECT 'total_grades', {shard}COUNT(*), CURRENT_TIMESTAMP FROM grades
+    UNION ALL SELECT 'total_absences', {shard}COUNT(*), CURRENT_TIMESTAMP FROM absences
+"""
+
+
+def upgrade():
+    # The primary key changes to (name, shard): recreate the table and
+    # recount, the same as `flask reconcile-statistics`
+    op.drop_table('statistics_snapshot')
+    op.create_table('statistics_snapshot',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name', 'shard')
+    )
+    op.execute(BACKFILL.format(columns='name, shard, value, reconciled_at', shard='0, '))
+
+
+def downgrade():
+    op.drop_table('statistics_snapshot')
+    op.create_table('statistics_snapshot',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.execute(BACKFILL.format(columns='name, value, reconciled_at', shard=''))
@@ -0,0 +1,33 @@
+"""grades.date_recorded not null
+
+Revision ID: 0009_grades_date_not_null
+Revises: 0008_statistics_shards
+Create Date: 2026-10-18 16:52:40.910374
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_grades_date_not_null'
+down_revision = '0008_statistics_shards'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset pagination and term filters skip NULL dates. Grades have no
+    # other timestamp, so undated ones are filed at the migration date.
+    op.execute("UPDATE grades SET date_recorded = CURRENT_TIMESTAMP WHERE date_recorded IS NULL")
+    with op.batch_alter_table('grades', schema=None) as batch_op:
+        batch_op.alter_column('date_recorded',
+               existing_type=sa.DateTime(),
+               nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('grades', schema=None) as batch_op:
+        batch_op.alter_column('date_recorded',
+               existing_type=sa.DateTime(),
+               nullable=True)
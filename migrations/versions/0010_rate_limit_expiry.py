@@ -0,0 +1,32 @@
+"""rate_limit_windows expiry
+
+Revision ID: 0010_rate_limit_expiry
+Revises: 0009_grades_date_not_null
+Create Date: 2026-10-18 18:12:05.337841
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_rate_limit_expiry'
+down_revision = '0009_grades_date_not_null'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows get 0 and go at the first sweep: at worst a key
+    # starts counting again from zero
+    with op.batch_alter_table('rate_limit_windows', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.BigInteger(), nullable=False, server_default='0'))
+    with op.batch_alter_table('rate_limit_windows', schema=None) as batch_op:
+        batch_op.alter_column('expires_at', server_default=None)
+        batch_op.create_index(batch_op.f('ix_rate_limit_windows_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('rate_limit_windows', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_rate_limit_windows_expires_at'))
+        batch_op.drop_column('expires_at')
@@ -0,0 +1,47 @@
+"""users.mfa_secret encrypted
+
+Revision ID: 0011_encrypt_totp_secrets
+Revises: 0010_rate_limit_expiry
+Create Date: 2026-10-18 19:04:11.582310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+from utils import totp
+
+
+# revision identifiers, used by Alembic.
+revision = '0011_encrypt_totp_secrets'
+down_revision = '0010_rate_limit_expiry'
+branch_labels = None
+depends_on = None
+
+
+def _convert(transform):
+    key = totp.encryption_key(current_app.config)
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT id, mfa_secret FROM users WHERE mfa_secret IS NOT NULL")).all()
+    for user_id, secret in rows:
+        conn.execute(sa.text("UPDATE users SET mfa_secret = :secret WHERE id = :id"),
+                     {"secret": transform(secret, key), "id": user_id})
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('mfa_secret',
+               existing_type=sa.String(length=32),
+               type_=sa.String(length=255),
+               existing_nullable=True)
+    _convert(totp.encrypt_secret)
+
+
+def downgrade():
+    _convert(totp.decrypt_secret)
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('mfa_secret',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=32),
+               existing_nullable=True)
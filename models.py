@@ -1,10 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from flask import current_app
-from werkzeug.security import generate_password_hash, check_password_hash
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from datetime import datetime
-import secrets
+
+from utils.hashing import hash_password, verify_password
+from utils.roles import ROLE_MASKS, PERMISSION_BITS, current_role_registry
+from utils.mfa_store import VALID as MFA_VALID, current_mfa_store
+from utils import totp
 
 # Avoid attribute expiration on commit so objects can be accessed
 # outside the session in tests and background tasks
@@ -38,25 +41,82 @@ class User(UserMixin, db.Model):
     last_login = db.Column(db.DateTime)
 
     # MFA
-    mfa_secret = db.Column(db.String(32))
+    # TOTP secret when mfa_method is "totp", encrypted: use ``mfa_secret``
+    _mfa_secret = db.Column("mfa_secret", db.String(255))
     mfa_verified = db.Column(db.Boolean, default=False)
+    mfa_method = db.Column(db.String(10), nullable=False, default="email")
+    totp_last_step = db.Column(db.BigInteger)
 
     # Relations
     role_id = db.Column(db.Integer, db.ForeignKey("roles.id"), nullable=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
     def generate_mfa_code(self):
-        self.mfa_secret = secrets.token_hex(6)
-        db.session.commit()
-        return self.mfa_secret
+        """Issue a one-time code held by the MFA store, not the users row."""
+        return current_mfa_store().issue(self.id)
+
+    def check_mfa_code(self, code):
+        """Return the MFA store status for the given code."""
+        return current_mfa_store().verify(self.id, code)
 
     def verify_mfa_code(self, code):
-        return self.mfa_secret == code
+        return self.check_mfa_code(code) == MFA_VALID
+
+    @property
+    def mfa_secret(self):
+        if self._mfa_secret is None:
+            return None
+        return totp.decrypt_secret(self._mfa_secret, totp.encryption_key(current_app.config))
+
+    @mfa_secret.setter
+    def mfa_secret(self, secret):
+        self._mfa_secret = (None if secret is None else
+                            totp.encrypt_secret(secret, totp.encryption_key(current_app.config)))
+
+    @property
+    def uses_totp(self):
+        return self.mfa_method == "totp" and bool(self._mfa_secret)
+
+    def enable_totp(self, secret, step):
+        self.mfa_secret = secret
+        self.mfa_method = "totp"
+        self.totp_last_step = step
+
+    def disable_totp(self):
+        self.mfa_secret = None
+        self.mfa_method = "email"
+        self.totp_last_step = None
+
+    def verify_totp(self, code):
+        """Check an authenticator code and record its time step."""
+        step = totp.match(
+            self.mfa_secret,
+            code,
+            window=current_app.config.get("TOTP_VALID_WINDOW", 1),
+            last_step=self.totp_last_step,
+        )
+        if step is None:
+            return False
+        # Conditional update so that two concurrent logins cannot both
+        # accept the same code
+        result = db.session.execute(
+            db.update(User)
+            .where(
+                User.id == self.id,
+                db.or_(User.totp_last_step.is_(None), User.totp_last_step < step),
+            )
+            .values(totp_last_step=step)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            return False
+        self.totp_last_step = step
+        return True
 
     def get_reset_token(self, expires_sec=3600):
         s = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
@@ -71,37 +131,45 @@ class User(UserMixin, db.Model):
             return None
         return User.query.get(data.get('user_id'))
 
+    def _role_name(self):
+        registry = current_role_registry()
+        if registry is not None and self.role_id is not None:
+            name = registry.name_for(self.role_id)
+            if name is not None:
+                return name
+        return self.role.name if self.role is not None else None
+
     def has_role(self, role_name):
         """Return True if the user has the given role."""
-        if self.role is not None:
-            return self.role.name == role_name
-        # When the relationship is not loaded, fall back to role_id comparison
-        role = Role.query.get(self.role_id) if self.role_id else None
-        return role.name == role_name if role else False
+        return self._role_name() == role_name
 
     def can(self, permission):
         """Return True if the user's role grants the given permission."""
-        permissions = {
-            "student": ["view_grades", "view_schedule", "view_profile"],
-            "parent": [
-                "view_child_grades",
-                "view_child_schedule",
-                "view_child_absences",
-            ],
-            "teacher": ["add_grades", "mark_absences", "view_classes", "send_messages"],
-            "admin": [
-                "manage_users",
-                "manage_courses",
-                "manage_schedule",
-                "view_dashboard",
-            ],
-        }
-        if self.role is None and self.role_id:
-            role = Role.query.get(self.role_id)
-            role_name = role.name if role else None
-        else:
-            role_name = self.role.name if self.role else None
-        return permission in permissions.get(role_name, [])
+        registry = current_role_registry()
+        if registry is not None and self.role_id is not None:
+            return registry.can(self.role_id, permission)
+        mask = ROLE_MASKS.get(self._role_name(), 0)
+        return bool(mask & PERMISSION_BITS.get(permission, 0))
+
+
+class MFACode(db.Model):
+    __tablename__ = "mfa_codes"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    code_hash = db.Column(db.String(64), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RateLimitWindow(db.Model):
+    __tablename__ = "rate_limit_windows"
+
+    key = db.Column(db.String(191), primary_key=True)
+    window_index = db.Column(db.BigInteger, nullable=False)
+    current = db.Column(db.Integer, nullable=False, default=0)
+    previous = db.Column(db.Integer, nullable=False, default=0)
+    # Epoch seconds after which neither counter counts: the row can go
+    expires_at = db.Column(db.BigInteger, nullable=False, index=True)
 
 
 class Student(db.Model):
@@ -179,15 +247,29 @@ class Course(db.Model):
     schedules = db.relationship("Schedule", backref="course", lazy=True)
 
 
+# (value, label) of the grade types offered by the forms
+GRADE_TYPES = [
+    ("Test", "Test"),
+    ("Exam", "Exam"),
+    ("Homework", "Homework"),
+    ("Participation", "Participation"),
+]
+
+
 class Grade(db.Model):
     __tablename__ = "grades"
+    __table_args__ = (
+        # Student and teacher dashboards: filter by owner, newest first
+        db.Index("ix_grades_student_date", "student_id", "date_recorded"),
+        db.Index("ix_grades_teacher_date", "teacher_id", "date_recorded"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey("courses.id"), nullable=False)
     grade_value = db.Column(db.Float, nullable=False)
-    grade_type = db.Column(db.String(50), nullable=False)  # Test, Exam, Homework
-    date_recorded = db.Column(db.DateTime, default=datetime.utcnow)
+    grade_type = db.Column(db.String(50), nullable=False)  # one of GRADE_TYPES
+    date_recorded = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), nullable=False)
     comments = db.Column(db.Text)
 
@@ -196,6 +278,13 @@ class Grade(db.Model):
 
 class Absence(db.Model):
     __tablename__ = "absences"
+    __table_args__ = (
+        db.Index("ix_absences_student_date", "student_id", "date"),
+        db.Index("ix_absences_teacher_date", "teacher_id", "date"),
+        # One roll-call absence per student, day and timetable slot
+        db.UniqueConstraint("student_id", "date", "schedule_id",
+                            name="uq_absences_student_date_schedule"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
@@ -204,13 +293,134 @@ class Absence(db.Model):
     is_justified = db.Column(db.Boolean, default=False)
     reason = db.Column(db.String(200))
     teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), nullable=False)
+    # Timetable slot of a roll-call absence, NULL when marked individually
+    schedule_id = db.Column(db.Integer, db.ForeignKey("schedules.id", name="fk_absences_schedule_id"))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     teacher = db.relationship("Teacher", backref="absences_marked")
 
 
+class StudentStats(db.Model):
+    """Grade and absence aggregates of one student.
+
+    Maintained by the mapper events of ``utils.student_stats``; rebuild
+    with ``flask rebuild-student-stats``.
+    """
+
+    __tablename__ = "student_stats"
+
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id"), primary_key=True)
+    grade_count = db.Column(db.Integer, nullable=False, default=0)
+    grade_sum = db.Column(db.Float(53), nullable=False, default=0)
+    best_grade = db.Column(db.Float)
+    high_count = db.Column(db.Integer, nullable=False, default=0)
+    low_count = db.Column(db.Integer, nullable=False, default=0)
+    absence_count = db.Column(db.Integer, nullable=False, default=0)
+    unjustified_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def average(self):
+        if not self.grade_count:
+            return 0
+        return round(self.grade_sum / self.grade_count, 1)
+
+    @property
+    def best(self):
+        return round(self.best_grade, 1) if self.grade_count else 0
+
+
+class ClassGradeStats(db.Model):
+    """Grades of one student in one course and grade type, filed under the
+    student's class group.
+
+    The rows of a class group, course and grade type give the class
+    average, minimum, maximum and ranks without reading ``grades``.
+    Maintained by the mapper events of ``utils.class_stats``; rebuild
+    with ``flask rebuild-student-stats``.
+    """
+
+    __tablename__ = "class_grade_stats"
+    __table_args__ = (
+        db.Index("ix_class_grade_stats_class_course_type",
+                 "class_group", "course_id", "grade_type"),
+    )
+
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id"), primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey("courses.id"), primary_key=True)
+    grade_type = db.Column(db.String(50), primary_key=True)
+    class_group = db.Column(db.String(50), nullable=False)
+    grade_count = db.Column(db.Integer, nullable=False, default=0)
+    grade_sum = db.Column(db.Float(53), nullable=False, default=0)
+    min_grade = db.Column(db.Float)
+    max_grade = db.Column(db.Float)
+
+
+class StatisticsSnapshot(db.Model):
+    """Row counts of the main tables for the admin dashboards.
+
+    A count is the sum of its shards. Maintained by the insert/delete
+    events of ``utils.statistics`` and corrected by
+    ``flask reconcile-statistics``.
+    """
+
+    __tablename__ = "statistics_snapshot"
+
+    name = db.Column(db.String(50), primary_key=True)  # total_users, total_grades...
+    shard = db.Column(db.SmallInteger, primary_key=True, autoincrement=False, default=0)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime)
+
+
+class ReportCard(db.Model):
+    """Term results of one student, computed by ``utils.report_cards``.
+
+    Rebuild with ``flask compute-report-cards --term <YYYY-Tn>``.
+    """
+
+    __tablename__ = "report_cards"
+    __table_args__ = (
+        db.UniqueConstraint("term", "student_id", name="uq_report_cards_term_student"),
+        db.Index("ix_report_cards_term_class", "term", "class_group"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(7), nullable=False)  # 2024-T2
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
+    class_group = db.Column(db.String(50), nullable=False)
+    general_average = db.Column(db.Float, nullable=False)  # weighted by course credits
+    credits = db.Column(db.Integer, nullable=False)
+    class_rank = db.Column(db.Integer, nullable=False)
+    class_size = db.Column(db.Integer, nullable=False)
+    percentile = db.Column(db.Float, nullable=False)  # within the class, 100 = best
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ReportCardCourse(db.Model):
+    """Term average of one student in one course, with the class rank."""
+
+    __tablename__ = "report_card_courses"
+    __table_args__ = (
+        db.UniqueConstraint("term", "student_id", "course_id",
+                            name="uq_report_card_courses_term_student_course"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    term = db.Column(db.String(7), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey("courses.id"), nullable=False)
+    average = db.Column(db.Float, nullable=False)
+    grade_count = db.Column(db.Integer, nullable=False)
+    class_rank = db.Column(db.Integer, nullable=False)
+    class_size = db.Column(db.Integer, nullable=False)
+
+    course = db.relationship("Course")
+
+
 class Schedule(db.Model):
     __tablename__ = "schedules"
+    __table_args__ = (
+        db.Index("ix_schedules_class_day_start", "class_group", "day_of_week", "start_time"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey("courses.id"), nullable=False)
@@ -226,14 +436,35 @@ class AuthLog(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
-    email = db.Column(db.String(120), nullable=False)
+    email = db.Column(db.String(120), nullable=False, index=True)
     action = db.Column(
         db.String(50), nullable=False
     )  # login_attempt, login_success, logout
-    ip_address = db.Column(db.String(45))
+    ip_address = db.Column(db.String(45), index=True)
     user_agent = db.Column(db.String(500))
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     success = db.Column(db.Boolean, nullable=False)
     details = db.Column(db.Text)
 
     user = db.relationship("User", backref="auth_logs")
+
+
+class AuthLogRollup(db.Model):
+    """Auth event counters per time bucket and per IP or email."""
+
+    __tablename__ = "auth_log_rollups"
+    __table_args__ = (
+        db.UniqueConstraint(
+            "granularity", "bucket_start", "dimension", "value",
+            name="uq_auth_log_rollups_bucket",
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(6), nullable=False)  # minute, hour, day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    dimension = db.Column(db.String(5), nullable=False)  # ip, email
+    value = db.Column(db.String(120), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    mfa_failures = db.Column(db.Integer, nullable=False, default=0)
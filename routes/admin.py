@@ -1,8 +1,14 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app
 from flask_login import login_required, current_user
-from models import db, User, Student, Parent, Teacher, Administrator, Course, Grade, Absence, Role
-from forms import UserForm, CourseForm
-from utils.admin import create_sample_data
+from models import db, User, Course
+from forms import UserForm, CourseForm, UserImportForm
+from utils.admin import start_sample_data
+from utils.roles import role_choices
+from utils.auth_rollups import security_overview
+from utils import queries
+from utils.statistics import read_snapshot
+from utils import user_import
+from datetime import datetime, timedelta
 
 bp = Blueprint('admin', __name__)
 
@@ -20,19 +26,11 @@ def admin_required(f):
 @admin_required
 def dashboard():
     # Global statistics
-    stats = {
-        'total_users': User.query.count(),
-        'total_students': Student.query.count(),
-        'total_teachers': Teacher.query.count(),
-        'total_parents': Parent.query.count(),
-        'total_courses': Course.query.count(),
-        'total_grades': Grade.query.count(),
-        'total_absences': Absence.query.count()
-    }
+    stats = read_snapshot()
     
     # Latest activity
-    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-    recent_grades = Grade.query.order_by(Grade.date_recorded.desc()).limit(5).all()
+    recent_users = queries.recent_users(5)
+    recent_grades = queries.recent_grades(5)
     
     return render_template('admin/dashboard.html',
                          stats=stats,
@@ -43,19 +41,41 @@ def dashboard():
 @login_required
 @admin_required
 def users():
-    page = request.args.get('page', 1, type=int)
-    users = User.query.paginate(
-        page=page, per_page=20, error_out=False
-    )
+    # Keyset pages; the total comes from the statistics snapshot
+    users = queries.users_page(request.args.get('cursor'),
+                               total=read_snapshot()['total_users'])
     
     return render_template('admin/users.html', users=users)
 
+@bp.route('/users/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_users():
+    """Create users, profiles and parent links from a CSV/XLSX file"""
+    form = UserImportForm()
+    report = None
+
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            rows = user_import.read_rows(upload.stream, upload.filename)
+            report = user_import.import_users(rows, dry_run=form.dry_run.data)
+        except user_import.ImportFileError as e:
+            flash(str(e), 'danger')
+        else:
+            if report.dry_run:
+                flash(f'Dry run: {report.valid} of {report.rows} rows are valid, nothing was saved.', 'info')
+            else:
+                flash(f"{report.created.get('users', 0)} users imported.", 'success')
+
+    return render_template('admin/import_users.html', form=form, report=report)
+
 @bp.route('/user/add', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def add_user():
     form = UserForm()
-    form.role_id.choices = [(r.id, r.name) for r in Role.query.all()]
+    form.role_id.choices = role_choices()
     
     if form.validate_on_submit():
         user = User(
@@ -80,9 +100,9 @@ def add_user():
 @login_required
 @admin_required
 def edit_user(user_id):
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
     form = UserForm(obj=user)
-    form.role_id.choices = [(r.id, r.name) for r in Role.query.all()]
+    form.role_id.choices = role_choices()
     
     if form.validate_on_submit():
         user.email = form.email.data
@@ -105,7 +125,7 @@ def edit_user(user_id):
 @login_required
 @admin_required
 def delete_user(user_id):
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
     
     if user.id == current_user.id:
         flash('You cannot delete your own account!', 'danger')
@@ -121,7 +141,7 @@ def delete_user(user_id):
 @login_required
 @admin_required
 def courses():
-    courses = Course.query.join(Teacher).join(User).all()
+    courses = queries.courses_with_teacher()
     return render_template('admin/courses.html', courses=courses)
 
 @bp.route('/course/add', methods=['GET', 'POST'])
@@ -129,8 +149,7 @@ def courses():
 @admin_required
 def add_course():
     form = CourseForm()
-    form.teacher_id.choices = [(t.id, f"{t.user.first_name} {t.user.last_name}") 
-                              for t in Teacher.query.join(User)]
+    form.teacher_id.choices = queries.teacher_choices()
     
     if form.validate_on_submit():
         course = Course(
@@ -149,15 +168,36 @@ def add_course():
     
     return render_template('admin/add_course.html', form=form)
 
+# Period shown on the security dashboard -> (rollup granularity, length)
+SECURITY_PERIODS = {
+    '1h': ('minute', timedelta(hours=1)),
+    '24h': ('hour', timedelta(hours=24)),
+    '30d': ('day', timedelta(days=30)),
+}
+
+@bp.route('/security')
+@login_required
+@admin_required
+def security():
+    """Authentication activity read from the auth log rollups"""
+    period = request.args.get('period', '24h')
+    if period not in SECURITY_PERIODS:
+        period = '24h'
+    granularity, length = SECURITY_PERIODS[period]
+    overview = security_overview(granularity, datetime.utcnow() - length)
+    return render_template('admin/security.html',
+                         overview=overview,
+                         period=period,
+                         periods=SECURITY_PERIODS)
+
 @bp.route('/init-sample-data')
 @login_required
 @admin_required
 def init_sample_data():
-    """Initialize sample data for testing"""
-    try:
-        create_sample_data()
-        flash('Sample data created successfully!', 'success')
-    except Exception as e:
-        flash(f'Error creating sample data: {str(e)}', 'danger')
+    """Initialize sample data for testing, in the background"""
+    if start_sample_data(current_app._get_current_object()):
+        flash('Sample data is being created in the background, refresh in a minute.', 'info')
+    else:
+        flash('Sample data creation is already running.', 'warning')
     
     return redirect(url_for('admin.dashboard'))
\ No newline at end of file
@@ -1,6 +1,5 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, session, current_app
-from flask_login import login_user, logout_user, current_user
-from flask_mail import Message
+from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.security import generate_password_hash
 import secrets
 from datetime import datetime
@@ -12,8 +11,20 @@ from forms import (
     RegisterForm,
     PasswordResetRequestForm,
     PasswordResetForm,
+    TOTPSetupForm,
+    TOTPDisableForm,
+)
+from utils.security import log_auth_attempt, get_client_ip
+from utils.rate_limit import rate_limit
+from utils import totp, queries
+from utils.mail_queue import enqueue_mail
+from utils.mfa_store import (
+    VALID as MFA_VALID,
+    EXPIRED as MFA_EXPIRED,
+    LOCKED as MFA_LOCKED,
+    INVALID as MFA_INVALID,
+    MISSING as MFA_MISSING,
 )
-from utils.security import log_auth_attempt
 
 bp = Blueprint('auth', __name__)
 
@@ -30,16 +41,26 @@ def login():
     
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
+        retry_after = rate_limit('login', ip=get_client_ip(), email=form.email.data)
+        if retry_after:
+            log_auth_attempt(form.email.data, 'login_throttled', False, details='Rate limit exceeded')
+            return throttled('auth/login.html', form, retry_after)
+
+        user = queries.user_by_email(form.email.data)
         
         if user and user.check_password(form.password.data):
             if user.is_active:
+                session['pre_auth_user_id'] = user.id
+                session.pop('mfa_email_fallback', None)
+
+                if user.uses_totp:
+                    # Authenticator codes are checked locally, no email needed
+                    flash('Enter the code shown in your authenticator app.', 'info')
+                    return redirect(url_for('auth.mfa_verify'))
+
                 # Generate and send the MFA code
                 mfa_code = user.generate_mfa_code()
                 send_mfa_code(user.email, mfa_code)
-                
-                session['pre_auth_user_id'] = user.id
-                session['mfa_code_sent_at'] = datetime.utcnow().timestamp()
                 log_auth_attempt(user.email, 'mfa_code_sent', True, user.id)
                 
                 flash('A verification code has been sent to your email.', 'info')
@@ -60,25 +81,36 @@ def mfa_verify():
     
     form = MFAForm()
     if form.validate_on_submit():
-        user = User.query.get(session['pre_auth_user_id'])
+        retry_after = rate_limit('mfa', ip=get_client_ip(), user=session['pre_auth_user_id'])
+        if retry_after:
+            return throttled('auth/mfa_verify.html', form, retry_after)
 
-        sent_at = session.get('mfa_code_sent_at')
-        if not sent_at or (datetime.utcnow().timestamp() - sent_at) > 120:
-            log_auth_attempt(user.email if user else 'unknown', 'mfa_expired', False,
+        user = queries.user_by_id(session['pre_auth_user_id'])
+        if user and user.uses_totp and not session.get('mfa_email_fallback'):
+            status = MFA_VALID if user.verify_totp(form.code.data) else MFA_INVALID
+        else:
+            status = user.check_mfa_code(form.code.data) if user else MFA_MISSING
+
+        if status in (MFA_EXPIRED, MFA_MISSING, MFA_LOCKED):
+            action = 'mfa_locked' if status == MFA_LOCKED else 'mfa_expired'
+            log_auth_attempt(user.email if user else 'unknown', action, False,
                            user.id if user else None)
             session.pop('pre_auth_user_id', None)
-            session.pop('mfa_code_sent_at', None)
-            flash('The verification code has expired. Please log in again.', 'warning')
+            session.pop('mfa_email_fallback', None)
+            if status == MFA_LOCKED:
+                flash('Too many invalid codes. Please log in again.', 'danger')
+            else:
+                flash('The verification code has expired. Please log in again.', 'warning')
             return redirect(url_for('auth.login'))
 
-        if user and user.verify_mfa_code(form.code.data):
+        if status == MFA_VALID:
             user.mfa_verified = True
             user.last_login = datetime.utcnow()
             db.session.commit()
             
             login_user(user, remember=form.remember_me.data)
             session.pop('pre_auth_user_id', None)
-            session.pop('mfa_code_sent_at', None)
+            session.pop('mfa_email_fallback', None)
             
             log_auth_attempt(user.email, 'login_success', True, user.id)
             flash('Login successful!', 'success')
@@ -86,11 +118,89 @@ def mfa_verify():
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('main.dashboard'))
         else:
-            log_auth_attempt(user.email if user else 'unknown', 'mfa_failed', False,
+            log_auth_attempt(user.email, 'mfa_failed', False,
                            details='Incorrect MFA code')
             flash('Invalid verification code.', 'danger')
     
-    return render_template('auth/mfa_verify.html', form=form)
+    return render_template('auth/mfa_verify.html', form=form, method=mfa_method())
+
+@bp.route('/mfa-email', methods=['POST'])
+def mfa_email_fallback():
+    """Send an email code to a TOTP user who cannot use their app"""
+    if 'pre_auth_user_id' not in session:
+        return redirect(url_for('auth.login'))
+
+    retry_after = rate_limit('mfa', ip=get_client_ip(), user=session['pre_auth_user_id'])
+    if retry_after:
+        flash('Too many attempts. Please wait a moment before trying again.', 'danger')
+        return redirect(url_for('auth.mfa_verify'))
+
+    user = queries.user_by_id(session['pre_auth_user_id'])
+    if user:
+        send_mfa_code(user.email, user.generate_mfa_code())
+        session['mfa_email_fallback'] = True
+        log_auth_attempt(user.email, 'mfa_code_sent', True, user.id, details='Email fallback')
+    flash('A verification code has been sent to your email.', 'info')
+    return redirect(url_for('auth.mfa_verify'))
+
+@bp.route('/totp/setup', methods=['GET', 'POST'])
+@login_required
+def totp_setup():
+    """Enroll the current user in authenticator-app MFA"""
+    if 'totp_pending_secret' not in session:
+        session['totp_pending_secret'] = totp.generate_secret()
+    secret = session['totp_pending_secret']
+
+    form = TOTPSetupForm()
+    if form.validate_on_submit():
+        step = totp.match(secret, form.code.data,
+                          window=current_app.config['TOTP_VALID_WINDOW'])
+        if step is not None:
+            current_user.enable_totp(secret, step)
+            db.session.commit()
+            session.pop('totp_pending_secret', None)
+            log_auth_attempt(current_user.email, 'totp_enabled', True, current_user.id)
+            flash('Authenticator app enabled.', 'success')
+            return redirect(url_for('main.profile'))
+        flash('Invalid code. Check the time on your device and try again.', 'danger')
+
+    uri = totp.provisioning_uri(secret, current_user.email, current_app.config['TOTP_ISSUER'])
+    return render_template('auth/totp_setup.html', form=form, secret=secret, uri=uri)
+
+@bp.route('/totp/disable', methods=['POST'])
+@login_required
+def totp_disable():
+    form = TOTPDisableForm()
+    if not form.validate_on_submit():
+        flash('Enter your authenticator code or your password to disable the app.', 'danger')
+        return redirect(url_for('main.profile'))
+
+    retry_after = rate_limit('mfa', ip=get_client_ip(), user=current_user.id)
+    if retry_after:
+        flash('Too many attempts. Please wait a moment before trying again.', 'danger')
+        return redirect(url_for('main.profile'))
+
+    # A hijacked session alone must not be enough to drop the second factor
+    confirmation = form.confirmation.data
+    is_code = confirmation.isdigit() and len(confirmation) == 6
+    if (is_code and current_user.verify_totp(confirmation)) \
+            or current_user.check_password(confirmation):
+        current_user.disable_totp()
+        db.session.commit()
+        log_auth_attempt(current_user.email, 'totp_disabled', True, current_user.id)
+        flash('Authenticator app disabled. Codes will be sent by email.', 'info')
+    else:
+        log_auth_attempt(current_user.email, 'totp_disable_failed', False, current_user.id,
+                         details='Invalid code or password')
+        flash('Invalid code or password. The authenticator app is still enabled.', 'danger')
+    return redirect(url_for('main.profile'))
+
+def mfa_method():
+    """Second factor expected for the pending login"""
+    if session.get('mfa_email_fallback'):
+        return 'email'
+    user = queries.user_by_id(session['pre_auth_user_id'])
+    return 'totp' if user and user.uses_totp else 'email'
 
 @bp.route('/logout')
 def logout():
@@ -131,7 +241,11 @@ def reset_request():
 
     form = PasswordResetRequestForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
+        retry_after = rate_limit('reset', ip=get_client_ip(), email=form.email.data)
+        if retry_after:
+            return throttled('auth/reset_request.html', form, retry_after)
+
+        user = queries.user_by_email(form.email.data)
         if user:
             send_password_reset_email(user)
         flash('If an account exists for that email, a reset link has been sent.', 'info')
@@ -157,13 +271,17 @@ def reset_password(token):
         return redirect(url_for('auth.login'))
     return render_template('auth/reset_password.html', form=form)
 
+def throttled(template, form, retry_after):
+    """Render the form again with a 429 status when a rate limit is hit"""
+    flash('Too many attempts. Please wait a moment before trying again.', 'danger')
+    return render_template(template, form=form), 429, {'Retry-After': str(retry_after)}
+
 def send_mfa_code(email, code):
-    """Send the MFA code via email"""
-    try:
-        msg = Message(
-            subject='Verification code - François Mitterrand Middle School',
-            recipients=[email],
-            body=f'''
+    """Queue the MFA code email for background delivery"""
+    return enqueue_mail(
+        subject='Verification code - François Mitterrand Middle School',
+        recipients=[email],
+        body=f'''
 Hello,
 
 Your verification code to access the François Mitterrand Middle School intranet is: {code}
@@ -175,27 +293,17 @@ If you did not request this code, please ignore this message.
 Regards,
 The François Mitterrand Middle School intranet team
             '''
-        )
-        mail = current_app.extensions.get('mail')
-        if not mail:
-            current_app.logger.error('Flask-Mail not initialized')
-            return False
-        mail.send(msg)
-        return True
-    except Exception as e:
-        current_app.logger.error(f"Error sending MFA email: {e}")
-        return False
+    )
 
 
 def send_password_reset_email(user):
-    """Send a password reset email"""
-    try:
-        token = user.get_reset_token()
-        reset_url = url_for('auth.reset_password', token=token, _external=True)
-        msg = Message(
-            subject='Password reset - François Mitterrand Middle School',
-            recipients=[user.email],
-            body=f'''
+    """Queue a password reset email for background delivery"""
+    token = user.get_reset_token()
+    reset_url = url_for('auth.reset_password', token=token, _external=True)
+    return enqueue_mail(
+        subject='Password reset - François Mitterrand Middle School',
+        recipients=[user.email],
+        body=f'''
 Hello,
 
 To reset your password, click the link below:
@@ -208,13 +316,4 @@ If you did not request this, please ignore this email.
 Regards,
 The François Mitterrand Middle School intranet team
             '''
-        )
-        mail = current_app.extensions.get('mail')
-        if not mail:
-            current_app.logger.error('Flask-Mail not initialized')
-            return False
-        mail.send(msg)
-        return True
-    except Exception as e:
-        current_app.logger.error(f"Error sending reset email: {e}")
-        return False
\ No newline at end of file
+    )
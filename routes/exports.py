@@ -0,0 +1,49 @@
+from flask import Blueprint, Response, abort, redirect, request, stream_with_context, url_for
+from flask_login import login_required, current_user
+from utils.exports import FORMATS, absences_export, grades_export, stream_export
+from datetime import date
+
+bp = Blueprint('exports', __name__)
+
+EXPORTS = {'grades': grades_export, 'absences': absences_export}
+
+def staff_required(f):
+    """Decorator for the exports: administrators and teachers only"""
+    def decorated_function(*args, **kwargs):
+        if not (current_user.has_role('admin') or current_user.has_role('teacher')):
+            return redirect(url_for('main.dashboard'))
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+@bp.route('/<kind>.<fmt>')
+@login_required
+@staff_required
+def export(kind, fmt):
+    if kind not in EXPORTS or fmt not in FORMATS:
+        abort(404)
+
+    # Teachers only export the rows they recorded, admins the whole school
+    teacher_id = None
+    if not current_user.has_role('admin'):
+        if current_user.teacher_profile is None:
+            abort(403)
+        teacher_id = current_user.teacher_profile.id
+
+    try:
+        stmt = EXPORTS[kind](teacher_id=teacher_id,
+                             course_id=request.args.get('course_id', type=int),
+                             class_group=request.args.get('class_group') or None,
+                             term=request.args.get('term') or None)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    compress = request.args.get('gzip') == '1'
+    filename = f"{kind}-{request.args.get('term') or date.today().isoformat()}.{fmt}"
+    if compress:
+        filename += '.gz'
+    body = stream_with_context(stream_export(stmt, fmt, compress))
+    return Response(body,
+                    mimetype='application/gzip' if compress else FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Accel-Buffering': 'no'})
@@ -1,15 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
-from models import (
-    User,
-    Student,
-    Parent,
-    ParentStudent,
-    Teacher,
-    Administrator,
-    Course,
-    Grade,
-)
+from utils import queries
+from utils.statistics import read_snapshot
 
 bp = Blueprint("main", __name__)
 
@@ -59,29 +51,15 @@ def profile():
         if parent is None:
             flash("Your parent profile is not configured yet.", "warning")
             return redirect(url_for("main.dashboard"))
-        children = (
-            Student.query.join(ParentStudent)
-            .filter(ParentStudent.parent_id == parent.id)
-            .all()
-        )
-        context["children"] = children
+        context["children"] = queries.children_of_parent(parent.id)
     elif role == "teacher":
         teacher = current_user.teacher_profile
         if teacher is None:
             flash("Your teacher profile is not configured yet.", "warning")
             return redirect(url_for("main.dashboard"))
-        courses = Course.query.filter_by(teacher_id=teacher.id).all()
         context["teacher"] = teacher
-        context["courses"] = courses
+        context["courses"] = queries.courses_for_teacher(teacher.id)
     elif role == "admin":
-        stats = {
-            "total_users": User.query.count(),
-            "total_students": Student.query.count(),
-            "total_teachers": Teacher.query.count(),
-            "total_parents": Parent.query.count(),
-            "total_courses": Course.query.count(),
-            "total_grades": Grade.query.count(),
-        }
-        context["stats"] = stats
+        context["stats"] = read_snapshot()
 
     return render_template("main/profile.html", **context)
@@ -1,6 +1,11 @@
-from flask import Blueprint, render_template, redirect, url_for, request
+from flask import Blueprint, render_template, redirect, url_for, request, abort
 from flask_login import login_required, current_user
-from models import Grade, Absence, Schedule, Course, Student, ParentStudent
+from utils import queries
+from utils.student_stats import stats_for
+from utils.grade_stats import GradeSummary
+from utils.class_stats import class_positions
+from utils.report_cards import report_card_for, report_card_terms
+from utils.family import load_family
 
 bp = Blueprint('parent', __name__)
 
@@ -19,48 +24,10 @@ def parent_required(f):
 def dashboard():
     parent = current_user.parent_profile
     
-    # Retrieve the parent's children
-    children = Student.query.join(ParentStudent)\
-                           .filter(ParentStudent.parent_id == parent.id).all()
-    
-    # Statistiques pour chaque enfant
-    children_data = []
-    grade_values = []
-    total_absences = 0
-    for child in children:
-        recent_grades = Grade.query.filter_by(student_id=child.id)\
-                                  .order_by(Grade.date_recorded.desc())\
-                                  .limit(3).all()
-
-        recent_absences = Absence.query.filter_by(student_id=child.id)\
-                                      .order_by(Absence.date.desc())\
-                                      .limit(3).all()
-
-        all_grades = Grade.query.filter_by(student_id=child.id).all()
-        values = [g.grade_value for g in all_grades]
-        avg_grade = round(sum(values) / len(values), 1) if values else 0
-
-        absence_count = Absence.query.filter_by(student_id=child.id).count()
-
-        children_data.append({
-            'student': child,
-            'recent_grades': recent_grades,
-            'recent_absences': recent_absences,
-            'average_grade': avg_grade,
-            'total_grades': len(all_grades),
-            'total_absences': absence_count
-        })
-
-        # Collect global stats
-        grade_values.extend(values)
-        total_absences += absence_count
-
-    global_average = round(sum(grade_values) / len(grade_values), 1) if grade_values else 0
+    # Children, latest grades/absences and totals in a fixed number of queries
+    family = load_family(parent.id)
 
-    return render_template('parent/dashboard.html',
-                           children_data=children_data,
-                           global_average=global_average,
-                           total_absences=total_absences)
+    return render_template('parent/dashboard.html', **family)
 
 @bp.route('/child/<int:student_id>/grades')
 @login_required
@@ -68,40 +35,38 @@ def dashboard():
 def child_grades(student_id):
     # Ensure the child actually belongs to the parent
     parent = current_user.parent_profile
-    child = Student.query.join(ParentStudent)\
-                        .filter(ParentStudent.parent_id == parent.id,
-                               Student.id == student_id).first_or_404()
+    child = queries.child_of_parent(parent.id, student_id) or abort(404)
     
-    grades = Grade.query.filter_by(student_id=student_id)\
-                       .join(Course)\
-                       .order_by(Grade.date_recorded.desc()).all()
+    grades = queries.grades_for_student(student_id)
 
-    if grades:
-        values = [g.grade_value for g in grades]
-        average = round(sum(values) / len(values), 1)
-        best = round(max(values), 1)
-        high_count = len([v for v in values if v >= 16])
-        low_count = len([v for v in values if v <= 10])
-    else:
-        average = best = 0
-        high_count = low_count = 0
+    summary = GradeSummary.from_stats(stats_for(student_id))
+    positions = class_positions(student_id, child.class_name)
 
     return render_template('parent/child_grades.html', child=child, grades=grades,
-                           average=average, best=best,
-                           high_count=high_count, low_count=low_count)
+                           summary=summary, positions=positions)
+
+@bp.route('/child/<int:student_id>/report-card')
+@login_required
+@parent_required
+def child_report_card(student_id):
+    parent = current_user.parent_profile
+    child = queries.child_of_parent(parent.id, student_id) or abort(404)
+
+    terms = report_card_terms(student_id)
+    term = request.args.get('term') if request.args.get('term') in terms else next(iter(terms), None)
+    card, lines = report_card_for(student_id, term) if term else (None, [])
+
+    return render_template('parent/child_report_card.html', child=child, card=card,
+                           lines=lines, terms=terms, term=term)
 
 @bp.route('/child/<int:student_id>/schedule')
 @login_required
 @parent_required
 def child_schedule(student_id):
     parent = current_user.parent_profile
-    child = Student.query.join(ParentStudent)\
-                        .filter(ParentStudent.parent_id == parent.id,
-                               Student.id == student_id).first_or_404()
+    child = queries.child_of_parent(parent.id, student_id) or abort(404)
     
-    schedules = Schedule.query.join(Course)\
-                             .filter(Schedule.class_group == child.class_name)\
-                             .order_by(Schedule.day_of_week, Schedule.start_time).all()
+    schedules = queries.schedule_for_class(child.class_name)
 
     day_map = {
         'Monday': 1, 'Tuesday': 2, 'Wednesday': 3,
@@ -125,11 +90,9 @@ def child_schedule(student_id):
 @parent_required
 def child_absences(student_id):
     parent = current_user.parent_profile
-    child = Student.query.join(ParentStudent)\
-                        .filter(ParentStudent.parent_id == parent.id,
-                               Student.id == student_id).first_or_404()
+    child = queries.child_of_parent(parent.id, student_id) or abort(404)
     
-    absences = Absence.query.filter_by(student_id=student_id)\
-                           .order_by(Absence.date.desc()).all()
+    absences = queries.absences_for_student(student_id, request.args.get('cursor'),
+                                            total=stats_for(student_id).absence_count)
     
     return render_template('parent/child_absences.html', child=child, absences=absences)
\ No newline at end of file
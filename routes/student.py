@@ -1,6 +1,10 @@
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
-from models import Grade, Absence, Schedule, Course
+from utils import queries
+from utils.student_stats import stats_for
+from utils.grade_stats import GradeSummary
+from utils.class_stats import class_positions
+from utils.report_cards import report_card_for, report_card_terms
 
 bp = Blueprint('student', __name__)
 
@@ -23,49 +27,47 @@ def dashboard():
     student = current_user.student_profile
     
     # Retrieve latest grades
-    recent_grades = Grade.query.filter_by(student_id=student.id)\
-                              .order_by(Grade.date_recorded.desc())\
-                              .limit(5).all()
+    recent_grades = queries.recent_grades_for_student(student.id, 5)
     
     # Retrieve recent absences
-    recent_absences = Absence.query.filter_by(student_id=student.id)\
-                                  .order_by(Absence.date.desc())\
-                                  .limit(5).all()
+    recent_absences = queries.recent_absences_for_student(student.id, 5)
     
-    # Statistiques
-    total_grades = Grade.query.filter_by(student_id=student.id).count()
-    total_absences = Absence.query.filter_by(student_id=student.id).count()
+    # Statistiques (student_stats)
+    stats = stats_for(student.id)
     
     return render_template('student/dashboard.html',
                          student=student,
                          recent_grades=recent_grades,
                          recent_absences=recent_absences,
-                         total_grades=total_grades,
-                         total_absences=total_absences)
+                         total_grades=stats.grade_count,
+                         total_absences=stats.absence_count)
 
 @bp.route('/grades')
 @login_required
 @student_required
 def grades():
     student = current_user.student_profile
-    grades = Grade.query.filter_by(student_id=student.id)\
-                       .join(Course)\
-                       .order_by(Grade.date_recorded.desc()).all()
+    grades = queries.grades_for_student(student.id)
 
-    # Basic statistics for UI summary
-    if grades:
-        values = [g.grade_value for g in grades]
-        average = round(sum(values) / len(values), 1)
-        best = round(max(values), 1)
-        high_count = len([v for v in values if v >= 16])
-        low_count = len([v for v in values if v <= 10])
-    else:
-        average = best = 0
-        high_count = low_count = 0
+    # Summary read from student_stats
+    summary = GradeSummary.from_stats(stats_for(student.id))
+    # Class average, min, max and rank per course and grade type
+    positions = class_positions(student.id, student.class_name)
 
-    return render_template('student/grades.html', grades=grades,
-                           average=average, best=best,
-                           high_count=high_count, low_count=low_count)
+    return render_template('student/grades.html', grades=grades, summary=summary,
+                           positions=positions)
+
+@bp.route('/report-card')
+@login_required
+@student_required
+def report_card():
+    student = current_user.student_profile
+    terms = report_card_terms(student.id)
+    term = request.args.get('term') if request.args.get('term') in terms else next(iter(terms), None)
+    card, lines = report_card_for(student.id, term) if term else (None, [])
+
+    return render_template('student/report_card.html', card=card, lines=lines,
+                           terms=terms, term=term)
 
 @bp.route('/schedule')
 @login_required
@@ -74,9 +76,7 @@ def schedule():
     student = current_user.student_profile
 
     # Get the schedule for the student's class
-    schedules = Schedule.query.join(Course)\
-                             .filter(Schedule.class_group == student.class_name)\
-                             .order_by(Schedule.day_of_week, Schedule.start_time).all()
+    schedules = queries.schedule_for_class(student.class_name)
 
     # Convert schedule objects to a format usable by the calendar
     day_map = {
@@ -101,7 +101,7 @@ def schedule():
 @student_required
 def absences():
     student = current_user.student_profile
-    absences = Absence.query.filter_by(student_id=student.id)\
-                           .order_by(Absence.date.desc()).all()
+    absences = queries.absences_for_student(student.id, request.args.get('cursor'),
+                                            total=stats_for(student.id).absence_count)
     
     return render_template('student/absences.html', absences=absences)
\ No newline at end of file
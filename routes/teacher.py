@@ -1,7 +1,12 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask import Blueprint, render_template, redirect, url_for, request, flash, abort
 from flask_login import login_required, current_user
-from models import db, Grade, Absence, Course, Student
-from forms import GradeForm, AbsenceForm
+from models import db, Grade, Absence
+from forms import GradeForm, AbsenceForm, GradebookFilterForm, BulkGradeForm, RollCallForm
+from utils import queries
+from utils.gradebook import SORTS, gradebook_page, gradebook_summary
+from utils.bulk import insert_grades
+from utils.roll_call import WEEKDAYS, recorded_absentees, record_roll_call, slot_date
+from datetime import date, timedelta
 
 bp = Blueprint('teacher', __name__)
 
@@ -21,28 +26,22 @@ def dashboard():
     teacher = current_user.teacher_profile
     
     # Retrieve the teacher's courses
-    courses = Course.query.filter_by(teacher_id=teacher.id).all()
+    courses = queries.courses_for_teacher(teacher.id)
     
-    # Statistiques
-    total_students = Student.query.join(Grade)\
-                                 .filter(Grade.teacher_id == teacher.id)\
-                                 .distinct().count()
-    total_grades = Grade.query.filter_by(teacher_id=teacher.id).count()
-    total_absences = Absence.query.filter_by(teacher_id=teacher.id).count()
+    # Statistiques (total_students, total_grades, total_absences)
+    counts = queries.teacher_counts(teacher.id)
     
     return render_template('teacher/dashboard.html',
                          teacher=teacher,
                          courses=courses,
-                         total_students=total_students,
-                         total_grades=total_grades,
-                         total_absences=total_absences)
+                         **counts)
 
 @bp.route('/courses')
 @login_required
 @teacher_required
 def courses():
     teacher = current_user.teacher_profile
-    courses = Course.query.filter_by(teacher_id=teacher.id).all()
+    courses = queries.courses_for_teacher(teacher.id)
     
     return render_template('teacher/courses.html', courses=courses)
 
@@ -51,12 +50,10 @@ def courses():
 @teacher_required
 def course_students(course_id):
     teacher = current_user.teacher_profile
-    course = Course.query.filter_by(id=course_id, teacher_id=teacher.id).first_or_404()
+    course = queries.course_for_teacher(course_id, teacher.id) or abort(404)
     
     # Retrieve students who have grades in this course
-    students = Student.query.join(Grade)\
-                           .filter(Grade.course_id == course_id)\
-                           .distinct().all()
+    students = queries.students_in_course(course_id)
     
     return render_template('teacher/course_students.html', course=course, students=students)
 
@@ -68,7 +65,7 @@ def add_grade():
     form = GradeForm()
     
     # Populer les choix de cours avec ceux du professeur
-    form.course_id.choices = [(c.id, c.name) for c in Course.query.filter_by(teacher_id=teacher.id)]
+    form.course_id.choices = queries.course_choices_for_teacher(teacher.id)
     
     if form.validate_on_submit():
         grade = Grade(
@@ -88,6 +85,98 @@ def add_grade():
     
     return render_template('teacher/add_grade.html', form=form)
 
+@bp.route('/grades/bulk', methods=['GET', 'POST'])
+@login_required
+@teacher_required
+def bulk_grades():
+    """Grade a whole class group for one course in a single submission"""
+    teacher = current_user.teacher_profile
+    form = BulkGradeForm(teacher.id,
+                         course_id=request.args.get('course_id', type=int),
+                         class_group=request.args.get('class_group'))
+
+    # The grid is shown once a course of the teacher and a class are picked
+    selected = (form.course_id.data in dict(form.course_id.choices)
+                and form.class_group.data in dict(form.class_group.choices))
+    students = {}
+    if selected:
+        students = {s.id: s for s in queries.students_in_class(form.class_group.data)}
+    if request.method == 'GET':
+        for student_id in students:
+            form.rows.append_entry({'student_id': student_id})
+
+    if selected and form.validate_on_submit():
+        rows, seen, valid = [], set(), True
+        for row in form.rows:
+            student_id = row.student_id.data
+            if student_id not in students or student_id in seen:
+                row.grade_value.errors.append('This student is not in the selected class.')
+                valid = False
+            elif row.grade_value.data is not None:
+                rows.append({
+                    'student_id': student_id,
+                    'course_id': form.course_id.data,
+                    'teacher_id': teacher.id,
+                    'grade_value': row.grade_value.data,
+                    'grade_type': form.grade_type.data,
+                    'comments': row.comments.data or None,
+                })
+            seen.add(student_id)
+
+        if valid and rows:
+            # All rows in one INSERT, nothing written if any row is invalid
+            count = insert_grades(rows)
+            db.session.commit()
+            flash(f'{count} grades saved successfully!', 'success')
+            return redirect(url_for('teacher.grades', course_id=form.course_id.data,
+                                    class_group=form.class_group.data))
+        if valid:
+            flash('Enter at least one grade.', 'warning')
+        else:
+            flash('Some grades are invalid, nothing was saved.', 'danger')
+    elif request.method == 'POST':
+        flash('Some grades are invalid, nothing was saved.', 'danger')
+
+    return render_template('teacher/bulk_grades.html', form=form, students=students,
+                           selected=selected)
+
+@bp.route('/roll-call')
+@login_required
+@teacher_required
+def roll_calls():
+    """Weekly slots of the teacher's courses, with their latest occurrence"""
+    teacher = current_user.teacher_profile
+    slots = sorted(queries.schedule_for_teacher(teacher.id),
+                   key=lambda s: WEEKDAYS.index(s.day_of_week))
+    return render_template('teacher/roll_calls.html',
+                           slots=[(slot, slot_date(slot)) for slot in slots])
+
+@bp.route('/roll-call/<int:schedule_id>', methods=['GET', 'POST'])
+@login_required
+@teacher_required
+def roll_call(schedule_id):
+    """Tick the absent students of a slot's class group"""
+    teacher = current_user.teacher_profile
+    slot = queries.slot_for_teacher(schedule_id, teacher.id) or abort(404)
+    try:
+        requested = date.fromisoformat(request.args.get('date', ''))
+    except ValueError:
+        requested = None
+    day = slot_date(slot, requested)
+
+    students = queries.students_in_class(slot.class_group)
+    recorded = recorded_absentees(slot.id, day)
+    form = RollCallForm(students)
+
+    if form.validate_on_submit():
+        count = record_roll_call(slot, day, form.absent.data, teacher.id)
+        db.session.commit()
+        flash(f'Roll call saved: {count} new absence(s).', 'success')
+        return redirect(url_for('teacher.roll_call', schedule_id=slot.id, date=day.isoformat()))
+
+    return render_template('teacher/roll_call.html', form=form, slot=slot, day=day,
+                           recorded=recorded, previous_week=day - timedelta(days=7))
+
 @bp.route('/mark-absence', methods=['GET', 'POST'])
 @login_required
 @teacher_required
@@ -118,24 +207,28 @@ def mark_absence():
 @teacher_required
 def grades():
     teacher = current_user.teacher_profile
-    grades = Grade.query.filter_by(teacher_id=teacher.id)\
-                       .join(Course)\
-                       .join(Student)\
-                       .order_by(Grade.date_recorded.desc()).all()
-
-    if grades:
-        values = [g.grade_value for g in grades]
-        average = round(sum(values) / len(values), 1)
-        best = round(max(values), 1)
-        high_count = len([v for v in values if v >= 16])
-        low_count = len([v for v in values if v <= 10])
-    else:
-        average = best = 0
-        high_count = low_count = 0
-
-    return render_template('teacher/grades.html', grades=grades,
-                           average=average, best=best,
-                           high_count=high_count, low_count=low_count)
+    form = GradebookFilterForm(teacher.id, formdata=request.args)
+    # Invalid filters (tampered query string) fall back to the whole gradebook
+    filters = form.filters() if form.validate() else {}
+    descending = form.direction.data != 'asc'
+
+    # Summary over the filtered grades in SQL, rows one keyset page at a time
+    summary = gradebook_summary(teacher.id, filters)
+    grades = gradebook_page(teacher.id, filters, form.sort.data, descending,
+                            request.args.get('cursor'), total=summary.count)
+
+    # Column headers: sort by the column, toggling the order of the current one
+    args = {k: v for k, v in request.args.items() if k != 'cursor'}
+    sort_urls = {
+        key: url_for('teacher.grades', **dict(
+            args, sort=key,
+            direction='asc' if key == form.sort.data and descending else 'desc'))
+        for key in SORTS
+    }
+
+    return render_template('teacher/grades.html', grades=grades, form=form,
+                           sort_urls=sort_urls, sort=form.sort.data, descending=descending,
+                           summary=summary)
 
 
 @bp.route('/absences')
@@ -143,7 +236,5 @@ def grades():
 @teacher_required
 def absences():
     teacher = current_user.teacher_profile
-    absences = Absence.query.filter_by(teacher_id=teacher.id)\
-                            .join(Student)\
-                            .order_by(Absence.date.desc()).all()
+    absences = queries.absences_for_teacher(teacher.id, request.args.get('cursor'))
     return render_template('teacher/absences.html', absences=absences)
@@ -0,0 +1,96 @@
+import os
+import sys
+from contextlib import contextmanager
+from datetime import date
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import event
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from models import db, User, Role, Student, Teacher, Course
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'school(teachers=1, courses=..., classes=..., last_names=None): '
+                   'shape of the school fixture')
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        db.create_all()
+        for name in ('student', 'parent', 'teacher', 'admin'):
+            db.session.add(Role(name=name, description=name))
+        db.session.commit()
+        app.extensions['role_registry'].reload()
+        yield app
+        db.drop_all()
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_execute)
+
+def make_user(email, role, last_name='Test'):
+    user = User(email=email, first_name=email.split('@')[0], last_name=last_name,
+                role_id=Role.query.filter_by(name=role).one().id, password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+def login(client, user):
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user.id)
+        sess['_fresh'] = True
+
+@pytest.fixture
+def school(request, app):
+    """Teachers, their courses and one student per entry of ``classes``.
+
+    Shaped by ``@pytest.mark.school(...)``: ``teachers`` (count), ``courses``
+    (``Course`` keyword dicts, dealt to the teachers in turn), ``classes``
+    and ``last_names`` of the students. By default one teacher with an
+    Algebra course, three students in 6A and one in 6B.
+    """
+    marker = request.node.get_closest_marker('school')
+    shape = dict(teachers=1, courses=[dict(name='Algebra', code='ALG')],
+                 classes=['6A', '6A', '6A', '6B'], last_names=None)
+    shape.update(marker.kwargs if marker else {})
+
+    teachers = []
+    for i in range(shape['teachers']):
+        user = make_user(f'teacher{i}@example.com', 'teacher')
+        teacher = Teacher(user_id=user.id, employee_number=f'T{i}', department='Math',
+                          hire_date=date(2020, 9, 1))
+        db.session.add(teacher)
+        db.session.flush()
+        teachers.append((user, teacher))
+    courses = [Course(teacher_id=teachers[i % len(teachers)][1].id, **fields)
+               for i, fields in enumerate(shape['courses'])]
+    db.session.add_all(courses)
+    last_names = shape['last_names'] or ['Test'] * len(shape['classes'])
+    students = []
+    for i, (class_name, last_name) in enumerate(zip(shape['classes'], last_names)):
+        user = make_user(f's{i}@example.com', 'student', last_name)
+        student = Student(user_id=user.id, student_number=f'S{i}', class_name=class_name,
+                          enrollment_date=date(2024, 9, 1))
+        db.session.add(student)
+        students.append(student)
+    db.session.commit()
+    (user, teacher), course = teachers[0], courses[0]
+    return SimpleNamespace(user=user, teacher=teacher, course=course,
+                           teachers=teachers, courses=courses, students=students)
@@ -0,0 +1,70 @@
+import time
+from datetime import datetime
+import pytest
+
+from models import db, AuthLog
+from utils.audit import AuditLogWriter
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def make_row(email='user@example.com'):
+    return {
+        'user_id': None,
+        'email': email,
+        'action': 'login_attempt',
+        'ip_address': '127.0.0.1',
+        'user_agent': 'pytest',
+        'timestamp': datetime.utcnow(),
+        'success': False,
+        'details': None
+    }
+
+def buffered_writer(app, batch_size=100):
+    app.config.update(AUDIT_LOG_SYNC=False, AUDIT_LOG_BATCH_SIZE=batch_size,
+                      AUDIT_LOG_FLUSH_INTERVAL=3600)
+    return AuditLogWriter(app)
+
+class TestAuditLogWriter:
+    def test_sync_mode_writes_immediately(self, client):
+        """In synchronous mode a failed login is visible right away"""
+        client.post('/auth/login', data={
+            'email': 'nobody@example.com',
+            'password': 'wrongpassword',
+            'submit': 'Log in'
+        })
+
+        log = AuthLog.query.filter_by(email='nobody@example.com').one()
+        assert log.success is False
+        assert log.details == 'Invalid credentials'
+
+    def test_rows_are_buffered_until_flush(self, app):
+        """Buffered rows reach the table in a single flush"""
+        writer = buffered_writer(app)
+        for i in range(5):
+            writer.write(make_row(f'user{i}@example.com'))
+
+        assert writer.pending() == 5
+        assert AuthLog.query.count() == 0
+
+        assert writer.flush() == 5
+        assert writer.pending() == 0
+        assert AuthLog.query.count() == 5
+
+    def test_size_threshold_triggers_flush(self, app):
+        """Reaching the batch size wakes the background flusher"""
+        writer = buffered_writer(app, batch_size=3)
+        for i in range(3):
+            writer.write(make_row(f'user{i}@example.com'))
+
+        for _ in range(100):
+            if writer.pending() == 0:
+                break
+            time.sleep(0.01)
+        # Wait for the in-flight insert to complete
+        with writer._flush_lock:
+            pass
+
+        assert writer.pending() == 0
+        assert AuthLog.query.count() == 3
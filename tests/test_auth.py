@@ -1,40 +1,8 @@
-import os
-import sys
 import pytest
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-from app import create_app
 from models import db, User, Role
 from config import config
 
-@pytest.fixture
-def app():
-    app = create_app('testing')
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    app.config['WTF_CSRF_ENABLED'] = False
-    app.config['TESTING'] = True
-    
-    with app.app_context():
-        db.create_all()
-        
-        # Create base roles
-        roles = [
-            Role(name='student', description='Student'),
-            Role(name='parent', description='Parent'),
-            Role(name='teacher', description='Teacher'),
-            Role(name='admin', description='Administrator')
-        ]
-        
-        for role in roles:
-            db.session.add(role)
-        
-        db.session.commit()
-        
-        yield app
-        
-        db.drop_all()
-
 @pytest.fixture
 def client(app):
     return app.test_client()
@@ -148,21 +116,51 @@ class TestAuth:
                 role_id=student_role.id
             )
             user.set_password('StrongPass1!')
-            user.mfa_secret = 'test_mfa_code'
             db.session.add(user)
             db.session.commit()
+            mfa_code = user.generate_mfa_code()
             
         # Simulate pre-MFA session
         with client.session_transaction() as sess:
             sess['pre_auth_user_id'] = user.id
             
         response = client.post('/auth/mfa-verify', data={
-            'code': 'test_mfa_code',
+            'code': mfa_code,
             'submit': 'Verify'
         })
         
         # Should redirect after successful MFA
         assert response.status_code == 302
+        assert '/auth/login' not in response.location
+
+    def test_mfa_attempts_are_capped(self, client, app):
+        """Too many wrong codes discard the pending code"""
+        app.config['MFA_MAX_ATTEMPTS'] = 2
+        app.extensions['mfa_store'].max_attempts = 2
+        with app.app_context():
+            student_role = Role.query.filter_by(name='student').first()
+            user = User(
+                email='test@example.com',
+                first_name='Test',
+                last_name='User',
+                role_id=student_role.id
+            )
+            user.set_password('StrongPass1!')
+            db.session.add(user)
+            db.session.commit()
+            mfa_code = user.generate_mfa_code()
+
+        with client.session_transaction() as sess:
+            sess['pre_auth_user_id'] = user.id
+
+        response = client.post('/auth/mfa-verify', data={'code': 'wrongcode1'})
+        assert response.status_code == 200
+        response = client.post('/auth/mfa-verify', data={'code': 'wrongcode2'})
+        assert response.status_code == 302
+        assert '/auth/login' in response.location
+
+        with app.app_context():
+            assert user.verify_mfa_code(mfa_code) is False
 
     def test_logout(self, client, app):
         """Test logging out"""
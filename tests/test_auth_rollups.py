@@ -0,0 +1,104 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+import pytest
+
+from conftest import login
+from models import db, User, Role, AuthLog, AuthLogRollup
+from utils.audit import AuditLogWriter, write_auth_log
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def runner(app):
+    return app.test_cli_runner()
+
+def make_row(email='user@example.com', ip='10.0.0.1', action='login_attempt',
+             success=False, timestamp=None):
+    return {
+        'user_id': None,
+        'email': email,
+        'action': action,
+        'ip_address': ip,
+        'user_agent': 'pytest',
+        'timestamp': timestamp or datetime.utcnow(),
+        'success': success,
+        'details': None
+    }
+
+def rollup(granularity, dimension, value):
+    return AuthLogRollup.query.filter_by(
+        granularity=granularity, dimension=dimension, value=value).one()
+
+class TestAuthLogRollups:
+    def test_sync_writes_update_every_bucket(self, app):
+        """Each event is counted per minute, hour and day, per IP and email"""
+        write_auth_log(make_row())
+        write_auth_log(make_row(action='mfa_failed'))
+        write_auth_log(make_row(action='login_success', success=True))
+        write_auth_log(make_row(action='logout', success=True))
+
+        for granularity in ('minute', 'hour', 'day'):
+            counters = rollup(granularity, 'email', 'user@example.com')
+            assert (counters.attempts, counters.failures, counters.mfa_failures) == (3, 2, 1)
+        assert rollup('day', 'ip', '10.0.0.1').attempts == 3
+
+    def test_login_counts_once(self, app):
+        """Sending the MFA code then logging in is a single attempt"""
+        write_auth_log(make_row(action='mfa_code_sent', success=True))
+        write_auth_log(make_row(action='login_success', success=True))
+
+        assert rollup('day', 'email', 'user@example.com').attempts == 1
+
+    def test_buffered_flush_updates_rollups(self, app):
+        """The write-behind flush adds the whole batch to the rollups"""
+        app.config.update(AUDIT_LOG_SYNC=False, AUDIT_LOG_FLUSH_INTERVAL=3600)
+        writer = AuditLogWriter(app)
+        for i in range(5):
+            writer.write(make_row(ip=f'10.0.0.{i % 2}'))
+
+        assert writer.flush() == 5
+        db.session.expire_all()
+        assert rollup('hour', 'email', 'user@example.com').failures == 5
+        assert rollup('hour', 'ip', '10.0.0.0').failures == 3
+        assert rollup('hour', 'ip', '10.0.0.1').failures == 2
+
+    def test_archive_moves_old_rows(self, app, runner, tmp_path):
+        """Old raw rows go to a gzip archive, recent ones and rollups stay"""
+        old = datetime.utcnow() - timedelta(days=120)
+        for i in range(7):
+            write_auth_log(make_row(email=f'old{i}@example.com', timestamp=old))
+        write_auth_log(make_row(email='recent@example.com'))
+
+        result = runner.invoke(args=['archive-auth-logs', '--days', '90',
+                                     '--archive-dir', str(tmp_path), '--batch-size', '3'])
+        assert 'Archived 7 auth log rows' in result.output
+
+        assert [log.email for log in AuthLog.query.all()] == ['recent@example.com']
+        archive, = tmp_path.iterdir()
+        with gzip.open(archive, 'rt') as f:
+            archived = [json.loads(line) for line in f]
+        assert sorted(row['email'] for row in archived) == [f'old{i}@example.com' for i in range(7)]
+
+        # Day rollups are kept, minute rollups past their retention are pruned
+        assert rollup('day', 'email', 'old0@example.com').attempts == 1
+        assert AuthLogRollup.query.filter_by(granularity='minute', value='old0@example.com').count() == 0
+
+    def test_security_page_reads_rollups(self, app, client):
+        """The admin security page lists the noisiest addresses"""
+        admin = User(email='admin@example.com', first_name='Ad', last_name='Min',
+                     role_id=Role.query.filter_by(name='admin').one().id)
+        admin.set_password('StrongPass1!')
+        db.session.add(admin)
+        db.session.commit()
+        for _ in range(3):
+            write_auth_log(make_row(email='target@example.com', ip='203.0.113.9'))
+
+        login(client, admin)
+
+        response = client.get('/admin/security?period=1h')
+        assert response.status_code == 200
+        assert b'203.0.113.9' in response.data
+        assert b'target@example.com' in response.data
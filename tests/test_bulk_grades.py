@@ -0,0 +1,70 @@
+import pytest
+
+from conftest import count_queries, login
+from models import db, Grade
+from utils.bulk import insert_grades
+from utils.statistics import read_snapshot, reconcile_statistics
+from utils.student_stats import stats_for
+
+@pytest.fixture
+def client(app, school):
+    client = app.test_client()
+    login(client, school.user)
+    return client
+
+def grid(course, students, values):
+    data = {'course_id': course.id, 'class_group': '6A', 'grade_type': 'Test'}
+    for i, (student, value) in enumerate(zip(students, values)):
+        data[f'rows-{i}-student_id'] = student.id
+        data[f'rows-{i}-grade_value'] = value
+        data[f'rows-{i}-comments'] = ''
+    return data
+
+def test_insert_grades_updates_aggregates(app, school):
+    teacher, course, students = school.teacher, school.course, school.students
+    insert_grades([{'student_id': s.id, 'course_id': course.id, 'teacher_id': teacher.id,
+                    'grade_value': v, 'grade_type': 'Test'}
+                   for s, v in zip(students, [17, 8, 12])] +
+                  [{'student_id': students[0].id, 'course_id': course.id,
+                    'teacher_id': teacher.id, 'grade_value': 11, 'grade_type': 'Test'}])
+    db.session.commit()
+
+    stats = stats_for(students[0].id)
+    assert (stats.grade_count, stats.best_grade, stats.high_count) == (2, 17, 1)
+    assert stats_for(students[1].id).low_count == 1
+    assert all(g.date_recorded is not None for g in Grade.query)
+    assert read_snapshot()['total_grades'] == 4
+    assert reconcile_statistics() == {}
+
+def test_grid_lists_the_class(client, school):
+    course, students = school.course, school.students
+    response = client.get(f'/teacher/grades/bulk?course_id={course.id}&class_group=6A')
+    assert response.status_code == 200
+    assert response.data.count(b'name="rows-') == 3 * 3
+    assert f'value="{students[3].id}"'.encode() not in response.data
+
+def test_submit_saves_entered_grades_in_one_insert(app, client, school):
+    course, students = school.course, school.students
+    with app.app_context(), count_queries() as statements:
+        response = client.post(f'/teacher/grades/bulk?course_id={course.id}&class_group=6A',
+                               data=grid(course, students[:3], ['15', '', '9.5']))
+    assert response.status_code == 302
+    assert sorted(g.grade_value for g in Grade.query) == [9.5, 15]
+    assert len([s for s in statements if s.startswith('INSERT INTO grades')]) == 1
+
+def test_one_invalid_row_saves_nothing(client, school):
+    course, students = school.course, school.students
+    response = client.post('/teacher/grades/bulk',
+                           data=grid(course, students[:3], ['15', '25', 'abc']))
+    assert response.status_code == 200
+    assert response.data.count(b'is-invalid') == 2
+    assert b'nothing was saved' in response.data
+    assert Grade.query.count() == 0
+
+def test_student_from_another_class_is_rejected(client, school):
+    course, students = school.course, school.students
+    response = client.post('/teacher/grades/bulk',
+                           data=grid(course, [students[0], students[3]], ['12', '14']))
+    assert response.status_code == 200
+    assert b'not in the selected class' in response.data
+    assert Grade.query.count() == 0
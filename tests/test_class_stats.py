@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import count_queries, login
+from models import db, Grade, ClassGradeStats
+from utils.bulk import insert_grades
+from utils.class_stats import class_positions, rebuild_class_grade_stats
+
+def add_grade(school, student, value, grade_type='Test'):
+    grade = Grade(student_id=school.students[student].id, course_id=school.course.id,
+                  teacher_id=school.teacher.id,
+                  grade_value=value, grade_type=grade_type)
+    db.session.add(grade)
+    db.session.commit()
+    return grade
+
+def snapshot():
+    return sorted((s.student_id, s.course_id, s.grade_type, s.class_group, s.grade_count,
+                   round(s.grade_sum, 2), s.min_grade, s.max_grade)
+                  for s in db.session.scalars(db.select(ClassGradeStats)
+                                              .execution_options(populate_existing=True)))
+
+def position(school, student, grade_type='Test'):
+    student = school.students[student]
+    return class_positions(student.id, student.class_name).get((school.course.id, grade_type))
+
+def test_positions_follow_grade_changes(app, school):
+    for student, value in ((0, 12), (0, 16), (1, 9), (2, 14), (3, 20)):
+        add_grade(school, student, value)
+    add_grade(school, 1, 18, 'Exam')
+
+    # 6A Test averages: 14, 9, 14 -> the 6B grade is not part of the class
+    assert position(school, 0) == (pytest.approx(12.75), 9, 16, 1, 3)
+    assert position(school, 2) == (pytest.approx(12.75), 9, 16, 1, 3)
+    assert position(school, 1) == (pytest.approx(12.75), 9, 16, 3, 3)
+    assert position(school, 1, 'Exam') == (18, 18, 18, 1, 1)
+    assert position(school, 3) == (20, 20, 20, 1, 1)
+
+    # Removing the lowest grade recomputes the class minimum
+    low = Grade.query.filter_by(grade_value=9).one()
+    db.session.delete(low)
+    db.session.commit()
+    assert position(school, 0) == (pytest.approx(14), 12, 16, 1, 2)
+    assert position(school, 1) is None
+
+    grade = Grade.query.filter_by(grade_value=16).one()
+    grade.grade_value = 6
+    db.session.commit()
+    assert position(school, 0) == (pytest.approx(32 / 3), 6, 14, 2, 2)
+
+    # A student changing class takes their grades along
+    school.students[3].class_name = '6A'
+    db.session.commit()
+    assert position(school, 3) == (pytest.approx(13), 6, 20, 1, 3)
+
+def test_bulk_inserts_and_rebuild_agree(app, school):
+    teacher, course, students = school.teacher, school.course, school.students
+    add_grade(school, 0, 11)
+    insert_grades([{'student_id': students[i % 4].id, 'course_id': course.id,
+                    'teacher_id': teacher.id, 'grade_value': 5 + i,
+                    'grade_type': 'Test' if i % 2 else 'Exam'} for i in range(10)])
+    db.session.commit()
+    incremental = snapshot()
+    assert rebuild_class_grade_stats() == len(incremental)
+    assert snapshot() == incremental
+
+def test_positions_are_one_query(app, school):
+    for student in range(4):
+        add_grade(school, student, 10 + student)
+    with count_queries() as statements:
+        class_positions(school.students[0].id, '6A')
+    assert len(statements) == 1
+    assert 'FROM grades' not in statements[0]
+
+def test_grade_page_shows_class_figures(app, school):
+    for student, value in ((0, 12), (1, 8), (2, 16)):
+        add_grade(school, student, value)
+    client = app.test_client()
+    login(client, school.students[0].user)
+    response = client.get('/student/grades')
+    assert response.status_code == 200
+    assert '12.0 <small class="text-muted">(8.0–16.0)</small>' in response.data.decode()
+    assert b'2 / 3' in response.data
@@ -0,0 +1,109 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date, datetime
+import pytest
+
+from conftest import login, make_user
+from models import db, Grade, Absence
+from utils.terms import recent_terms, term_bounds, term_for
+
+pytestmark = pytest.mark.school(teachers=2, classes=['6A', '6A', '6B'],
+                                courses=[dict(name=f'Course {i}', code=f'C{i}') for i in range(2)])
+
+@pytest.fixture
+def graded(school):
+    """Two teachers, one course each, grades and absences in two terms"""
+    for course in school.courses:
+        for student in school.students:
+            for day in (datetime(2024, 10, 1), datetime(2025, 1, 10)):
+                db.session.add(Grade(student_id=student.id, course_id=course.id,
+                                     teacher_id=course.teacher_id, grade_value=12,
+                                     grade_type='Test', date_recorded=day,
+                                     comments='bien, "appliqué"'))
+            db.session.add(Absence(student_id=student.id, teacher_id=course.teacher_id,
+                                   date=date(2024, 10, 2), period='Morning'))
+    db.session.commit()
+    return school
+
+def read_csv(data):
+    return list(csv.DictReader(io.StringIO(data.decode('utf-8'))))
+
+def test_terms(app):
+    assert term_bounds('2024-T2') == (date(2024, 12, 1), date(2025, 3, 1))
+    assert term_bounds('2024-T3') == (date(2025, 3, 1), date(2025, 9, 1))
+    assert term_for(date(2025, 1, 5)) == '2024-T2'
+    assert term_for(date(2025, 9, 1)) == '2025-T1'
+    assert recent_terms(3, date(2025, 1, 5)) == ['2024-T2', '2024-T1', '2023-T3']
+    with pytest.raises(ValueError):
+        term_bounds('2024-T4')
+
+def test_admin_exports_whole_school_as_csv(app, graded):
+    admin = make_user('admin@example.com', 'admin')
+    db.session.commit()
+    client = app.test_client()
+    login(client, admin)
+    response = client.get('/export/grades.csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    rows = read_csv(response.data)
+    assert len(rows) == 12
+    assert rows[0]['comments'] == 'bien, "appliqué"'
+    assert {row['teacher'] for row in rows} == {'T0', 'T1'}
+
+def test_scopes_and_ndjson(app, graded):
+    admin = make_user('admin@example.com', 'admin')
+    db.session.commit()
+    client = app.test_client()
+    login(client, admin)
+    course_id = graded.courses[0].id
+    response = client.get(f'/export/grades.ndjson?course_id={course_id}'
+                          '&class_group=6A&term=2024-T2')
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert len(rows) == 2
+    assert all(row['course_code'] == 'C0' and row['class_group'] == '6A' for row in rows)
+    assert all(row['date'].startswith('2025-01-10') for row in rows)
+
+    assert client.get('/export/grades.csv?term=2024-T9').status_code == 400
+    assert client.get('/export/grades.xml').status_code == 404
+
+def test_teacher_export_is_scoped_and_gzipped(app, graded):
+    client = app.test_client()
+    login(client, graded.user)
+    response = client.get(f'/export/absences.csv?gzip=1&course_id={graded.courses[1].id}')
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.csv.gz"')
+    rows = read_csv(gzip.decompress(response.data))
+    assert len(rows) == 3
+    assert {row['teacher'] for row in rows} == {'T0'}
+
+def test_export_forbidden_to_students(app, graded):
+    client = app.test_client()
+    login(client, graded.students[0].user)
+    response = client.get('/export/grades.csv')
+    assert response.status_code == 302
+
+def test_teacher_without_profile_is_forbidden(app, graded):
+    user = make_user('noprofile@example.com', 'teacher')
+    db.session.commit()
+    client = app.test_client()
+    login(client, user)
+    assert client.get('/export/grades.csv').status_code == 403
+
+def test_csv_cells_cannot_be_formulas(app, graded):
+    graded.students[0].user.last_name = '=HYPERLINK("http://x")'
+    Grade.query.filter_by(student_id=graded.students[0].id).update({'comments': '@SUM(A1)'})
+    db.session.commit()
+    client = app.test_client()
+    login(client, graded.user)
+    rows = read_csv(client.get('/export/grades.csv').data)
+    first = [row for row in rows if row['student_number'] == 'S0']
+    assert first and all(row['last_name'] == '\'=HYPERLINK("http://x")' for row in first)
+    assert all(row['comments'] == "'@SUM(A1)" for row in first)
+    assert rows[-1]['comments'] == 'bien, "appliqué"'
+
+    response = client.get('/export/grades.ndjson')
+    assert json.loads(response.data.decode().splitlines()[0])['comments'] == '@SUM(A1)'
@@ -0,0 +1,72 @@
+from datetime import date, datetime, timedelta
+import pytest
+
+from conftest import count_queries, login, make_user
+from models import db, Student, Parent, ParentStudent, Teacher, Course, Grade, Absence
+from utils.family import load_family
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def make_family(tag, children, grades_per_child=5):
+    """A parent with ``children`` students, each with grades and absences"""
+    teacher = Teacher(user_id=make_user(f'teacher{tag}@example.com', 'teacher').id,
+                      employee_number=f'PROF{tag}', department='Math', hire_date=date.today())
+    db.session.add(teacher)
+    db.session.flush()
+    course = Course(name=f'Math {tag}', code=f'M{tag}', teacher_id=teacher.id)
+    parent_user = make_user(f'parent{tag}@example.com', 'parent')
+    parent = Parent(user_id=parent_user.id)
+    db.session.add_all([course, parent])
+    db.session.flush()
+    start = datetime(2025, 1, 1)
+    for i in range(children):
+        student = Student(user_id=make_user(f'child{tag}{i}@example.com', 'student').id,
+                          student_number=f'S{tag}{i}', class_name='6A', enrollment_date=date.today())
+        db.session.add(student)
+        db.session.flush()
+        db.session.add(ParentStudent(parent_id=parent.id, student_id=student.id,
+                                     relationship_type='mother'))
+        for g in range(grades_per_child):
+            db.session.add(Grade(student_id=student.id, course_id=course.id, teacher_id=teacher.id,
+                                 grade_value=10 + g, grade_type='Test',
+                                 date_recorded=start + timedelta(days=g)))
+            db.session.add(Absence(student_id=student.id, teacher_id=teacher.id,
+                                   date=start.date() + timedelta(days=g), period='Morning'))
+    db.session.commit()
+    return parent_user, parent
+
+class TestParentDashboard:
+    def test_latest_rows_and_totals(self, app):
+        """Each child gets its own three latest grades and absences"""
+        _, parent = make_family('A', children=2)
+
+        family = load_family(parent.id)
+
+        assert len(family['children_data']) == 2
+        for child in family['children_data']:
+            assert [g.grade_value for g in child['recent_grades']] == [14, 13, 12]
+            assert {g.student_id for g in child['recent_grades']} == {child['student'].id}
+            assert len(child['recent_absences']) == 3
+            assert child['total_grades'] == 5
+            assert child['average_grade'] == 12
+        assert family['total_absences'] == 10
+        assert family['global_average'] == 12
+
+    def test_query_count_does_not_grow_with_children(self, app, client):
+        """One child or four, the dashboard runs the same number of queries"""
+        small, _ = make_family('S', children=1)
+        large, _ = make_family('L', children=4)
+
+        counts = []
+        for user in (small, large):
+            login(client, user)
+            # Fresh app context so Flask-Login does not reuse the previous user
+            with app.app_context(), count_queries() as statements:
+                response = client.get('/parent/dashboard')
+            assert response.status_code == 200
+            counts.append(len(statements))
+
+        assert b'childL3' in response.data
+        assert counts[0] == counts[1]
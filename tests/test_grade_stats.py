@@ -0,0 +1,42 @@
+import pytest
+
+from conftest import count_queries, login
+from models import db, Student, Grade
+from utils.grade_stats import GradeSummary, grade_summary
+from utils.student_stats import stats_for
+
+pytestmark = pytest.mark.school(classes=['6A', '6B'])
+
+@pytest.fixture
+def graded(school):
+    for student, values in zip(school.students, [[8, 16.5, 12], [10, 18]]):
+        for value in values:
+            db.session.add(Grade(student_id=student.id, course_id=school.course.id,
+                                 teacher_id=school.teacher.id, grade_value=value,
+                                 grade_type='Test'))
+    db.session.commit()
+    return school.students
+
+def test_grade_summary_is_one_query(app, graded):
+    with count_queries() as statements:
+        summary = grade_summary(Student.class_name == '6A', join_student=True)
+    assert len(statements) == 1
+    assert summary == GradeSummary(3, pytest.approx(12.1666, abs=1e-3), 16.5, 1, 1)
+
+    everything = grade_summary()
+    assert (everything.count, everything.best, everything.high_count, everything.low_count) \
+        == (5, 18, 2, 2)
+    assert grade_summary(Grade.grade_value > 19) == GradeSummary()
+
+def test_summary_from_student_stats(app, graded):
+    student = graded[1]
+    assert GradeSummary.from_stats(stats_for(student.id)) \
+        == grade_summary(Grade.student_id == student.id)
+    assert GradeSummary.from_stats(stats_for(12345)) == GradeSummary()
+
+def test_student_grades_page(app, graded):
+    client = app.test_client()
+    login(client, graded[0].user)
+    response = client.get('/student/grades')
+    assert response.status_code == 200
+    assert b'12.2' in response.data and b'16.5' in response.data
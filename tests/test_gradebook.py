@@ -0,0 +1,77 @@
+from datetime import date, datetime, timedelta
+import pytest
+
+from conftest import login
+from models import db, Student, Grade
+from utils.gradebook import gradebook_page, gradebook_summary
+
+pytestmark = pytest.mark.school(
+    courses=[dict(name=name, code=name[:3]) for name in ('Algebra', 'Geometry')],
+    classes=['6A'] * 3 + ['6B'] * 3,
+    last_names=['Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Petit'])
+
+@pytest.fixture
+def gradebook(school):
+    """A teacher with two courses and six students in two classes"""
+    start = datetime(2025, 1, 1)
+    for i, student in enumerate(school.students):
+        for d in range(4):
+            db.session.add(Grade(student_id=student.id, course_id=school.courses[d % 2].id,
+                                 teacher_id=school.teacher.id, grade_value=8 + i + d,
+                                 grade_type='Exam' if d == 3 else 'Test',
+                                 date_recorded=start + timedelta(days=d)))
+    db.session.commit()
+    return school.user, school.teacher, school.courses
+
+def test_summary_follows_filters(app, gradebook):
+    _, teacher, courses = gradebook
+    everything = gradebook_summary(teacher.id, {})
+    assert everything.count == 24
+
+    filters = {'course_id': courses[1].id, 'class_group': '6B', 'grade_type': 'Exam',
+               'date_from': date(2025, 1, 2), 'date_to': date(2025, 1, 4)}
+    summary = gradebook_summary(teacher.id, filters)
+    rows = Grade.query.join(Student).filter(
+        Grade.course_id == courses[1].id, Student.class_name == '6B', Grade.grade_type == 'Exam',
+    ).all()
+    values = [g.grade_value for g in rows]
+    assert summary.count == len(values) == 3
+    assert summary.average == pytest.approx(sum(values) / len(values))
+    assert summary.best == max(values)
+    assert summary.high_count == len([v for v in values if v >= 16])
+
+    page = gradebook_page(teacher.id, filters, total=summary.count)
+    assert sorted(g.id for g in page) == sorted(g.id for g in rows)
+
+def test_date_to_is_inclusive(app, gradebook):
+    _, teacher, _ = gradebook
+    filters = {'date_from': date(2025, 1, 2), 'date_to': date(2025, 1, 2)}
+    assert gradebook_summary(teacher.id, filters).count == 6
+
+def test_sort_by_student_across_pages(app, gradebook):
+    _, teacher, _ = gradebook
+    seen, cursor = [], None
+    while True:
+        page = gradebook_page(teacher.id, {}, sort='student', descending=False,
+                              cursor=cursor, per_page=5)
+        seen += [(g.student.user.last_name, g.id) for g in page]
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    assert len(seen) == 24
+    assert seen == sorted(seen)
+
+def test_gradebook_page(app, gradebook):
+    user, _, courses = gradebook
+    client = app.test_client()
+    login(client, user)
+    response = client.get(f'/teacher/grades?course_id={courses[0].id}&class_group=6A'
+                          '&sort=grade&direction=asc')
+    assert response.status_code == 200
+    assert b'Martin' in response.data and b'Thomas' not in response.data
+    assert b'direction=desc' in response.data
+
+    # Unknown filter values are ignored rather than failing the page
+    response = client.get('/teacher/grades?class_group=9Z&sort=nope')
+    assert response.status_code == 200
+    assert b'Thomas' in response.data
@@ -0,0 +1,98 @@
+import threading
+import time
+import pytest
+
+from models import db, User, Role
+from utils.hashing import PasswordHasher, HashingBusyError
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+class TestPasswordHasher:
+    def test_metrics_track_wait_and_hash_time(self, app):
+        """Each hash and verification is counted with its timings"""
+        hasher = app.extensions['password_hasher']
+        pwhash = hasher.hash('StrongPass1!')
+
+        assert hasher.verify(pwhash, 'StrongPass1!') is True
+        assert hasher.verify(pwhash, 'wrong') is False
+
+        metrics = hasher.metrics()
+        assert metrics['calls'] == 3
+        assert metrics['rejected'] == 0
+        assert metrics['hash_seconds'] > 0
+
+    def test_process_pool_hashes(self, app):
+        """Hashes computed in worker processes are verifiable"""
+        app.config.update(PASSWORD_HASH_INLINE=False, PASSWORD_HASH_WORKERS=2)
+        hasher = PasswordHasher(app)
+
+        hashes = hasher.hash_many(['StrongPass1!', 'OtherPass2?'])
+        assert hasher.verify(hashes[0], 'StrongPass1!') is True
+        assert hasher.verify(hashes[1], 'OtherPass2?') is True
+        assert hasher.metrics()['calls'] == 4
+
+    def test_saturated_pool_fails_fast(self, app):
+        """Without a free slot the caller gets HashingBusyError"""
+        app.config.update(PASSWORD_HASH_MAX_PENDING=1, PASSWORD_HASH_QUEUE_TIMEOUT=0.01)
+        hasher = PasswordHasher(app)
+        hasher._slots.acquire()
+
+        with pytest.raises(HashingBusyError):
+            hasher.hash('StrongPass1!')
+        assert hasher.metrics()['rejected'] == 1
+
+    def test_login_returns_busy_response(self, client, app):
+        """Login answers 503 instead of queueing behind a saturated pool"""
+        student_role = Role.query.filter_by(name='student').first()
+        user = User(email='test@example.com', first_name='Test',
+                    last_name='User', role_id=student_role.id)
+        user.set_password('StrongPass1!')
+        db.session.add(user)
+        db.session.commit()
+
+        hasher = app.extensions['password_hasher']
+        hasher.timeout = 0.01
+        while hasher._slots.acquire(blocking=False):
+            pass
+
+        response = client.post('/auth/login', data={
+            'email': 'test@example.com',
+            'password': 'StrongPass1!',
+            'submit': 'Log in'
+        })
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '5'
+
+    def test_login_verifies_while_batch_runs(self, client, app):
+        """A large batch keeps half the slots free and does not queue logins behind it"""
+        student_role = Role.query.filter_by(name='student').first()
+        user = User(email='test@example.com', first_name='Test',
+                    last_name='User', role_id=student_role.id)
+        user.set_password('StrongPass1!')
+        db.session.add(user)
+        db.session.commit()
+
+        app.config.update(PASSWORD_HASH_INLINE=False, PASSWORD_HASH_WORKERS=2,
+                          PASSWORD_HASH_MAX_PENDING=4)
+        hasher = PasswordHasher(app)
+        hasher.hash('warm-up')
+        hashes = []
+        batch = threading.Thread(
+            target=lambda: hashes.extend(hasher.hash_many(['BulkPass1!'] * 12)))
+        batch.start()
+        try:
+            time.sleep(0.1)
+            response = client.post('/auth/login', data={
+                'email': 'test@example.com',
+                'password': 'StrongPass1!',
+                'submit': 'Log in'
+            })
+            assert response.status_code == 302
+            assert batch.is_alive()
+        finally:
+            batch.join()
+        assert len(hashes) == 12
+        assert hasher.metrics()['rejected'] == 0
@@ -0,0 +1,87 @@
+from datetime import date
+import pytest
+
+from conftest import count_queries
+from models import db, User, Role, Student
+from utils.identity import load_identity
+
+@pytest.fixture
+def student_user(app):
+    student_role = Role.query.filter_by(name='student').first()
+    user = User(email='student@example.com', first_name='Jane',
+                last_name='Student', role_id=student_role.id)
+    user.set_password('StrongPass1!')
+    db.session.add(user)
+    db.session.commit()
+    db.session.add(Student(user_id=user.id, student_number='STU001',
+                           class_name='6A', enrollment_date=date.today()))
+    db.session.commit()
+    user_id = user.id
+    app.extensions['role_registry'].reload()
+    db.session.remove()
+    return user_id
+
+class TestIdentityCache:
+    def test_user_role_and_profile_in_one_query(self, app, student_user):
+        """A cache miss loads user, role and profile together"""
+        with app.test_request_context():
+            with count_queries() as statements:
+                user = load_identity(student_user)
+                assert user.has_role('student') is True
+                assert user.role.name == 'student'
+                assert user.student_profile.class_name == '6A'
+
+        assert len(statements) == 1
+
+    def test_cache_hit_needs_no_query(self, app, student_user):
+        """A second request within the TTL is served from the cache"""
+        with app.test_request_context():
+            load_identity(student_user)
+        db.session.remove()
+
+        with app.test_request_context():
+            with count_queries() as statements:
+                user = load_identity(student_user)
+                assert user.role.name == 'student'
+                assert user.student_profile.student_number == 'STU001'
+                assert user in db.session
+
+        assert statements == []
+
+    def test_update_invalidates_cache(self, app, student_user):
+        """Changing the user or its profile evicts the cached identity"""
+        with app.test_request_context():
+            load_identity(student_user)
+        db.session.remove()
+
+        with app.test_request_context():
+            student = Student.query.filter_by(user_id=student_user).one()
+            student.class_name = '5B'
+            db.session.commit()
+        db.session.remove()
+
+        with app.test_request_context():
+            with count_queries() as statements:
+                user = load_identity(student_user)
+            assert user.student_profile.class_name == '5B'
+        assert len(statements) == 1
+
+    def test_eviction_waits_for_commit(self, app, student_user):
+        """A flushed change evicts on commit; a rolled back one keeps the entry"""
+        cache = app.extensions['identity_cache']
+        with app.test_request_context():
+            load_identity(student_user)
+        db.session.remove()
+
+        with app.test_request_context():
+            db.session.get(User, student_user).first_name = 'Flushed'
+            db.session.flush()
+            assert cache.get(student_user) is not None
+            db.session.rollback()
+            assert cache.get(student_user) is not None
+
+            db.session.get(User, student_user).first_name = 'Committed'
+            db.session.flush()
+            assert cache.get(student_user) is not None
+            db.session.commit()
+            assert cache.get(student_user) is None
@@ -0,0 +1,168 @@
+import os
+import sys
+import fcntl
+import glob
+import importlib.util
+import json
+import time
+import types
+import pytest
+
+from models import db, User, Role
+from utils import mail_queue
+from utils.mail_queue import MailQueue
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def async_queue(app, spool_dir, **overrides):
+    """Build a worker-backed queue writing to a temporary spool"""
+    app.config.update(MAIL_QUEUE_SYNC=False, MAIL_QUEUE_DIR=str(spool_dir),
+                      MAIL_QUEUE_WORKERS=1, MAIL_QUEUE_RETRY_BACKOFF=0.01,
+                      **overrides)
+    return MailQueue(app)
+
+def spooled(spool_dir):
+    return glob.glob(os.path.join(spool_dir, '**', '*.json'), recursive=True)
+
+def leave_run(spool_dir, run_id, job):
+    """Spool a job the way a queue of another run would"""
+    (spool_dir / run_id).mkdir()
+    (spool_dir / f'{run_id}.lock').touch()
+    with open(spool_dir / run_id / f"{job['id']}.json", 'w') as fh:
+        json.dump(job, fh)
+
+class TestMailQueue:
+    def test_login_sends_mfa_code(self, client, app):
+        """A successful login hands the MFA code to the mail queue"""
+        student_role = Role.query.filter_by(name='student').first()
+        user = User(email='test@example.com', first_name='Test',
+                    last_name='User', role_id=student_role.id)
+        user.set_password('StrongPass1!')
+        db.session.add(user)
+        db.session.commit()
+
+        mail = app.extensions['mail']
+        with mail.record_messages() as outbox:
+            response = client.post('/auth/login', data={
+                'email': 'test@example.com',
+                'password': 'StrongPass1!',
+                'submit': 'Log in'
+            })
+
+        assert response.status_code == 302
+        assert len(outbox) == 1
+        assert outbox[0].recipients == ['test@example.com']
+
+    def test_worker_delivers_and_clears_spool(self, app, tmp_path):
+        """Queued messages are sent by a worker and removed from the spool"""
+        queue = async_queue(app, tmp_path)
+        mail = app.extensions['mail']
+        with mail.record_messages() as outbox:
+            queue.enqueue('Subject', ['a@example.com'], 'Body')
+            queue.join()
+
+        assert [m.subject for m in outbox] == ['Subject']
+        assert spooled(tmp_path) == []
+        assert queue.metrics()['sent'] == 1
+        assert queue.depth() == 0
+
+    def test_failed_delivery_is_retried(self, app, tmp_path, monkeypatch):
+        """A transient SMTP failure is retried with backoff"""
+        mail = app.extensions['mail']
+        original_send = mail.send
+        calls = []
+
+        def flaky_send(message):
+            calls.append(message)
+            if len(calls) == 1:
+                raise ConnectionError('relay unavailable')
+            original_send(message)
+
+        monkeypatch.setattr(mail, 'send', flaky_send)
+        queue = async_queue(app, tmp_path)
+        queue.enqueue('Subject', ['a@example.com'], 'Body')
+
+        for _ in range(200):
+            queue.join()
+            if queue.depth() == 0 and queue.sent:
+                break
+            time.sleep(0.01)
+
+        assert len(calls) == 2
+        assert queue.metrics()['retried'] == 1
+        assert queue.metrics()['sent'] == 1
+
+    def test_spooled_jobs_survive_restart(self, app, tmp_path):
+        """Jobs of a run whose lock is free are recovered on startup"""
+        job = {'id': 'abc123', 'subject': 'Pending', 'recipients': ['a@example.com'],
+               'body': 'Body', 'attempts': 0}
+        leave_run(tmp_path, 'gone', job)
+
+        mail = app.extensions['mail']
+        with mail.record_messages() as outbox:
+            queue = async_queue(app, tmp_path)
+            queue.join()
+
+        assert [m.subject for m in outbox] == ['Pending']
+        assert spooled(tmp_path) == []
+        assert not (tmp_path / 'gone').exists()
+        assert not (tmp_path / 'gone.lock').exists()
+
+    def test_jobs_of_a_live_run_are_left_alone(self, app, tmp_path):
+        """A run holding its lock keeps its jobs, whatever its pid"""
+        job = {'id': 'abc123', 'subject': 'Pending', 'recipients': ['a@example.com'],
+               'body': 'Body', 'attempts': 0}
+        leave_run(tmp_path, 'alive', job)
+
+        mail = app.extensions['mail']
+        with open(tmp_path / 'alive.lock') as lock, mail.record_messages() as outbox:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            queue = async_queue(app, tmp_path)
+            queue.join()
+
+        assert outbox == []
+        assert spooled(tmp_path) == [str(tmp_path / 'alive' / 'abc123.json')]
+
+    def test_msvcrt_lock_without_fcntl(self, app, tmp_path, monkeypatch):
+        """Where fcntl is missing (Windows) the claim is locked with msvcrt"""
+        msvcrt = types.ModuleType('msvcrt')
+        msvcrt.LK_NBLCK = 2
+        msvcrt.locking = lambda fd, mode, nbytes: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        monkeypatch.setitem(sys.modules, 'fcntl', None)
+        monkeypatch.setitem(sys.modules, 'msvcrt', msvcrt)
+        spec = importlib.util.spec_from_file_location('mail_queue_msvcrt',
+                                                      mail_queue.__file__)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        assert module.fcntl is None
+
+        job = {'id': 'abc123', 'subject': 'Pending', 'recipients': ['a@example.com'],
+               'body': 'Body', 'attempts': 0}
+        leave_run(tmp_path, 'gone', job)
+        app.config.update(MAIL_QUEUE_SYNC=False, MAIL_QUEUE_DIR=str(tmp_path),
+                          MAIL_QUEUE_WORKERS=1)
+        with app.extensions['mail'].record_messages() as outbox:
+            queue = module.MailQueue(app)
+            queue.join()
+        assert [m.subject for m in outbox] == ['Pending']
+        own = os.path.basename(queue.claim_dir)
+        assert [os.path.basename(p) for p in glob.glob(str(tmp_path / '*.lock'))] \
+            == [f'{own}.lock']
+        with open(tmp_path / f'{own}.lock') as fh:
+            assert not module._try_lock(fh)
+
+    def test_spool_is_private(self, app, tmp_path):
+        """Spooled secrets are readable by the owner only"""
+        spool = tmp_path / 'spool'
+        spool.mkdir(mode=0o755)
+        # No worker: the job stays in the spool
+        app.config.update(MAIL_QUEUE_SYNC=False, MAIL_QUEUE_DIR=str(spool), MAIL_QUEUE_WORKERS=0)
+        queue = MailQueue(app)
+        queue.enqueue('Code', ['a@example.com'], 'Your code is 123456')
+
+        assert os.stat(spool).st_mode & 0o777 == 0o700
+        assert os.stat(queue.claim_dir).st_mode & 0o777 == 0o700
+        [path] = spooled(spool)
+        assert os.stat(path).st_mode & 0o777 == 0o600
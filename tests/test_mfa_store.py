@@ -0,0 +1,59 @@
+import pytest
+
+from conftest import make_user
+from models import db, User, MFACode
+from utils.mfa_store import MFACodeStore, VALID, INVALID, EXPIRED, LOCKED, MISSING
+
+@pytest.fixture(params=['memory', 'sql'])
+def store(request, app):
+    app.config['MFA_CODE_BACKEND'] = request.param
+    app.config['MFA_MAX_ATTEMPTS'] = 3
+    make_user('test@example.com', 'student')
+    db.session.commit()
+    return MFACodeStore(app)
+
+class TestMFACodeStore:
+    def test_code_is_single_use(self, store):
+        code = store.issue(1)
+        assert store.verify(1, code) == VALID
+        assert store.verify(1, code) == MISSING
+
+    def test_new_code_replaces_pending_one(self, store):
+        first = store.issue(1)
+        second = store.issue(1)
+        assert store.verify(1, first) == INVALID
+        assert store.verify(1, second) == VALID
+
+    def test_attempts_are_capped(self, store):
+        code = store.issue(1)
+        assert store.verify(1, 'wrong1') == INVALID
+        assert store.verify(1, 'wrong2') == INVALID
+        assert store.verify(1, 'wrong3') == LOCKED
+        assert store.verify(1, code) == MISSING
+
+    def test_expired_codes_are_rejected_and_swept(self, store):
+        store.ttl = -1
+        code = store.issue(1)
+        assert store.verify(1, code) == EXPIRED
+
+        store.issue(1)
+        assert store.sweep() == 1
+        assert store.verify(1, code) == MISSING
+
+    def test_codes_are_hashed_at_rest(self, store):
+        code = store.issue(1)
+        if store.app.config['MFA_CODE_BACKEND'] == 'sql':
+            assert db.session.get(MFACode, 1).code_hash != code
+        assert db.session.get(User, 1).mfa_secret is None
+
+def test_memory_backend_warns_outside_testing(app, caplog):
+    app.config['MFA_CODE_BACKEND'] = 'memory'
+    app.config['MFA_SWEEP_INTERVAL'] = 0
+    app.testing = False
+    MFACodeStore(app)
+    assert "MFA_CODE_BACKEND='memory'" in caplog.text
+
+    caplog.clear()
+    app.config['MFA_CODE_BACKEND'] = 'sql'
+    MFACodeStore(app)
+    assert caplog.text == ''
@@ -0,0 +1,120 @@
+import os
+import pytest
+
+from flask_migrate import upgrade, downgrade
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import inspect, text
+
+from models import db, User
+
+MIGRATIONS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+
+@pytest.fixture
+def app(app):
+    """The shared app without its tables: the migrations build the schema"""
+    db.drop_all()
+    return app
+
+class TestMigrations:
+    def test_upgrade_matches_models(self, app):
+        """Running every revision yields exactly the schema of the models"""
+        upgrade(directory=MIGRATIONS)
+
+        with db.engine.connect() as conn:
+            diff = compare_metadata(MigrationContext.configure(conn), db.metadata)
+        assert diff == []
+
+    def test_baseline_database_upgrades(self, app):
+        """A database stamped at the baseline gets the auth tables and can log in"""
+        upgrade(directory=MIGRATIONS, revision='0001_baseline')
+        inspector = inspect(db.engine)
+        assert 'mfa_codes' not in inspector.get_table_names()
+        assert 'mfa_method' not in {c['name'] for c in inspector.get_columns('users')}
+        with db.engine.begin() as conn:
+            conn.execute(text("INSERT INTO roles (id, name) VALUES (1, 'student')"))
+            conn.execute(text(
+                "INSERT INTO users (id, email, password_hash, first_name, last_name, role_id) "
+                "VALUES (1, 'a@example.com', 'x', 'A', 'B', 1)"))
+
+        upgrade(directory=MIGRATIONS)
+
+        user = db.session.get(User, 1)
+        assert user.mfa_method == 'email' and not user.uses_totp
+        assert user.generate_mfa_code()
+        assert {'ix_auth_logs_email', 'ix_auth_logs_timestamp'} <= {
+            index['name'] for index in inspect(db.engine).get_indexes('auth_logs')}
+
+    def test_auth_log_rollups_are_backfilled(self, app):
+        """Rollups start from the auth logs already recorded"""
+        upgrade(directory=MIGRATIONS, revision='0001_baseline')
+        with db.engine.begin() as conn:
+            for action, success in (('login_attempt', False), ('mfa_code_sent', True),
+                                    ('login_success', True), ('mfa_failed', False)):
+                conn.execute(text(
+                    "INSERT INTO auth_logs (email, action, ip_address, timestamp, success) "
+                    "VALUES ('a@example.com', :action, '10.0.0.1', '2024-10-01 08:30:00', :success)"),
+                    {'action': action, 'success': success})
+
+        upgrade(directory=MIGRATIONS, revision='0001_auth_security')
+
+        with db.engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT granularity, dimension, attempts, failures, mfa_failures "
+                "FROM auth_log_rollups ORDER BY granularity, dimension")).all()
+        assert [tuple(row) for row in rows] == [
+            (granularity, dimension, 3, 2, 1)
+            for granularity in ('day', 'hour', 'minute') for dimension in ('email', 'ip')]
+
+    def test_undated_grades_are_backfilled(self, app):
+        """Grades without a date get one before the column becomes NOT NULL"""
+        upgrade(directory=MIGRATIONS, revision='0008_statistics_shards')
+        with db.engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO grades (id, student_id, course_id, grade_value, grade_type, teacher_id) "
+                "VALUES (1, 1, 1, 12, 'Test', 1)"))
+
+        upgrade(directory=MIGRATIONS)
+
+        with db.engine.connect() as conn:
+            assert conn.execute(text("SELECT date_recorded FROM grades")).scalar() is not None
+        columns = {c['name']: c for c in inspect(db.engine).get_columns('grades')}
+        assert columns['date_recorded']['nullable'] is False
+
+    def test_totp_secrets_are_encrypted(self, app):
+        """Secrets stored in clear before the migration keep working"""
+        upgrade(directory=MIGRATIONS, revision='0010_rate_limit_expiry')
+        with db.engine.begin() as conn:
+            conn.execute(text("INSERT INTO roles (id, name) VALUES (1, 'student')"))
+            conn.execute(text(
+                "INSERT INTO users (id, email, password_hash, first_name, last_name, role_id, "
+                "mfa_secret, mfa_method) VALUES (1, 'a@example.com', 'x', 'A', 'B', 1, :s, 'totp')"),
+                {'s': 'JBSWY3DPEHPK3PXP'})
+
+        upgrade(directory=MIGRATIONS)
+        with db.engine.connect() as conn:
+            assert conn.execute(text("SELECT mfa_secret FROM users")).scalar() != 'JBSWY3DPEHPK3PXP'
+        assert db.session.get(User, 1).mfa_secret == 'JBSWY3DPEHPK3PXP'
+
+        downgrade(directory=MIGRATIONS, revision='0010_rate_limit_expiry')
+        with db.engine.connect() as conn:
+            assert conn.execute(text("SELECT mfa_secret FROM users")).scalar() == 'JBSWY3DPEHPK3PXP'
+
+    def test_dashboard_indexes(self, app):
+        """The composite indexes of the dashboard queries are created"""
+        upgrade(directory=MIGRATIONS)
+
+        inspector = inspect(db.engine)
+        indexes = {index['name']: index['column_names']
+                   for table in ('grades', 'absences', 'schedules')
+                   for index in inspector.get_indexes(table)}
+        assert indexes['ix_grades_student_date'] == ['student_id', 'date_recorded']
+        assert indexes['ix_absences_student_date'] == ['student_id', 'date']
+        assert indexes['ix_schedules_class_day_start'] == ['class_group', 'day_of_week', 'start_time']
+
+    def test_downgrade_to_base(self, app):
+        """Every revision can be rolled back"""
+        upgrade(directory=MIGRATIONS)
+        downgrade(directory=MIGRATIONS, revision='base')
+
+        assert inspect(db.engine).get_table_names() == ['alembic_version']
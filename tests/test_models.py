@@ -1,37 +1,9 @@
-import os
-import sys
 import pytest
 from datetime import date, datetime
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-from app import create_app
+from conftest import count_queries
 from models import db, User, Role, Student, Teacher, Course, Grade
 
-@pytest.fixture
-def app():
-    app = create_app('testing')
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    app.config['TESTING'] = True
-    
-    with app.app_context():
-        db.create_all()
-        
-        # Create base roles
-        roles = [
-            Role(name='student', description='Student'),
-            Role(name='teacher', description='Teacher')
-        ]
-        
-        for role in roles:
-            db.session.add(role)
-        
-        db.session.commit()
-        
-        yield app
-        
-        db.drop_all()
-
 class TestModels:
     def test_user_creation(self, app):
         """Test creating a user"""
@@ -260,6 +232,43 @@ class TestModels:
             assert teacher_user.can('add_grades') is True
             assert teacher_user.can('manage_users') is False
 
+    def test_role_registry_permissions(self, app):
+        """Role checks are answered from the registry without queries"""
+        with app.app_context():
+            registry = app.extensions['role_registry']
+            registry.reload()
+            teacher_role_id = registry.id_for('teacher')
+            teacher_user = User(
+                email='teacher@example.com',
+                first_name='Teacher',
+                last_name='Test',
+                role_id=teacher_role_id
+            )
+
+            with count_queries() as statements:
+                assert teacher_user.has_role('teacher') is True
+                assert teacher_user.can('add_grades') is True
+                assert teacher_user.can('view_grades') is False
+                assert teacher_user.can('unknown_permission') is False
+            assert statements == []
+
+    def test_role_registry_reloads_on_change(self, app):
+        """Adding a role refreshes the registry and form choices"""
+        with app.app_context():
+            registry = app.extensions['role_registry']
+            db.session.delete(Role.query.filter_by(name='admin').one())
+            db.session.commit()
+            assert [name for _, name in registry.choices()] == ['student', 'parent', 'teacher']
+
+            db.session.add(Role(name='admin', description='Administrator'))
+            db.session.commit()
+
+            assert [name for _, name in registry.choices()] \
+                == ['student', 'parent', 'teacher', 'admin']
+            admin_user = User(email='admin@example.com', first_name='Admin',
+                              last_name='Test', role_id=registry.id_for('admin'))
+            assert admin_user.can('manage_users') is True
+
     def test_mfa_code_generation(self, app):
         """Test MFA code generation and verification"""
         with app.app_context():
@@ -279,8 +288,11 @@ class TestModels:
             
             assert mfa_code is not None
             assert len(mfa_code) == 12  # 6 bytes in hex = 12 characters
-            assert user.mfa_secret == mfa_code
+            # The code is kept in the MFA store, not on the users row
+            assert user.mfa_secret is None
             
             # Verify the code
+            assert user.verify_mfa_code('wrong_code') is False
             assert user.verify_mfa_code(mfa_code) is True
-            assert user.verify_mfa_code('wrong_code') is False
\ No newline at end of file
+            # Codes are single use
+            assert user.verify_mfa_code(mfa_code) is False
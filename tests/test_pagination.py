@@ -0,0 +1,94 @@
+from datetime import date, datetime
+import pytest
+
+from conftest import login
+from models import db, User, Role, Student, Teacher, Absence
+from utils import queries
+from utils.pagination import decode_cursor, encode_cursor, keyset_paginate, InvalidCursor
+
+def _users(n):
+    role = Role.query.filter_by(name='admin').one()
+    users = [User(email=f'user{i}@example.com', first_name='F', last_name=f'L{i}',
+                  role_id=role.id, password_hash='x') for i in range(n)]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+def _walk(load, first_page):
+    """Ids seen following next cursors, then following prev cursors back."""
+    pages = [first_page]
+    while pages[-1].has_next:
+        pages.append(load(pages[-1].next_cursor))
+    forward = [[item.id for item in page] for page in pages]
+    backward = [forward[-1]]
+    page = pages[-1]
+    while page.has_prev:
+        page = load(page.prev_cursor)
+        backward.append([item.id for item in page])
+    return forward, backward[::-1]
+
+def test_cursor_roundtrip():
+    key = [datetime(2024, 3, 1, 8, 30), date(2024, 3, 1), 42, 'x']
+    cursor = encode_cursor(key, backwards=True)
+    assert decode_cursor(cursor, 4) == (key, True)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, 2)
+    with pytest.raises(InvalidCursor):
+        decode_cursor('not-a-cursor', 1)
+
+def test_users_pages_forward_and_back(app):
+    users = _users(25)
+    load = lambda cursor: queries.users_page(cursor, per_page=10)
+    first = load(None)
+    assert not first.has_prev and first.has_next
+    forward, backward = _walk(load, first)
+    assert [len(p) for p in forward] == [10, 10, 5]
+    assert sum(forward, []) == [u.id for u in users]
+    assert backward == forward
+
+def test_ties_are_broken_by_id(app):
+    users = _users(1)
+    student = Student(user_id=users[0].id, student_number='S1', class_name='A',
+                      enrollment_date=date(2023, 9, 1))
+    teacher = Teacher(user_id=users[0].id, employee_number='T1', department='D',
+                      hire_date=date(2020, 9, 1))
+    db.session.add_all([student, teacher])
+    db.session.flush()
+    # Seven absences on the same day, three on an earlier one
+    for day, n in [(date(2024, 1, 10), 7), (date(2024, 1, 9), 3)]:
+        for period in range(n):
+            db.session.add(Absence(student_id=student.id, teacher_id=teacher.id,
+                                   date=day, period=f'P{period}'))
+    db.session.commit()
+
+    load = lambda cursor: queries.absences_for_student(student.id, cursor, per_page=4)
+    forward, backward = _walk(load, load(None))
+    expected = [a.id for a in Absence.query.order_by(Absence.date.desc(), Absence.id.desc())]
+    assert sum(forward, []) == expected
+    assert backward == forward
+
+def test_invalid_cursor_falls_back_to_first_page(app):
+    _users(3)
+    page = queries.users_page('garbage', per_page=2)
+    assert [u.id for u in page] == [1, 2]
+    assert not page.has_prev
+
+def test_users_route_links_next_page(app):
+    _users(25)
+    client = app.test_client()
+    user = User.query.first()
+    login(client, user)
+    response = client.get('/admin/users')
+    assert response.status_code == 200
+    assert b'rel="next"' in response.data
+    assert b'25 in total' in response.data
+    assert b'user20@example.com' not in response.data
+    page = queries.users_page(None)
+    response = client.get(f'/admin/users?cursor={page.next_cursor}')
+    assert b'user20@example.com' in response.data
+    assert b'rel="prev"' in response.data
+
+def test_nullable_sort_columns_are_rejected(app):
+    """A NULL key would silently drop rows from every page"""
+    with pytest.raises(ValueError):
+        keyset_paginate(db.select(User), [(User.phone, False), (User.id, False)])
@@ -0,0 +1,125 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import create_app
+from config import TestingConfig
+from models import db, User, Role
+from utils import rate_limit
+from utils.rate_limit import MemoryWindowBackend, SQLWindowBackend
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+class TestRateLimit:
+    def test_login_throttled_before_password_check(self, client, app, monkeypatch):
+        """Once the per-email limit is hit, no KDF call is made"""
+        app.config['RATELIMIT_RULES'] = {'login': [('email', 3, 300)]}
+        checks = []
+        monkeypatch.setattr(User, 'check_password',
+                            lambda self, password: checks.append(password) or False)
+        student_role = Role.query.filter_by(name='student').first()
+        db.session.add(User(email='victim@example.com', first_name='Test',
+                            last_name='User', role_id=student_role.id))
+        db.session.commit()
+
+        statuses = []
+        for _ in range(5):
+            response = client.post('/auth/login', data={
+                'email': 'victim@example.com',
+                'password': 'guess',
+                'submit': 'Log in'
+            })
+            statuses.append(response.status_code)
+
+        assert statuses == [200, 200, 200, 429, 429]
+        assert len(checks) == 3
+        assert int(response.headers['Retry-After']) > 0
+
+    def test_limits_are_keyed_per_ip(self, client, app):
+        """Requests from another client IP are counted separately"""
+        app.config['RATELIMIT_RULES'] = {'reset': [('ip', 1, 300)]}
+
+        def reset_from(ip, **headers):
+            return client.post('/auth/reset-request', data={'email': 'a@example.com'},
+                               environ_base={'REMOTE_ADDR': ip},
+                               headers=headers).status_code
+
+        assert reset_from('10.0.0.1') == 302
+        assert reset_from('10.0.0.1') == 429
+        assert reset_from('10.0.0.2') == 302
+        # Without a trusted proxy a forged X-Forwarded-For changes nothing
+        assert reset_from('10.0.0.1', **{'X-Forwarded-For': '10.9.9.9'}) == 429
+
+    def test_trusted_proxy_forwards_client_ip(self, monkeypatch):
+        """Behind PROXY_FIX_X_FOR proxies, the last forwarded hop is the client"""
+        monkeypatch.setattr(TestingConfig, 'PROXY_FIX_X_FOR', 1)
+        app = create_app('testing')
+        app.config['RATELIMIT_RULES'] = {'reset': [('ip', 1, 300)]}
+        client = app.test_client()
+
+        def reset_via_proxy(forwarded_for):
+            return client.post('/auth/reset-request', data={'email': 'a@example.com'},
+                               environ_base={'REMOTE_ADDR': '127.0.0.1'},
+                               headers={'X-Forwarded-For': forwarded_for}).status_code
+
+        with app.app_context():
+            db.create_all()
+            assert reset_via_proxy('10.0.0.1') == 302
+            # A value prepended by the client is not the hop the proxy saw
+            assert reset_via_proxy('10.9.9.9, 10.0.0.1') == 429
+            assert reset_via_proxy('10.0.0.2') == 302
+            db.drop_all()
+
+    @pytest.mark.parametrize('backend_class', [MemoryWindowBackend, SQLWindowBackend])
+    def test_sliding_window_weights_previous_window(self, app, backend_class):
+        """Half-way through a window, half of the previous hits still count"""
+        backend = backend_class()
+        window = 60
+        start = 6000.0
+        for _ in range(4):
+            assert backend.hit('k', 4, window, start) is True
+        assert backend.hit('k', 4, window, start + 1) is False
+
+        # 30s into the next window: 4 * 0.5 = 2 estimated hits
+        later = start + window + 30
+        assert backend.hit('k', 4, window, later) is True
+        assert backend.hit('k', 4, window, later) is True
+        assert backend.hit('k', 4, window, later) is False
+
+        # Two windows later everything has expired
+        assert backend.hit('k', 4, window, start + 3 * window) is True
+
+    def test_memory_purge_uses_each_key_window(self, app):
+        """Idle keys are dropped two of their own windows after the last hit"""
+        backend = MemoryWindowBackend()
+        now = 1_700_000_000.0
+        backend.hit('short', 5, 60, now)
+        backend.hit('long', 5, 3600, now)
+        backend._purge(now + 130)
+        assert set(backend._windows) == {'long'}
+        backend._purge(now + 2 * 3600)
+        assert backend._windows == {}
+
+    @pytest.mark.parametrize('backend_class', [MemoryWindowBackend, SQLWindowBackend])
+    def test_sweep_deletes_idle_keys(self, app, backend_class):
+        """A sweep drops the keys whose two windows are over, and only those"""
+        backend = backend_class()
+        now = 1_700_000_000.0
+        for i in range(3):
+            backend.hit(f'login:email:user{i}@example.com', 5, 60, now)
+        backend.hit('reset:email:a@example.com', 3, 3600, now)
+        assert backend.sweep(now) == 0
+        assert backend.sweep(now + 130) == 3
+        assert backend.hit('reset:email:a@example.com', 3, 3600, now + 130) is True
+        assert backend.sweep(now + 3 * 3600) == 1
+
+    def test_sql_backend_fails_closed(self, app, monkeypatch):
+        """A key that keeps conflicting is refused, not let through"""
+        attempts = []
+        def conflict(*args):
+            attempts.append(args)
+            raise IntegrityError('INSERT INTO rate_limit_windows', {}, Exception('duplicate'))
+        monkeypatch.setattr(rate_limit, '_slide', conflict)
+        assert SQLWindowBackend().hit('login:ip:10.0.0.1', 5, 60, 6000.0) is False
+        assert len(attempts) == 2
@@ -0,0 +1,89 @@
+from datetime import datetime
+import numpy as np
+import pytest
+
+from conftest import login
+from models import db, Grade, ReportCard, ReportCardCourse
+from utils.report_cards import compute_report_cards, rank, report_card_for
+
+pytestmark = pytest.mark.school(
+    courses=[dict(name=code.title(), code=code, credits=credits)
+             for code, credits in (('MATH', 3), ('ART', 1))])
+
+# Grades of the 2024-T2 term (Dec 2024 - Feb 2025) per student: {course: [values]}
+GRADES = {
+    'A': {'MATH': [16, 18], 'ART': [8]},
+    'B': {'MATH': [12], 'ART': [20]},
+    'C': {'MATH': [17], 'ART': [17]},
+    'D': {'MATH': [10], 'ART': [14]},
+}
+
+@pytest.fixture
+def graded(school):
+    courses = {course.code: course for course in school.courses}
+    students = dict(zip(GRADES, school.students))
+    for name, grades in GRADES.items():
+        for code, values in grades.items():
+            for value in values:
+                db.session.add(Grade(student_id=students[name].id, course_id=courses[code].id,
+                                     teacher_id=school.teacher.id, grade_value=value,
+                                     grade_type='Test', date_recorded=datetime(2025, 1, 10)))
+        # Outside the term: ignored
+        db.session.add(Grade(student_id=students[name].id, course_id=courses['ART'].id,
+                             teacher_id=school.teacher.id, grade_value=0, grade_type='Test',
+                             date_recorded=datetime(2024, 10, 1)))
+    db.session.commit()
+    return students, courses
+
+def test_rank_ties_and_groups():
+    groups = np.array([0, 0, 0, 0, 1, 1])
+    values = np.array([12.0, 15.0, 12.0, 9.0, 3.0, 4.0])
+    ranks, sizes = rank(groups, values)
+    assert ranks.tolist() == [2, 1, 2, 4, 2, 1]
+    assert sizes.tolist() == [4, 4, 4, 4, 2, 2]
+
+def test_compute_report_cards(app, graded):
+    students, courses = graded
+    assert compute_report_cards('2024-T2') == 4
+
+    cards = {c.student_id: c for c in ReportCard.query}
+    a, b, c, d = (cards[students[n].id] for n in 'ABCD')
+    # Math counts three times as much as art
+    assert a.general_average == pytest.approx((17 * 3 + 8) / 4)
+    assert b.general_average == pytest.approx((12 * 3 + 20) / 4)
+    assert a.credits == 4
+    assert (c.class_rank, a.class_rank, b.class_rank, a.class_size) == (1, 2, 3, 3)
+    assert (c.percentile, a.percentile, b.percentile) == (100, 50, 0)
+    assert (d.class_group, d.class_rank, d.class_size, d.percentile) == ('6B', 1, 1, 100)
+
+    card, lines = report_card_for(students['A'].id, '2024-T2')
+    assert card.id == a.id
+    assert [(l.course.code, l.average, l.grade_count, l.class_rank) for l in lines] \
+        == [('ART', 8, 1, 3), ('MATH', 17, 2, 1)]  # tied with C in math
+
+def test_class_recompute_replaces_only_that_class(app, graded):
+    students, courses = graded
+    compute_report_cards('2024-T2')
+    db.session.add(Grade(student_id=students['B'].id, course_id=courses['MATH'].id,
+                         teacher_id=courses['MATH'].teacher_id, grade_value=20,
+                         grade_type='Exam', date_recorded=datetime(2025, 2, 1)))
+    db.session.commit()
+    d_card = ReportCard.query.filter_by(student_id=students['D'].id).one()
+
+    assert compute_report_cards('2024-T2', class_group='6A') == 3
+    assert ReportCard.query.count() == 4
+    assert ReportCardCourse.query.count() == 8
+    assert ReportCard.query.filter_by(student_id=students['D'].id).one().id == d_card.id
+    b = ReportCard.query.filter_by(student_id=students['B'].id).one()
+    assert b.general_average == pytest.approx((16 * 3 + 20) / 4)
+    assert compute_report_cards('2023-T1') == 0
+
+def test_report_card_page(app, graded):
+    students, _ = graded
+    compute_report_cards('2024-T2')
+    client = app.test_client()
+    login(client, students['C'].user)
+    response = client.get('/student/report-card')
+    assert response.status_code == 200
+    assert b'2024-T2' in response.data and b'17.0' in response.data
+    assert b'1 / 3' in response.data
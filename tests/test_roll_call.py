@@ -0,0 +1,94 @@
+from datetime import date, time
+import pytest
+
+from conftest import login
+from models import db, Schedule, Absence
+from utils.roll_call import record_roll_call, slot_date, slot_period
+from utils.statistics import read_snapshot
+from utils.student_stats import stats_for
+
+@pytest.fixture
+def slot(school):
+    """A Tuesday morning slot of 6A, three students in 6A and one in 6B"""
+    schedule = Schedule(course_id=school.course.id, day_of_week='Tuesday', start_time=time(8),
+                        end_time=time(9), classroom='B12', class_group='6A')
+    db.session.add(schedule)
+    db.session.commit()
+    return school.user, school.teacher, schedule, school.students
+
+def test_slot_date_and_period(app, slot):
+    schedule = slot[2]
+    assert slot_date(schedule, date(2025, 3, 11)) == date(2025, 3, 11)  # a Tuesday
+    assert slot_date(schedule, date(2025, 3, 10)) == date(2025, 3, 4)
+    assert slot_period(schedule) == 'Morning'
+
+def test_roll_call_is_idempotent(app, slot):
+    _, teacher, schedule, students = slot
+    day = date(2025, 3, 11)
+    assert record_roll_call(schedule, day, [students[0].id, students[1].id], teacher.id) == 2
+    db.session.commit()
+    assert record_roll_call(schedule, day, [students[0].id, students[1].id, students[2].id],
+                            teacher.id) == 1
+    db.session.commit()
+
+    assert Absence.query.count() == 3
+    assert stats_for(students[0].id).absence_count == 1
+    assert read_snapshot()['total_absences'] == 3
+    # Another week of the same slot is a different roll call
+    assert record_roll_call(schedule, date(2025, 3, 18), [students[0].id], teacher.id) == 1
+
+def test_duplicate_insert_is_rejected_by_the_database(app, slot):
+    _, teacher, schedule, students = slot
+    db.session.add(Absence(student_id=students[0].id, teacher_id=teacher.id,
+                           date=date(2025, 3, 11), period='Morning', schedule_id=schedule.id))
+    db.session.commit()
+    with pytest.raises(Exception):
+        db.session.add(Absence(student_id=students[0].id, teacher_id=teacher.id,
+                               date=date(2025, 3, 11), period='Morning',
+                               schedule_id=schedule.id))
+        db.session.commit()
+    db.session.rollback()
+
+def test_roll_call_page(app, slot):
+    user, _, schedule, students = slot
+    client = app.test_client()
+    login(client, user)
+    url = f'/teacher/roll-call/{schedule.id}?date=2025-03-11'
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data.count(b'type="checkbox"') == 3
+
+    for _ in range(2):
+        response = client.post(url, data={'absent': [students[0].id, students[2].id]})
+        assert response.status_code == 302
+    assert Absence.query.count() == 2
+    assert b'Absence recorded' in client.get(url).data
+
+    # Students of another class cannot be ticked
+    response = client.post(url, data={'absent': [students[3].id]})
+    assert response.status_code == 200
+    assert Absence.query.count() == 2
+    assert client.get('/teacher/roll-call').status_code == 200
+
+def test_concurrent_submission_falls_back_to_missing_rows(app, slot, monkeypatch):
+    import utils.roll_call as roll_call
+    _, teacher, schedule, students = slot
+    day = date(2025, 3, 11)
+    record_roll_call(schedule, day, [students[0].id], teacher.id)
+    db.session.commit()
+
+    # A snapshot read misses the row committed by the "other" submission;
+    # only a locking read sees it (REPEATABLE READ on InnoDB)
+    real = roll_call.recorded_absentees
+    calls = []
+    def snapshot_read(schedule_id, day, student_ids=None, lock=False):
+        calls.append(lock)
+        return real(schedule_id, day, student_ids) if lock else set()
+    monkeypatch.setattr(roll_call, 'recorded_absentees', snapshot_read)
+
+    assert record_roll_call(schedule, day, [students[0].id, students[1].id], teacher.id) == 1
+    db.session.commit()
+    assert calls == [False, True]
+    assert Absence.query.count() == 2
+    assert stats_for(students[0].id).absence_count == 1
+    assert read_snapshot()['total_absences'] == 2
@@ -0,0 +1,72 @@
+from datetime import date
+import pytest
+
+from models import db, GRADE_TYPES, User, Student, Teacher, Grade, Absence, Schedule, StudentStats
+from utils import admin
+from utils.school_generator import class_names, generate_school
+from utils.statistics import reconcile_statistics
+from utils.student_stats import rebuild_student_stats
+
+def generate(**kwargs):
+    options = dict(students=30, years=2, seed=7, batch_size=64, today=date(2025, 1, 15))
+    options.update(kwargs)
+    return generate_school(**options)
+
+def snapshot():
+    grades = db.session.execute(
+        db.select(Student.student_number, Grade.grade_value, Grade.grade_type, Grade.date_recorded)
+        .join(Student, Grade.student_id == Student.id).order_by(Grade.id)).all()
+    absences = db.session.execute(
+        db.select(Student.student_number, Absence.date, Absence.is_justified)
+        .join(Student, Absence.student_id == Student.id).order_by(Absence.id)).all()
+    return grades, absences
+
+def test_class_names():
+    assert class_names(6) == ['6A', '5A', '4A', '3A', '6B', '5B']
+    assert class_names(110)[-1] == '5AB'
+
+def test_generate_school(app, monkeypatch):
+    hashed = []
+    real_hash = admin.hash_password
+    monkeypatch.setattr(admin, 'hash_password', lambda pw: hashed.append(pw) or real_hash(pw))
+    created = generate()
+
+    assert len(hashed) == 4
+    assert created['students'] == Student.query.count() == 30
+    assert created['parents'] == 15
+    assert created['teachers'] == Teacher.query.count() == 11
+    assert Schedule.query.count() == 2 * 11
+    # 11 subjects, 6 grades a year, two school years
+    assert created['grades'] == Grade.query.count() == 30 * 11 * 6 * 2
+    assert created['users'] == User.query.count() == 30 + 15 + 11
+    assert db.session.scalar(db.select(db.func.max(Grade.date_recorded))).date() <= date(2025, 1, 15)
+    assert db.session.scalar(db.select(db.func.min(Absence.date))) >= date(2023, 9, 1)
+    # Only types the grade form offers, so generated grades can be edited
+    assert set(db.session.scalars(db.select(Grade.grade_type).distinct())) \
+        == {value for value, _ in GRADE_TYPES}
+
+    # Aggregates kept by the bulk inserts match a full recount
+    before = {s.student_id: (s.grade_count, round(s.grade_sum, 2), s.best_grade, s.high_count,
+                             s.low_count, s.absence_count, s.unjustified_count)
+              for s in StudentStats.query}
+    assert reconcile_statistics() == {}
+    rebuild_student_stats()
+    after = {s.student_id: (s.grade_count, round(s.grade_sum, 2), s.best_grade, s.high_count,
+                            s.low_count, s.absence_count, s.unjustified_count)
+             for s in StudentStats.query}
+    assert before == after
+
+    with pytest.raises(ValueError):
+        generate()
+
+def test_same_seed_same_data(app):
+    generate()
+    first = snapshot()
+    db.drop_all()
+    db.create_all()
+    generate(batch_size=10)
+    assert snapshot() == first
+    db.drop_all()
+    db.create_all()
+    generate(seed=8)
+    assert snapshot() != first
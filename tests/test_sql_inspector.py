@@ -0,0 +1,67 @@
+import pytest
+
+from flask import render_template
+
+from conftest import login
+from models import db, Student, Course, Grade
+from utils.sql_inspector import QueryBudgetExceeded, statement_shape
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+pytestmark = pytest.mark.school(classes=['6A'] * 6)
+
+@pytest.fixture
+def teacher_user(school):
+    """A teacher who graded six different students"""
+    for student in school.students:
+        db.session.add(Grade(student_id=student.id, course_id=school.course.id,
+                             teacher_id=school.teacher.id, grade_value=12, grade_type='Test'))
+    db.session.commit()
+    return school.user
+
+def add_lazy_route(app):
+    """A page that lazy-loads each student's user inside the template loop"""
+    def lazy_students():
+        return render_template('teacher/course_students.html',
+                               course=Course.query.first(), students=Student.query.all())
+    app.add_url_rule('/lazy-students', 'lazy_students', lazy_students)
+
+class TestSQLInspector:
+    def test_statement_shape(self):
+        """Bound values and IN lists do not create new shapes"""
+        assert statement_shape('SELECT *\n  FROM t WHERE id IN (?, ?, ?)') == \
+            statement_shape('SELECT * FROM t WHERE id IN (?, ?)')
+
+    def test_counts_and_n_plus_one(self, app, client, teacher_user):
+        """Lazy loads in a template loop are reported with the template name"""
+        add_lazy_route(app)
+
+        response = client.get('/lazy-students')
+
+        report = app.extensions['sql_inspector'].last_report
+        assert response.headers['X-SQL-Queries'] == str(report.total)
+        assert report.endpoint == 'lazy_students'
+        flagged = [shape for shape, count in report.n_plus_one if count >= 6]
+        assert any('FROM users' in shape for shape in flagged)
+        assert 'template teacher/course_students.html' in report.origins[flagged[0]]
+
+    def test_eager_loaded_page_is_not_flagged(self, app, client, teacher_user):
+        """The teacher's grade list loads students and users with the grades"""
+        login(client, teacher_user)
+
+        response = client.get('/teacher/grades')
+
+        assert response.status_code == 200
+        assert app.extensions['sql_inspector'].last_report.n_plus_one == []
+
+    def test_budget_is_enforced(self, app, client, teacher_user):
+        """Going over an endpoint's budget fails the request in tests"""
+        app.config['SQL_QUERY_BUDGETS'] = {'lazy_students': 5}
+        add_lazy_route(app)
+
+        with pytest.raises(QueryBudgetExceeded) as excinfo:
+            client.get('/lazy-students')
+        assert excinfo.value.report.over_budget
+        assert 'lazy_students' in str(excinfo.value)
@@ -0,0 +1,98 @@
+from datetime import date
+import pytest
+
+from conftest import count_queries
+from models import db, User, Role, Grade, StatisticsSnapshot
+from utils.statistics import read_snapshot, reconcile_statistics
+
+@pytest.fixture
+def runner(app):
+    return app.test_cli_runner()
+
+pytestmark = pytest.mark.school(classes=['A'])
+
+@pytest.fixture
+def graded(school):
+    db.session.add_all([
+        Grade(student_id=school.students[0].id, course_id=school.course.id,
+              teacher_id=school.teacher.id, grade_value=v, grade_type='exam',
+              date_recorded=date(2024, 1, i + 1))
+        for i, v in enumerate([12, 15])
+    ])
+    db.session.commit()
+
+def set_counter(name, value):
+    table = StatisticsSnapshot.__table__
+    db.session.execute(table.delete().where(table.c.name == name))
+    db.session.execute(table.insert().values(name=name, shard=0, value=value))
+
+def test_counters_follow_inserts_and_deletes(app, graded):
+    stats = read_snapshot()
+    assert stats['total_users'] == 2
+    assert stats['total_teachers'] == 1
+    assert stats['total_students'] == 1
+    assert stats['total_courses'] == 1
+    assert stats['total_grades'] == 2
+    assert stats['total_parents'] == 0
+
+    db.session.delete(Grade.query.first())
+    db.session.commit()
+    assert read_snapshot()['total_grades'] == 1
+
+def test_rolled_back_inserts_are_not_counted(app, graded):
+    db.session.add(User(email='ghost@example.com', first_name='G', last_name='H',
+                        role_id=1, password_hash='x'))
+    db.session.flush()
+    db.session.rollback()
+    assert read_snapshot()['total_users'] == 2
+
+def test_reconcile_corrects_drift(app, graded):
+    set_counter('total_grades', 40)
+    db.session.execute(Grade.__table__.delete())  # bypasses the ORM events
+    db.session.commit()
+
+    assert reconcile_statistics() == {'total_grades': -40}
+    assert read_snapshot()['total_grades'] == 0
+    assert reconcile_statistics() == {}
+
+def test_missing_counters_are_counted_without_writing(app, graded):
+    db.session.execute(StatisticsSnapshot.__table__.delete())
+    db.session.commit()
+    assert read_snapshot()['total_users'] == 2
+    assert StatisticsSnapshot.query.count() == 0
+
+    reconcile_statistics()
+    assert StatisticsSnapshot.query.count() == 7
+
+def test_shards_add_up_and_fold_on_reconcile(app, graded):
+    role_id = Role.query.first().id
+    for i in range(30):
+        db.session.add(User(email=f'more{i}@example.com', first_name='F', last_name='L',
+                            role_id=role_id, password_hash='x'))
+        db.session.commit()
+    shards = StatisticsSnapshot.query.filter_by(name='total_users').all()
+    assert len(shards) > 1
+    assert sum(shard.value for shard in shards) == 32
+    assert read_snapshot()['total_users'] == 32
+
+    assert reconcile_statistics() == {}
+    values = {shard.shard: shard.value for shard in
+              StatisticsSnapshot.query.filter_by(name='total_users')
+              .execution_options(populate_existing=True)}
+    assert values[0] == 32 and sum(values.values()) == 32
+
+def test_reconcile_counts_before_writing(app, graded):
+    """The counts are plain reads, not subqueries of the counter writes"""
+    set_counter('total_grades', 40)
+    with count_queries() as statements:
+        assert reconcile_statistics() == {'total_grades': -38}
+    writes = [s for s in statements if s.startswith(('UPDATE', 'INSERT'))]
+    assert writes and not [s for s in writes if 'count(' in s.lower()]
+
+def test_reconcile_command(app, runner, graded):
+    set_counter('total_users', 5)
+    db.session.commit()
+    result = runner.invoke(args=['reconcile-statistics'])
+    assert 'total_users: corrected by -3' in result.output
+    result = runner.invoke(args=['reconcile-statistics'])
+    assert 'up to date' in result.output
@@ -0,0 +1,89 @@
+from datetime import date
+import pytest
+
+from models import db, Grade, Absence, StudentStats
+from utils.student_stats import stats_for
+
+pytestmark = pytest.mark.school(classes=['6A', '6A'])
+
+@pytest.fixture
+def runner(app):
+    return app.test_cli_runner()
+
+def add_grade(school, value, student=0):
+    grade = Grade(student_id=school.students[student].id, course_id=school.course.id,
+                  teacher_id=school.teacher.id, grade_value=value, grade_type='Test')
+    db.session.add(grade)
+    db.session.commit()
+    return grade
+
+def add_absence(school, justified=False, student=0):
+    absence = Absence(student_id=school.students[student].id, teacher_id=school.teacher.id,
+                      date=date.today(), period='Morning', is_justified=justified)
+    db.session.add(absence)
+    db.session.commit()
+    return absence
+
+def snapshot(student_id):
+    s = db.session.get(StudentStats, student_id, populate_existing=True)
+    return (s.grade_count, round(s.grade_sum, 2), s.best_grade, s.high_count, s.low_count,
+            s.absence_count, s.unjustified_count)
+
+class TestStudentStats:
+    def test_inserts_update_the_aggregates(self, school):
+        """Each grade and absence adds its deltas to the student's row"""
+        for value in (12, 17.5, 8):
+            add_grade(school, value)
+        add_absence(school)
+        add_absence(school, justified=True)
+
+        student_id = school.students[0].id
+        assert snapshot(student_id) == (3, 37.5, 17.5, 1, 1, 2, 1)
+        stats = stats_for(student_id)
+        assert stats.average == 12.5
+        assert stats.best == 17.5
+
+    def test_update_and_delete(self, school):
+        """Changing or removing the best grade recomputes the maximum"""
+        add_grade(school, 14)
+        best = add_grade(school, 18)
+        absence = add_absence(school)
+        student_id = school.students[0].id
+
+        best.grade_value = 9
+        db.session.commit()
+        assert snapshot(student_id) == (2, 23, 14, 0, 1, 1, 1)
+
+        db.session.delete(best)
+        absence.is_justified = True
+        db.session.commit()
+        assert snapshot(student_id) == (1, 14, 14, 0, 0, 1, 0)
+
+    def test_moving_a_grade_between_students(self, school):
+        """A grade reassigned to another student moves its counters"""
+        grade = add_grade(school, 16)
+        grade.student_id = school.students[1].id
+        db.session.commit()
+
+        assert snapshot(school.students[0].id) == (0, 0, None, 0, 0, 0, 0)
+        assert snapshot(school.students[1].id) == (1, 16, 16, 1, 0, 0, 0)
+
+    def test_rebuild_matches_incremental(self, school, runner):
+        """The rebuild command recomputes the same values"""
+        for value in (5, 11, 19):
+            add_grade(school, value)
+            add_grade(school, value + 0.5, student=1)
+        add_absence(school, student=1)
+        before = [snapshot(s.id) for s in school.students]
+
+        db.session.execute(StudentStats.__table__.delete())
+        db.session.commit()
+        result = runner.invoke(args=['rebuild-student-stats'])
+
+        assert 'Rebuilt statistics for 2 students' in result.output
+        assert [snapshot(s.id) for s in school.students] == before
+
+    def test_student_without_history(self, school):
+        """Students without any grade read zeros"""
+        stats = stats_for(school.students[0].id)
+        assert (stats.grade_count, stats.average, stats.best) == (0, 0, 0)
@@ -0,0 +1,125 @@
+import pytest
+from sqlalchemy import text
+
+from conftest import login
+from models import db, User, Role
+from utils import totp
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def totp_user(app):
+    student_role = Role.query.filter_by(name='student').first()
+    user = User(email='totp@example.com', first_name='Totp',
+                last_name='User', role_id=student_role.id)
+    user.set_password('StrongPass1!')
+    user.enable_totp(totp.generate_secret(), None)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+class TestTOTP:
+    def test_rfc6238_reference_values(self):
+        """SHA-1 test vectors from RFC 6238 appendix B (last 6 digits)"""
+        secret = 'GEZDGNBVGY3TQOJQGEZDGNBVGY3TQOJQ'  # "12345678901234567890"
+        assert totp.totp(secret, now=59) == '287082'
+        assert totp.totp(secret, now=1111111109) == '081804'
+        assert totp.totp(secret, now=2000000000) == '279037'
+
+    def test_window_and_replay(self):
+        secret = totp.generate_secret()
+        now = 1700000000
+        previous_code = totp.hotp(secret, totp.time_step(now) - 1)
+        step = totp.match(secret, previous_code, window=1, now=now)
+        assert step == totp.time_step(now) - 1
+        assert totp.match(secret, previous_code, window=0, now=now) is None
+        assert totp.match(secret, previous_code, window=1, last_step=step, now=now) is None
+
+    def test_totp_login_sends_no_email(self, client, app, totp_user):
+        """TOTP users are verified locally without an email code"""
+        mail = app.extensions['mail']
+        with mail.record_messages() as outbox:
+            response = client.post('/auth/login', data={
+                'email': 'totp@example.com',
+                'password': 'StrongPass1!'
+            })
+            assert '/auth/mfa-verify' in response.location
+
+            code = totp.totp(totp_user.mfa_secret)
+            response = client.post('/auth/mfa-verify', data={'code': code})
+        assert outbox == []
+        assert response.status_code == 302
+        assert '/auth/login' not in response.location
+
+    def test_code_cannot_be_replayed(self, client, app, totp_user):
+        code = totp.totp(totp_user.mfa_secret)
+        assert totp_user.verify_totp(code) is True
+        assert totp_user.verify_totp(code) is False
+
+    def test_email_fallback(self, client, app, totp_user):
+        """A TOTP user can still receive a code by email"""
+        with client.session_transaction() as sess:
+            sess['pre_auth_user_id'] = totp_user.id
+
+        mail = app.extensions['mail']
+        with mail.record_messages() as outbox:
+            client.post('/auth/mfa-email')
+        assert len(outbox) == 1
+        email_code = outbox[0].body.split('intranet is: ')[1].split()[0]
+
+        response = client.post('/auth/mfa-verify', data={'code': email_code})
+        assert response.status_code == 302
+        assert '/auth/login' not in response.location
+
+    def test_enrollment(self, client, app):
+        student_role = Role.query.filter_by(name='student').first()
+        user = User(email='new@example.com', first_name='New', last_name='User',
+                    role_id=student_role.id, mfa_verified=True)
+        user.set_password('StrongPass1!')
+        db.session.add(user)
+        db.session.commit()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+            sess['_fresh'] = True
+
+        assert client.get('/auth/totp/setup').status_code == 200
+        with client.session_transaction() as sess:
+            secret = sess['totp_pending_secret']
+
+        response = client.post('/auth/totp/setup', data={'code': totp.totp(secret)})
+        assert response.status_code == 302
+        user = db.session.get(User, user.id)
+        assert user.uses_totp is True
+        assert user.mfa_secret == secret
+
+    def test_secret_is_encrypted_at_rest(self, app, totp_user):
+        """The users row holds a ciphertext, not the base32 seed"""
+        stored = db.session.execute(text("SELECT mfa_secret FROM users WHERE id = :id"),
+                                    {'id': totp_user.id}).scalar()
+        assert stored != totp_user.mfa_secret
+        assert totp_user.mfa_secret not in stored
+        assert totp.decrypt_secret(stored, app.config['SECRET_KEY']) == totp_user.mfa_secret
+
+    def test_disabling_needs_code_or_password(self, client, app, totp_user):
+        """A session alone cannot turn the authenticator app off"""
+        user_id = totp_user.id
+        secret = totp_user.mfa_secret
+        login(client, totp_user)
+
+        def uses_totp():
+            db.session.expire_all()
+            return db.session.get(User, user_id).uses_totp
+
+        client.post('/auth/totp/disable', data={})
+        assert uses_totp()
+        client.post('/auth/totp/disable', data={'confirmation': 'WrongPass1!'})
+        assert uses_totp()
+        client.post('/auth/totp/disable', data={'confirmation': totp.totp(secret)})
+        assert not uses_totp()
+
+        db.session.get(User, user_id).enable_totp(secret, None)
+        db.session.commit()
+        client.post('/auth/totp/disable', data={'confirmation': 'StrongPass1!'})
+        assert not uses_totp()
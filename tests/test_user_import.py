@@ -0,0 +1,135 @@
+import csv
+import io
+import pytest
+from openpyxl import Workbook
+
+from conftest import login
+from models import db, User, Role
+from utils.statistics import read_snapshot, reconcile_statistics
+from utils.user_import import ImportFileError, _Importer, import_users, read_rows
+
+@pytest.fixture
+def runner(app):
+    return app.test_cli_runner()
+
+CSV = """email,first_name,last_name,role,password,student_number,class_name,employee_number,department,children,relationship_type
+anna@example.com,Anna,Martin,student,,S001,6A,,,,
+paul@example.com,Paul,Martin,student,,S002,6B,,,,
+marie@example.com,Marie,Martin,parent,,,,,,S001;S002,mother
+prof@example.com,Jean,Dupont,teacher,StrongPass1!,,,T001,Math,,
+boss@example.com,Claire,Leroy,admin,,,,A001,,,
+bad-email,Bad,Row,student,,S003,6A,,,,
+anna@example.com,Anna,Twice,student,,S004,6A,,,,
+noclass@example.com,No,Class,student,,S005,,,,,
+weak@example.com,Weak,Password,teacher,short,,,T002,Math,,
+orphan@example.com,Orphan,Parent,parent,,,,,,S999,
+"""
+
+def rows(text=CSV):
+    return read_rows(io.BytesIO(text.encode()), 'users.csv')
+
+def test_import_creates_users_profiles_and_links(app):
+    report = import_users(rows(), chunk_size=3)
+
+    assert report.rows == 10
+    assert report.valid == 5
+    assert {line for line, _, _ in report.errors} == {7, 8, 9, 10, 11}
+    assert report.created == {'users': 5, 'students': 2, 'teachers': 1, 'administrators': 1,
+                              'parents': 1, 'parent_links': 2}
+    marie = User.query.filter_by(email='marie@example.com').one()
+    assert sorted(link.student.student_number for link in marie.parent_profile.children) \
+        == ['S001', 'S002']
+    assert User.query.filter_by(email='prof@example.com').one().check_password('StrongPass1!')
+    assert User.query.filter_by(email='anna@example.com').one().student_profile.class_name == '6A'
+    assert read_snapshot()['total_students'] == 2
+    assert reconcile_statistics() == {}
+
+def test_dry_run_writes_nothing(app):
+    report = import_users(rows(), dry_run=True)
+    assert report.valid == 5
+    assert report.created['parent_links'] == 2
+    assert User.query.count() == 0
+
+def test_existing_accounts_are_rejected(app):
+    import_users(rows())
+    report = import_users(rows())
+    assert report.valid == 0
+    assert User.query.count() == 5
+    assert any('already in use' in message for _, _, message in report.errors)
+
+def test_missing_columns(app):
+    with pytest.raises(ImportFileError):
+        list(read_rows(io.BytesIO(b'email,first_name\nx@example.com,X\n'), 'users.csv'))
+    with pytest.raises(ImportFileError):
+        read_rows(io.BytesIO(b''), 'users.txt')
+
+def test_non_utf8_csv(app):
+    latin1 = CSV.replace('Marie', 'Mélanie').encode('cp1252')
+    with pytest.raises(ImportFileError, match='Line 4 is not valid UTF-8'):
+        import_users(read_rows(io.BytesIO(latin1), 'users.csv'))
+    assert User.query.count() == 0
+
+def test_xlsx_import(app):
+    workbook = Workbook()
+    for row in csv.reader(io.StringIO(CSV)):
+        workbook.active.append(row)
+    data = io.BytesIO()
+    workbook.save(data)
+    data.seek(0)
+    report = import_users(read_rows(data, 'users.xlsx'))
+    assert (report.rows, report.valid) == (10, 5)
+    assert {line for line, _, _ in report.errors} == {7, 8, 9, 10, 11}
+    assert len(User.query.filter_by(email='marie@example.com').one().parent_profile.children) == 2
+
+def test_corrupt_workbook(app):
+    with pytest.raises(ImportFileError, match='not a valid .xlsx'):
+        list(read_rows(io.BytesIO(b'PK\x03\x04 truncated'), 'users.xlsx'))
+
+def test_rejected_chunk_is_forgotten(app, monkeypatch):
+    """Rows of a chunk lost to a concurrent insert no longer count as known"""
+    validate = _Importer.validate
+    def racing(self, chunk):
+        forms = validate(self, chunk)
+        if any(form.email.data == 'anna@example.com' for form in forms):
+            db.session.add(User(email='anna@example.com', first_name='A', last_name='B',
+                                role_id=Role.query.filter_by(name='student').one().id,
+                                password_hash='x'))
+            db.session.commit()
+        return forms
+    monkeypatch.setattr(_Importer, 'validate', racing)
+
+    report = import_users(rows('\n'.join(CSV.splitlines()[:4])), chunk_size=2)
+    errors = {line: message for line, _, message in report.errors}
+    assert errors[2].startswith('not saved') and errors[3].startswith('not saved')
+    assert errors[4] == 'children: unknown student number(s) S001, S002.'
+    assert User.query.count() == 1
+
+def test_import_command(app, runner, tmp_path):
+    path = tmp_path / 'users.csv'
+    path.write_text(CSV)
+    errors = tmp_path / 'errors.csv'
+    result = runner.invoke(args=['import-users', str(path), '--errors', str(errors)])
+    assert '10 rows read, 5 valid, 5 rejected' in result.output
+    assert errors.read_text().startswith('line,email,error')
+
+def test_import_page(app):
+    role = Role.query.filter_by(name='admin').one()
+    admin = User(email='root@example.com', first_name='Ro', last_name='Ot', role_id=role.id,
+                 password_hash='x')
+    db.session.add(admin)
+    db.session.commit()
+    client = app.test_client()
+    login(client, admin)
+
+    response = client.post('/admin/users/import', data={
+        'file': (io.BytesIO(CSV.encode()), 'users.csv'), 'dry_run': 'y',
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert b'Dry run' in response.data and b'import-errors.csv' in response.data
+    assert User.query.count() == 1
+
+    response = client.post('/admin/users/import', data={
+        'file': (io.BytesIO(CSV.encode()), 'users.csv'),
+    }, content_type='multipart/form-data')
+    assert b'5 users imported' in response.data
+    assert User.query.count() == 6
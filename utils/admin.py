@@ -12,8 +12,45 @@ from models import (
     Schedule,
     ParentStudent,
 )
+from utils.hashing import hash_password
 from datetime import date, time, datetime, timedelta
 import random
+import threading
+
+# Password of every sample account, per role
+SAMPLE_PASSWORDS = {
+    "student": "Student123!",
+    "parent": "Parent123!",
+    "teacher": "Teacher123!",
+    "admin": "Admin123!",
+}
+
+_sample_data_running = threading.Lock()
+
+
+def sample_password_hashes():
+    """One hash per role, shared by all its sample accounts: the key
+    derivation is deliberately slow and runs once per role, not per user."""
+    return {role: hash_password(password) for role, password in SAMPLE_PASSWORDS.items()}
+
+
+def start_sample_data(app):
+    """Run :func:`create_sample_data` in a background thread; returns False
+    if a run is already in progress."""
+    if not _sample_data_running.acquire(blocking=False):
+        return False
+
+    def run():
+        try:
+            with app.app_context():
+                create_sample_data()
+        except Exception as e:
+            app.logger.error(f"Error creating sample data: {e}")
+        finally:
+            _sample_data_running.release()
+
+    threading.Thread(target=run, daemon=True).start()
+    return True
 
 
 def create_sample_data():
@@ -35,6 +72,7 @@ def create_sample_data():
     parent_role = Role.query.filter_by(name="parent").first()
     teacher_role = Role.query.filter_by(name="teacher").first()
     admin_role = Role.query.filter_by(name="admin").first()
+    password_hashes = sample_password_hashes()
 
     # Predefined accounts for testing
     if not User.query.filter_by(email="ulbis047@gmail.com").first():
@@ -48,10 +86,10 @@ def create_sample_data():
             address="02 route de Duclair Canteleu",
             birthdate=date(1980, 1, 1),
         )
-        user.set_password("Admin123!")
+        user.password_hash = password_hashes["admin"]
         user.avatar_filename = "Catherine_SPOOKIE.png"
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
         admin_profile = Administrator(
             user_id=user.id, employee_number="ADM900", position="Administrator"
         )
@@ -71,9 +109,9 @@ def create_sample_data():
                 address="1 Admin Way",
                 birthdate=date(1980, 1, 1),
             )
-            user.set_password("Admin123!")
+            user.password_hash = password_hashes["admin"]
             db.session.add(user)
-            db.session.commit()
+            db.session.flush()
             admin = Administrator(
                 user_id=user.id, employee_number=f"ADM{i:03d}", position="Administrator"
             )
@@ -95,9 +133,9 @@ def create_sample_data():
                 address="1 Teacher St",
                 birthdate=date(1985, 1, 1),
             )
-            user.set_password("Teacher123!")
+            user.password_hash = password_hashes["teacher"]
             db.session.add(user)
-            db.session.commit()
+            db.session.flush()
             teacher = Teacher(
                 user_id=user.id,
                 employee_number=f"TCH{i:03d}",
@@ -124,10 +162,10 @@ def create_sample_data():
             address="33 route avenue du docteur planet La Rochelle",
             birthdate=date(1995, 4, 11),
         )
-        user.set_password("Teacher123!")
+        user.password_hash = password_hashes["teacher"]
         user.avatar_filename = "Thomas_LECERIER.png"
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
         teacher_profile = Teacher(
             user_id=user.id,
             employee_number="TCH900",
@@ -184,11 +222,11 @@ def create_sample_data():
                 address=address,
                 birthdate=birth,
             )
-            user.set_password("Student123!")
+            user.password_hash = password_hashes["student"]
             if i == 1:
                 user.avatar_filename = "Prune_LAGUERRE.png"
             db.session.add(user)
-            db.session.commit()
+            db.session.flush()
             profile = Student(
                 user_id=user.id,
                 student_number=f"STU{i:03d}",
@@ -215,10 +253,10 @@ def create_sample_data():
             address="24 rue de vaux de Foletier La Rochelle",
             birthdate=date(2015, 11, 1),
         )
-        user.set_password("Student123!")
+        user.password_hash = password_hashes["student"]
         user.avatar_filename = "Richard_LAGUERRE.png"
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
         student_profile = Student(
             user_id=user.id,
             student_number="STU900",
@@ -249,9 +287,9 @@ def create_sample_data():
                 address="1 Parent Ave",
                 birthdate=date(1980, 1, 1),
             )
-            user.set_password("Parent123!")
+            user.password_hash = password_hashes["parent"]
             db.session.add(user)
-            db.session.commit()
+            db.session.flush()
             profile = Parent(user_id=user.id)
             db.session.add(profile)
             parents.append(profile)
@@ -271,10 +309,10 @@ def create_sample_data():
             address="24 rue de vaux de Foletier La Rochelle",
             birthdate=date(1975, 11, 1),
         )
-        user.set_password("Parent123!")
+        user.password_hash = password_hashes["parent"]
         user.avatar_filename = "Chauvet_LAGUERRE.png"
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
         parent_profile = Parent(user_id=user.id)
         db.session.add(parent_profile)
         parents.append(parent_profile)
@@ -0,0 +1,101 @@
+"""Write-behind buffer for authentication audit logs.
+
+Auth events are collected in memory and written to ``auth_logs`` with a
+single bulk insert once the buffer reaches ``AUDIT_LOG_BATCH_SIZE`` rows
+or every ``AUDIT_LOG_FLUSH_INTERVAL`` seconds, whichever comes first.
+The rollup counters of ``auth_log_rollups`` are updated in the same
+transaction. Pending rows are flushed when the process exits. ``AUDIT_LOG_SYNC``
+writes every event immediately, which keeps tests deterministic.
+"""
+import atexit
+import threading
+
+from flask import current_app
+
+from models import db, AuthLog
+from utils.auth_rollups import apply_rollups
+
+
+class AuditLogWriter:
+    """Buffer ``AuthLog`` rows and insert them in batches."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("AUDIT_LOG_SYNC", False)
+        app.config.setdefault("AUDIT_LOG_BATCH_SIZE", 100)
+        app.config.setdefault("AUDIT_LOG_FLUSH_INTERVAL", 2.0)
+
+        self.app = app
+        self.sync = app.config["AUDIT_LOG_SYNC"]
+        self.batch_size = app.config["AUDIT_LOG_BATCH_SIZE"]
+        self.interval = app.config["AUDIT_LOG_FLUSH_INTERVAL"]
+        app.extensions["audit_log"] = self
+
+        if not self.sync:
+            threading.Thread(target=self._run, daemon=True).start()
+            atexit.register(self.flush)
+
+    def write(self, row):
+        """Record one auth event given as a dict of ``AuthLog`` columns."""
+        if self.sync:
+            _write_now(row)
+            return
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self):
+        """Insert every buffered row in one transaction."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as conn:
+                        conn.execute(AuthLog.__table__.insert(), rows)
+                        apply_rollups(conn, rows)
+            except Exception as e:
+                self.app.logger.error(f"Error flushing {len(rows)} auth logs: {e}")
+                with self._lock:
+                    # Keep the rows for the next attempt, bounded so that a
+                    # database outage cannot exhaust memory
+                    self._buffer[:0] = rows[-self.batch_size * 10:]
+                return 0
+            return len(rows)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+def write_auth_log(row):
+    """Hand an auth event to the application's audit writer."""
+    writer = current_app.extensions.get("audit_log")
+    if writer is None:
+        _write_now(row)
+        return
+    writer.write(row)
+
+
+def _write_now(row):
+    db.session.add(AuthLog(**row))
+    apply_rollups(db.session.connection(), [row])
+    db.session.commit()
@@ -0,0 +1,160 @@
+"""Time-bucketed rollups and retention for ``auth_logs``.
+
+Every batch of auth events written by the audit writer also adds its
+counts to ``auth_log_rollups`` in the same transaction: attempts,
+failures and MFA failures per minute, hour and day bucket, for each IP
+address and each email. Security dashboards read these small tables
+instead of scanning the raw log.
+
+Raw rows older than ``AUTH_LOG_RETENTION_DAYS`` are moved into gzipped
+JSON-lines archives by :func:`archive_auth_logs`, which also drops fine
+grained rollups past ``AUTH_ROLLUP_RETENTION_DAYS``.
+"""
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from models import db, AuthLog, AuthLogRollup
+from utils.counters import increment_many
+
+GRANULARITIES = ("minute", "hour", "day")
+DIMENSIONS = ("ip", "email")
+
+# Events that are not sign-in attempts. A correct password only sends
+# the MFA code: the attempt is the login_success or MFA failure after it.
+NON_ATTEMPT_ACTIONS = {"logout", "totp_enabled", "totp_disabled", "mfa_code_sent"}
+MFA_FAILURE_ACTIONS = {"mfa_failed", "mfa_expired", "mfa_locked"}
+
+KEY_COLUMNS = ("granularity", "bucket_start", "dimension", "value")
+
+
+def bucket_start(timestamp, granularity):
+    if granularity == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rollup_deltas(rows):
+    """Aggregate auth log rows (dicts) into rollup counter deltas."""
+    deltas = defaultdict(lambda: {"attempts": 0, "failures": 0, "mfa_failures": 0})
+    for row in rows:
+        if row["action"] in NON_ATTEMPT_ACTIONS:
+            continue
+        timestamp = row.get("timestamp") or datetime.utcnow()
+        values = {"ip": row.get("ip_address"), "email": (row.get("email") or "").lower()}
+        for granularity in GRANULARITIES:
+            start = bucket_start(timestamp, granularity)
+            for dimension in DIMENSIONS:
+                if not values[dimension]:
+                    continue
+                counters = deltas[(granularity, start, dimension, values[dimension])]
+                counters["attempts"] += 1
+                if not row["success"]:
+                    counters["failures"] += 1
+                if row["action"] in MFA_FAILURE_ACTIONS:
+                    counters["mfa_failures"] += 1
+    return deltas
+
+
+def apply_rollups(conn, rows):
+    """Add the counts of ``rows`` to the rollup table on ``conn``."""
+    increment_many(conn, AuthLogRollup.__table__, KEY_COLUMNS, rollup_deltas(rows))
+
+
+def security_overview(granularity, since, limit=10):
+    """Timeline and top offenders read from the rollups only."""
+    r = AuthLogRollup
+    in_range = (r.granularity == granularity, r.bucket_start >= since)
+
+    # Every event carries an email, so the email dimension gives totals
+    timeline = db.session.execute(
+        select(r.bucket_start,
+               func.sum(r.attempts), func.sum(r.failures), func.sum(r.mfa_failures))
+        .where(*in_range, r.dimension == "email")
+        .group_by(r.bucket_start)
+        .order_by(r.bucket_start)
+    ).all()
+
+    def top(dimension):
+        return db.session.execute(
+            select(r.value,
+                   func.sum(r.attempts).label("attempts"),
+                   func.sum(r.failures).label("failures"),
+                   func.sum(r.mfa_failures).label("mfa_failures"))
+            .where(*in_range, r.dimension == dimension)
+            .group_by(r.value)
+            .order_by(func.sum(r.failures).desc(), func.sum(r.attempts).desc())
+            .limit(limit)
+        ).all()
+
+    totals = [sum(row[i] or 0 for row in timeline) for i in (1, 2, 3)]
+    return {
+        "timeline": timeline,
+        "top_ips": top("ip"),
+        "top_emails": top("email"),
+        "attempts": totals[0],
+        "failures": totals[1],
+        "mfa_failures": totals[2],
+    }
+
+
+def archive_auth_logs(days, archive_dir, batch_size=5000, rollup_retention=None):
+    """Move raw auth logs older than ``days`` into a gzipped archive.
+
+    Rows are copied and deleted in id-ordered batches so that the job
+    never holds more than ``batch_size`` rows in memory. Returns the path
+    of the archive file and the number of rows moved.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    table = AuthLog.__table__
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(
+        archive_dir, f"auth_logs_before_{cutoff:%Y%m%d}_{datetime.utcnow():%Y%m%d%H%M%S}.jsonl.gz"
+    )
+
+    moved = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table)
+            .where(table.c.timestamp < cutoff, table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+        # Each batch is appended as a complete gzip member and closed
+        # before its rows leave the table
+        with gzip.open(path, "at", encoding="utf-8") as archive:
+            for row in rows:
+                archive.write(json.dumps(dict(row), default=_json_default) + "\n")
+        ids = [row["id"] for row in rows]
+        db.session.execute(delete(table).where(table.c.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+        last_id = ids[-1]
+
+    if not moved:
+        path = None
+
+    for granularity, keep_days in (rollup_retention or {}).items():
+        db.session.execute(
+            delete(AuthLogRollup.__table__).where(
+                AuthLogRollup.granularity == granularity,
+                AuthLogRollup.bucket_start < datetime.utcnow() - timedelta(days=keep_days),
+            )
+        )
+    db.session.commit()
+    return path, moved
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
@@ -0,0 +1,52 @@
+"""Bulk writes of grades, absences and accounts.
+
+Whole-class entry and imports insert dozens to thousands of rows at
+once. Adding them one ORM object at a time means one ``INSERT`` each
+plus the mapper events; here the rows go to the database in a single
+``executemany`` on the session's connection, and the aggregates the mapper
+events would have maintained (``student_stats``, ``class_grade_stats``,
+``statistics_snapshot``) are updated explicitly in the same transaction,
+with one update per student rather than per row. Every bulk write of these
+tables must go through this module. The caller commits.
+"""
+from models import db, Absence, Grade
+from utils import class_stats
+from utils.statistics import COUNTED, apply_count
+from utils.student_stats import apply_absences, apply_grades
+
+
+def insert_grades(rows):
+    """Insert grade dicts (``student_id``, ``course_id``, ``teacher_id``,
+    ``grade_value``, ``grade_type``...) and update their aggregates."""
+    if not rows:
+        return 0
+    conn = db.session.connection()
+    conn.execute(Grade.__table__.insert(), rows)
+    apply_grades(conn, ((row["student_id"], row["grade_value"]) for row in rows))
+    class_stats.apply_grades(conn, rows)
+    apply_count(conn, Grade, len(rows))
+    return len(rows)
+
+
+def insert_absences(rows):
+    """Insert absence dicts (``student_id``, ``teacher_id``, ``date``,
+    ``period``...) and update their aggregates."""
+    if not rows:
+        return 0
+    conn = db.session.connection()
+    conn.execute(Absence.__table__.insert(), rows)
+    apply_absences(conn, ((row["student_id"], row.get("is_justified", False)) for row in rows))
+    apply_count(conn, Absence, len(rows))
+    return len(rows)
+
+
+def insert_rows(model, rows):
+    """Insert plain rows of a model that has no per-row aggregates (users,
+    profiles, links), keeping its ``statistics_snapshot`` counter in step."""
+    if not rows:
+        return 0
+    conn = db.session.connection()
+    conn.execute(model.__table__.insert(), rows)
+    if model in COUNTED.values():
+        apply_count(conn, model, len(rows))
+    return len(rows)
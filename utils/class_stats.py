@@ -0,0 +1,188 @@
+"""Class-relative grade statistics: class average, min, max and rank.
+
+``class_grade_stats`` holds, for every student, course and grade type,
+the count, sum, minimum and maximum of the student's grades, filed under
+the student's class group. The class figures of a course and grade type
+are aggregates over the ~30 rows of that class group (indexed), and the
+student's rank is a ``RANK()`` window over the same rows: a grade page
+never scans the class's grades.
+
+Inserting, updating or deleting a ``Grade`` through the ORM updates the
+row in the same transaction; bulk inserts call :func:`apply_grades`. As
+in ``student_stats``, min and max are running values recomputed from
+``grades`` only when the current one is removed. Changing a student's
+class group moves their rows; :func:`rebuild_class_grade_stats` repairs
+the table from scratch.
+"""
+from typing import NamedTuple
+
+from sqlalchemy import and_, case, delete, event, func, literal, or_, select, update
+from sqlalchemy.orm.attributes import get_history
+
+from models import db, ClassGradeStats, Grade, Student
+from utils.counters import increment
+
+_KEY = ("student_id", "course_id", "grade_type")
+
+
+def _add(conn, key, class_group, values):
+    table = ClassGradeStats.__table__
+    low, high = min(values), max(values)
+    lowest, highest = table.c.min_grade, table.c.max_grade
+    increment(conn, table, dict(zip(_KEY, key)),
+              {"grade_count": len(values), "grade_sum": sum(values)},
+              defaults={"class_group": class_group, "min_grade": low, "max_grade": high},
+              assign={
+                  "min_grade": case((or_(lowest.is_(None), lowest > low), literal(low)),
+                                    else_=lowest),
+                  "max_grade": case((or_(highest.is_(None), highest < high), literal(high)),
+                                    else_=highest),
+              })
+
+
+def _remove(conn, key, value):
+    table = ClassGradeStats.__table__
+    where = and_(*(table.c[name] == v for name, v in zip(_KEY, key)))
+    increment(conn, table, dict(zip(_KEY, key)), {"grade_count": -1, "grade_sum": -value})
+    conn.execute(delete(table).where(where, table.c.grade_count <= 0))
+    # The minimum or maximum may be gone: fall back on the remaining grades
+    grades = Grade.__table__
+    remaining = select(grades.c.grade_value).where(
+        *(grades.c[name] == v for name, v in zip(_KEY, key)))
+    conn.execute(
+        update(table)
+        .where(where, or_(table.c.min_grade >= value, table.c.max_grade <= value))
+        .values(min_grade=remaining.with_only_columns(func.min(grades.c.grade_value))
+                .scalar_subquery(),
+                max_grade=remaining.with_only_columns(func.max(grades.c.grade_value))
+                .scalar_subquery())
+    )
+
+
+def _class_of(conn, student_id):
+    return conn.execute(select(Student.class_name).where(Student.id == student_id)).scalar()
+
+
+def apply_grade(conn, student_id, course_id, grade_type, value, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) one grade on ``conn``."""
+    key = (student_id, course_id, grade_type)
+    if sign > 0:
+        _add(conn, key, _class_of(conn, student_id), [value])
+    else:
+        _remove(conn, key, value)
+
+
+def apply_grades(conn, rows):
+    """Add grade dicts (bulk inserts), one update per student, course and type."""
+    groups = {}
+    for row in rows:
+        key = (row["student_id"], row["course_id"], row["grade_type"])
+        groups.setdefault(key, []).append(row["grade_value"])
+    if not groups:
+        return
+    classes = dict(conn.execute(
+        select(Student.id, Student.class_name)
+        .where(Student.id.in_({student_id for student_id, _, _ in groups}))
+    ).all())
+    for key, values in groups.items():
+        _add(conn, key, classes[key[0]], values)
+
+
+def _previous(target, *names):
+    values = []
+    for name in names:
+        history = get_history(target, name)
+        values.append(history.deleted[0] if history.deleted else getattr(target, name))
+    return values
+
+
+@event.listens_for(Grade, "after_insert")
+def _grade_inserted(mapper, connection, target):
+    apply_grade(connection, target.student_id, target.course_id, target.grade_type,
+                target.grade_value)
+
+
+@event.listens_for(Grade, "after_update")
+def _grade_updated(mapper, connection, target):
+    names = ("student_id", "course_id", "grade_type", "grade_value")
+    if not any(get_history(target, name).has_changes() for name in names):
+        return
+    apply_grade(connection, *_previous(target, *names), -1)
+    apply_grade(connection, *(getattr(target, name) for name in names))
+
+
+@event.listens_for(Grade, "after_delete")
+def _grade_deleted(mapper, connection, target):
+    apply_grade(connection, target.student_id, target.course_id, target.grade_type,
+                target.grade_value, -1)
+
+
+@event.listens_for(Student, "after_update")
+def _student_moved(mapper, connection, target):
+    if get_history(target, "class_name").has_changes():
+        table = ClassGradeStats.__table__
+        connection.execute(update(table).where(table.c.student_id == target.id)
+                           .values(class_group=target.class_name))
+
+
+@event.listens_for(Student, "before_delete")
+def _student_deleted(mapper, connection, target):
+    table = ClassGradeStats.__table__
+    connection.execute(delete(table).where(table.c.student_id == target.id))
+
+
+class ClassPosition(NamedTuple):
+    """A student's standing in their class for one course and grade type."""
+
+    class_average: float
+    class_min: float
+    class_max: float
+    rank: int  # 1 = best average, ties share a rank
+    class_size: int
+
+
+def class_positions(student_id, class_group):
+    """``{(course_id, grade_type): ClassPosition}`` for every course and
+    grade type the student has grades in, in one query."""
+    s = ClassGradeStats.__table__
+    window = {"partition_by": (s.c.course_id, s.c.grade_type)}
+    ranked = (
+        select(
+            s.c.student_id, s.c.course_id, s.c.grade_type,
+            (func.sum(s.c.grade_sum).over(**window)
+             / func.sum(s.c.grade_count).over(**window)).label("class_average"),
+            func.min(s.c.min_grade).over(**window).label("class_min"),
+            func.max(s.c.max_grade).over(**window).label("class_max"),
+            func.rank().over(order_by=(s.c.grade_sum / s.c.grade_count).desc(),
+                             **window).label("rank"),
+            func.count().over(**window).label("class_size"),
+        )
+        .where(s.c.class_group == class_group,
+               s.c.course_id.in_(select(s.c.course_id).where(s.c.student_id == student_id)))
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(ranked.c.course_id, ranked.c.grade_type, ranked.c.class_average,
+               ranked.c.class_min, ranked.c.class_max, ranked.c.rank, ranked.c.class_size)
+        .where(ranked.c.student_id == student_id)
+    ).all()
+    return {(course_id, grade_type): ClassPosition(*figures)
+            for course_id, grade_type, *figures in rows}
+
+
+def rebuild_class_grade_stats():
+    """Recompute the whole table in one transaction; returns the row count."""
+    g, s = Grade.__table__, Student.__table__
+    query = (
+        select(g.c.student_id, g.c.course_id, g.c.grade_type, s.c.class_name,
+               func.count(), func.sum(g.c.grade_value),
+               func.min(g.c.grade_value), func.max(g.c.grade_value))
+        .join(s, g.c.student_id == s.c.id)
+        .group_by(g.c.student_id, g.c.course_id, g.c.grade_type, s.c.class_name)
+    )
+    db.session.execute(delete(ClassGradeStats.__table__))
+    db.session.execute(ClassGradeStats.__table__.insert().from_select(
+        ["student_id", "course_id", "grade_type", "class_group", "grade_count",
+         "grade_sum", "min_grade", "max_grade"], query))
+    db.session.commit()
+    return ClassGradeStats.query.count()
@@ -0,0 +1,38 @@
+"""Portable "increment or insert" for counter tables.
+
+Aggregate tables (auth log rollups, per-student statistics...) are kept
+up to date by adding deltas to existing rows. The helper first tries an
+``UPDATE ... SET col = col + :delta`` and inserts the row when it does
+not exist yet, retrying as an update if another transaction inserted it
+concurrently. It works on both MySQL and SQLite without dialect-specific
+upsert syntax.
+"""
+from sqlalchemy import and_, update
+from sqlalchemy.exc import IntegrityError
+
+
+def increment(conn, table, keys, deltas, defaults=None, assign=None):
+    """Add ``deltas`` to the row of ``table`` identified by ``keys``.
+
+    ``keys`` and ``deltas`` map column names to values. ``defaults``
+    gives values for other columns when the row has to be created, and
+    ``assign`` SQL expressions set on them when it already exists (for
+    instance a running maximum).
+    """
+    where = and_(*(table.c[name] == value for name, value in keys.items()))
+    values = {name: table.c[name] + delta for name, delta in deltas.items()}
+    values.update(assign or {})
+    if conn.execute(update(table).where(where).values(**values)).rowcount:
+        return
+    try:
+        with conn.begin_nested():
+            conn.execute(table.insert().values(**keys, **deltas, **(defaults or {})))
+    except IntegrityError:
+        conn.execute(update(table).where(where).values(**values))
+
+
+def increment_many(conn, table, key_names, deltas_by_key):
+    """Apply a mapping of key tuples to delta dicts in one transaction."""
+    for key, deltas in deltas_by_key.items():
+        if any(deltas.values()):
+            increment(conn, table, dict(zip(key_names, key)), deltas)
@@ -0,0 +1,156 @@
+"""Streaming CSV / NDJSON exports of grades and absences.
+
+Exports select plain columns (no ORM objects) and read them with
+``yield_per``, which makes SQLAlchemy use a server-side cursor and fetch
+``EXPORT_YIELD_PER`` rows per round trip. Rows are formatted as they
+arrive and handed to the response in ~64 KB chunks, optionally through
+an incremental gzip compressor, so memory stays flat whatever the
+number of rows.
+
+Text cells of CSV exports that a spreadsheet would read as a formula
+(leading ``=``, ``+``, ``-``, ``@``, tab or carriage return) are prefixed
+with a quote, since names, comments and reasons are typed by users.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from models import db, Absence, Course, Grade, Student, Teacher, User
+from utils.terms import term_bounds
+
+CHUNK_SIZE = 64 * 1024
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+_GRADE_COLUMNS = (
+    Grade.id, Grade.date_recorded.label("date"), Student.student_number,
+    User.last_name, User.first_name, Student.class_name.label("class_group"),
+    Course.code.label("course_code"), Course.name.label("course_name"),
+    Grade.grade_type, Grade.grade_value, Teacher.employee_number.label("teacher"),
+    Grade.comments,
+)
+_ABSENCE_COLUMNS = (
+    Absence.id, Absence.date, Absence.period, Student.student_number,
+    User.last_name, User.first_name, Student.class_name.label("class_group"),
+    Absence.is_justified, Absence.reason, Teacher.employee_number.label("teacher"),
+)
+
+
+def grades_export(teacher_id=None, course_id=None, class_group=None, term=None):
+    """Statement of the grades to export; ``None`` scopes are ignored."""
+    stmt = (
+        select(*_GRADE_COLUMNS)
+        .join(Student, Grade.student_id == Student.id)
+        .join(User, Student.user_id == User.id)
+        .join(Course, Grade.course_id == Course.id)
+        .join(Teacher, Grade.teacher_id == Teacher.id)
+        .order_by(Grade.id)
+    )
+    if teacher_id:
+        stmt = stmt.where(Grade.teacher_id == teacher_id)
+    if course_id:
+        stmt = stmt.where(Grade.course_id == course_id)
+    if class_group:
+        stmt = stmt.where(Student.class_name == class_group)
+    if term:
+        start, end = term_bounds(term)
+        stmt = stmt.where(Grade.date_recorded >= start, Grade.date_recorded < end)
+    return stmt
+
+
+def absences_export(teacher_id=None, course_id=None, class_group=None, term=None):
+    """Statement of the absences to export.
+
+    Absences are not tied to a course; ``course_id`` keeps the absences of
+    the students graded in that course.
+    """
+    stmt = (
+        select(*_ABSENCE_COLUMNS)
+        .join(Student, Absence.student_id == Student.id)
+        .join(User, Student.user_id == User.id)
+        .join(Teacher, Absence.teacher_id == Teacher.id)
+        .order_by(Absence.id)
+    )
+    if teacher_id:
+        stmt = stmt.where(Absence.teacher_id == teacher_id)
+    if course_id:
+        stmt = stmt.where(Absence.student_id.in_(
+            select(Grade.student_id).where(Grade.course_id == course_id)))
+    if class_group:
+        stmt = stmt.where(Student.class_name == class_group)
+    if term:
+        start, end = term_bounds(term)
+        stmt = stmt.where(Absence.date >= start, Absence.date < end)
+    return stmt
+
+
+def _value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _csv_cell(value):
+    value = _value(value)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_lines(result):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(result.keys())
+    for row in result:
+        writer.writerow([_csv_cell(v) for v in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_lines(result):
+    keys = list(result.keys())
+    for row in result:
+        yield json.dumps(dict(zip(keys, map(_value, row))), ensure_ascii=False) + "\n"
+
+
+def _chunks(lines):
+    """Group text lines into encoded chunks of about ``CHUNK_SIZE`` bytes."""
+    parts, size = [], 0
+    for line in lines:
+        data = line.encode("utf-8")
+        parts.append(data)
+        size += len(data)
+        if size >= CHUNK_SIZE:
+            yield b"".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b"".join(parts)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(stmt, fmt="csv", compress=False):
+    """Generator of the export's bytes; run it inside the app context."""
+    result = db.session.execute(
+        stmt.execution_options(yield_per=current_app.config["EXPORT_YIELD_PER"])
+    )
+    try:
+        lines = _csv_lines(result) if fmt == "csv" else _ndjson_lines(result)
+        chunks = _chunks(lines)
+        yield from (_gzipped(chunks) if compress else chunks)
+    finally:
+        result.close()
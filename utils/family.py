@@ -0,0 +1,72 @@
+"""Batched loading of a parent's children for the parent dashboard.
+
+The dashboard shows, for every child, the latest grades and absences and
+a few aggregates. Instead of a handful of queries per child, the latest
+rows of all children are fetched with one ``ROW_NUMBER()`` windowed
+query per table, aggregates come from ``student_stats`` and related
+courses and users are eager-loaded. The page costs the same number of
+queries whatever the size of the family.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased, joinedload
+
+from models import db, Absence, Grade
+from utils.queries import children_of_parent
+from utils.student_stats import stats_for_many
+
+
+def latest_per_student(model, order_by, student_ids, limit, *options):
+    """The ``limit`` most recent ``model`` rows of each student, in one query.
+
+    ``order_by`` lists the columns defining "most recent", descending.
+    Returns a dict mapping every student id to its rows, newest first.
+    """
+    latest = {student_id: [] for student_id in student_ids}
+    if not student_ids:
+        return latest
+    ranked = (
+        select(model, func.row_number().over(
+            partition_by=model.student_id,
+            order_by=[column.desc() for column in order_by] + [model.id.desc()],
+        ).label("rank"))
+        .where(model.student_id.in_(student_ids))
+        .subquery()
+    )
+    row = aliased(model, ranked)
+    rows = db.session.scalars(
+        select(row)
+        .where(ranked.c.rank <= limit)
+        .order_by(ranked.c.student_id, ranked.c.rank)
+        .options(*(option(row) for option in options))
+    ).unique()
+    for item in rows:
+        latest[item.student_id].append(item)
+    return latest
+
+
+def load_family(parent_id, recent=3):
+    """Children of a parent with their latest grades, absences and totals."""
+    children = children_of_parent(parent_id)
+    ids = [child.id for child in children]
+
+    grades = latest_per_student(Grade, [Grade.date_recorded], ids, recent,
+                                lambda row: joinedload(row.course))
+    absences = latest_per_student(Absence, [Absence.date, Absence.created_at], ids, recent)
+    stats = stats_for_many(ids)
+
+    children_data = [{
+        "student": child,
+        "recent_grades": grades[child.id],
+        "recent_absences": absences[child.id],
+        "average_grade": stats[child.id].average,
+        "total_grades": stats[child.id].grade_count,
+        "total_absences": stats[child.id].absence_count,
+    } for child in children]
+
+    grade_count = sum(s.grade_count for s in stats.values())
+    grade_sum = sum(s.grade_sum for s in stats.values())
+    return {
+        "children_data": children_data,
+        "global_average": round(grade_sum / grade_count, 1) if grade_count else 0,
+        "total_absences": sum(s.absence_count for s in stats.values()),
+    }
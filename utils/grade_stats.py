@@ -0,0 +1,53 @@
+"""Grade statistics computed by the database.
+
+The summary shown above grade lists (count, average, best, number of
+grades >= 16 and <= 10) is one ``SELECT`` of ``COUNT``/``AVG``/``MAX``
+and conditional ``SUM`` over any set of ``Grade`` conditions: no grade
+row is loaded into Python, whatever the number of grades. Whole-history
+summaries of one student are read from ``student_stats`` instead, which
+holds the same figures.
+"""
+from typing import NamedTuple, Optional
+
+from sqlalchemy import case, func, select
+
+from models import db, Grade, Student
+from utils.student_stats import HIGH_GRADE, LOW_GRADE
+
+
+class GradeSummary(NamedTuple):
+    count: int = 0
+    average: float = 0.0  # 0 without grades
+    best: Optional[float] = None
+    high_count: int = 0  # grades >= HIGH_GRADE
+    low_count: int = 0  # grades <= LOW_GRADE
+
+    @classmethod
+    def from_stats(cls, stats):
+        """Summary of a ``StudentStats`` row (a student's whole history)."""
+        if not stats.grade_count:
+            return cls()
+        return cls(stats.grade_count, stats.grade_sum / stats.grade_count,
+                   stats.best_grade, stats.high_count, stats.low_count)
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def grade_summary(*conditions, join_student=False):
+    """Summary of the grades matching ``conditions`` in one aggregate query.
+
+    Set ``join_student`` when a condition uses ``Student`` columns.
+    """
+    stmt = select(
+        func.count(Grade.id),
+        func.avg(Grade.grade_value),
+        func.max(Grade.grade_value),
+        _count_if(Grade.grade_value >= HIGH_GRADE),
+        _count_if(Grade.grade_value <= LOW_GRADE),
+    ).where(*conditions)
+    if join_student:
+        stmt = stmt.join(Student, Grade.student_id == Student.id)
+    count, average, best, high_count, low_count = db.session.execute(stmt).one()
+    return GradeSummary(count, float(average or 0), best, int(high_count), int(low_count))
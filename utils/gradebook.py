@@ -0,0 +1,84 @@
+"""Teacher gradebook: filtered, sorted and paginated grades with a summary.
+
+The filters (course, class group, grade type, date range) become one set
+of ``WHERE`` conditions shared by the page query and the summary query,
+so the average, best and high/low counts always describe exactly the
+rows being browsed. Rows are read one keyset page at a time; the
+summary is a single aggregate computed by the database.
+"""
+from datetime import timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import contains_eager
+
+from models import db, Course, Grade, Student, User
+from utils.grade_stats import grade_summary
+from utils.pagination import PER_PAGE, keyset_paginate
+
+# Sortable columns: name -> keyset ordering (joined columns carry a getter)
+SORTS = {
+    "date": [Grade.date_recorded],
+    "grade": [Grade.grade_value],
+    "student": [(User.last_name, lambda g: g.student.user.last_name),
+                (User.first_name, lambda g: g.student.user.first_name)],
+    "course": [(Course.name, lambda g: g.course.name)],
+    "type": [Grade.grade_type],
+}
+DEFAULT_SORT = "date"
+
+
+def gradebook_conditions(teacher_id, course_id=None, class_group=None, grade_type=None,
+                         date_from=None, date_to=None):
+    """``WHERE`` conditions for a teacher's grades; ``None`` filters are ignored.
+
+    ``date_to`` is inclusive. Conditions on the class group refer to
+    ``Student``, which the statement must join.
+    """
+    conditions = [Grade.teacher_id == teacher_id]
+    if course_id:
+        conditions.append(Grade.course_id == course_id)
+    if class_group:
+        conditions.append(Student.class_name == class_group)
+    if grade_type:
+        conditions.append(Grade.grade_type == grade_type)
+    if date_from:
+        conditions.append(Grade.date_recorded >= date_from)
+    if date_to:
+        conditions.append(Grade.date_recorded < date_to + timedelta(days=1))
+    return conditions
+
+
+def _ordering(sort, descending):
+    order = []
+    for entry in SORTS.get(sort, SORTS[DEFAULT_SORT]) + [Grade.id]:
+        column, *getter = entry if isinstance(entry, tuple) else (entry,)
+        order.append((column, descending, *getter))
+    return order
+
+
+def gradebook_page(teacher_id, filters, sort=DEFAULT_SORT, descending=True, cursor=None,
+                   per_page=PER_PAGE, total=None):
+    """A page of the filtered grades with student, user and course loaded."""
+    stmt = (
+        select(Grade)
+        .join(Grade.student).join(Student.user).join(Grade.course)
+        .where(*gradebook_conditions(teacher_id, **filters))
+        .options(contains_eager(Grade.student).contains_eager(Student.user),
+                 contains_eager(Grade.course))
+    )
+    return keyset_paginate(stmt, _ordering(sort, descending), cursor, per_page, total=total)
+
+
+def gradebook_summary(teacher_id, filters):
+    """:class:`~utils.grade_stats.GradeSummary` of the filtered grades."""
+    return grade_summary(*gradebook_conditions(teacher_id, **filters),
+                         join_student=bool(filters.get("class_group")))
+
+
+def class_groups_for_teacher(teacher_id):
+    """Class groups of the students a teacher has graded, for the filter."""
+    return db.session.scalars(
+        select(Student.class_name).distinct()
+        .where(Student.id.in_(select(Grade.student_id).where(Grade.teacher_id == teacher_id)))
+        .order_by(Student.class_name)
+    ).all()
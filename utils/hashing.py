@@ -0,0 +1,182 @@
+"""Bounded process pool for password hashing.
+
+Werkzeug's password KDF is deliberately slow. Running it on the request
+thread lets a burst of logins pin every web worker on CPU, so hashes are
+computed in a dedicated process pool instead. At most
+``PASSWORD_HASH_MAX_PENDING`` hashes may be queued or running at once; a
+caller that cannot get a slot within ``PASSWORD_HASH_QUEUE_TIMEOUT``
+seconds gets a :class:`HashingBusyError` instead of piling up behind the
+others.
+
+Every hash submitted to the pool holds one slot until it has run, and
+batches (:meth:`PasswordHasher.hash_many`) keep at most half of the slots
+in flight: the pool's queue never holds more than a few batch hashes, so
+a login waits for about one hash, not for the whole batch.
+"""
+import collections
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusyError(Exception):
+    """Raised when no hashing slot frees up within the queue timeout."""
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHasher:
+    """Run password hashing and verification with a concurrency cap."""
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self.calls = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.hash_seconds = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        workers = os.cpu_count() or 2
+        app.config.setdefault("PASSWORD_HASH_INLINE", False)
+        app.config.setdefault("PASSWORD_HASH_WORKERS", workers)
+        app.config.setdefault("PASSWORD_HASH_MAX_PENDING", workers * 2)
+        app.config.setdefault("PASSWORD_HASH_QUEUE_TIMEOUT", 2.0)
+        app.config.setdefault("PASSWORD_HASH_RESULT_TIMEOUT", 30.0)
+
+        self.inline = app.config["PASSWORD_HASH_INLINE"]
+        self.workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.timeout = app.config["PASSWORD_HASH_QUEUE_TIMEOUT"]
+        self.result_timeout = app.config["PASSWORD_HASH_RESULT_TIMEOUT"]
+        max_pending = app.config["PASSWORD_HASH_MAX_PENDING"]
+        self.batch_window = max(1, max_pending // 2)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        app.extensions["password_hasher"] = self
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def hash_many(self, passwords):
+        """Hash a batch of passwords across the whole pool.
+
+        Meant for bulk jobs: the batch waits for slots instead of failing,
+        and never holds more than ``batch_window`` of them.
+        """
+        passwords = list(passwords)
+        if self.inline or len(passwords) < 2:
+            return [self.hash(p) for p in passwords]
+        return self._run_batch(passwords)
+
+    def metrics(self):
+        with self._metrics_lock:
+            calls = self.calls or 1
+            return {
+                "calls": self.calls,
+                "rejected": self.rejected,
+                "wait_seconds": self.wait_seconds,
+                "hash_seconds": self.hash_seconds,
+                "avg_wait_ms": self.wait_seconds / calls * 1000,
+                "avg_hash_ms": self.hash_seconds / calls * 1000,
+            }
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn avoids forking a process that already runs threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _acquire(self, timeout):
+        queued_at = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            with self._metrics_lock:
+                self.rejected += 1
+            raise HashingBusyError("Password hashing pool is saturated")
+        return time.perf_counter() - queued_at
+
+    def _record(self, calls, waited, elapsed):
+        with self._metrics_lock:
+            self.calls += calls
+            self.wait_seconds += waited
+            self.hash_seconds += elapsed
+
+    def _submit(self, fn, *args):
+        """Submit to the pool; the caller's slot is released once it has run."""
+        try:
+            future = self._pool().submit(_timed, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashingBusyError("Password hashing timed out") from None
+
+    def _run(self, fn, *args):
+        waited = self._acquire(self.timeout)
+        if self.inline:
+            try:
+                result, elapsed = _timed(fn, *args)
+            finally:
+                self._slots.release()
+        else:
+            result, elapsed = self._result(self._submit(fn, *args))
+        self._record(1, waited, elapsed)
+        return result
+
+    def _run_batch(self, passwords):
+        results, pending, waited = [], collections.deque(), 0.0
+        for password in passwords:
+            if len(pending) == self.batch_window:
+                results.append(self._result(pending.popleft()))
+            waited += self._acquire(None)
+            pending.append(self._submit(generate_password_hash, password))
+        while pending:
+            results.append(self._result(pending.popleft()))
+        self._record(len(results), waited, sum(elapsed for _, elapsed in results))
+        return [pwhash for pwhash, _ in results]
+
+
+def _hasher():
+    if has_app_context():
+        return current_app.extensions.get("password_hasher")
+    return None
+
+
+def hash_password(password):
+    """Hash a password through the pool, or inline without an app."""
+    hasher = _hasher()
+    if hasher is None:
+        return generate_password_hash(password)
+    return hasher.hash(password)
+
+
+def verify_password(pwhash, password):
+    """Check a password through the pool, or inline without an app."""
+    hasher = _hasher()
+    if hasher is None:
+        return check_password_hash(pwhash, password)
+    return hasher.verify(pwhash, password)
@@ -0,0 +1,162 @@
+"""Identity loading and caching for Flask-Login.
+
+``load_identity`` fetches a user together with its role and role
+profile in a single query, then keeps it for ``IDENTITY_CACHE_TTL``
+seconds so that most authenticated page views need no query at all.
+Cached users are merged into the request session without a round trip.
+Any committed change to a user, its role or its profiles evicts the
+entry; changes are only noted at flush time, so that a concurrent request
+cannot cache the old row again between the flush and the commit.
+
+The cache lives in each worker process and eviction is not broadcast: in
+a multi-worker deployment another worker may serve a stale identity (a
+deactivated account, a removed role) for up to ``IDENTITY_CACHE_TTL``
+seconds. Keep the TTL short there, or set it to 0.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, joinedload, object_session
+
+from models import db, User, Role, Student, Parent, Teacher, Administrator
+
+
+class IdentityCache:
+    """Short-lived, size-bounded cache of loaded ``User`` objects."""
+
+    def __init__(self, app=None):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("IDENTITY_CACHE_TTL", 10)
+        app.config.setdefault("IDENTITY_CACHE_SIZE", 10000)
+        self.ttl = app.config["IDENTITY_CACHE_TTL"]
+        self.max_size = app.config["IDENTITY_CACHE_SIZE"]
+        app.extensions["identity_cache"] = self
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        state = inspect(user)
+        if state.modified or state.expired_attributes:
+            self.invalidate(user_id)
+            return None
+        return user
+
+    def put(self, user):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """Evict one user, or every entry when ``user_id`` is None."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+def _identity_statement(user_id):
+    return (
+        select(User)
+        .options(
+            joinedload(User.role),
+            joinedload(User.student_profile),
+            joinedload(User.parent_profile),
+            joinedload(User.teacher_profile),
+            joinedload(User.admin_profile),
+        )
+        .where(User.id == user_id)
+    )
+
+
+def load_identity(user_id):
+    """Return the user with role and profiles loaded, or None."""
+    cache = current_app.extensions.get("identity_cache")
+    if cache is not None:
+        cached = cache.get(user_id)
+        if cached is not None:
+            # Attach a copy to this request's session without querying
+            return db.session.merge(cached, load=False)
+
+    user = db.session.execute(_identity_statement(user_id)).unique().scalar_one_or_none()
+    if user is not None and cache is not None:
+        cache.put(user)
+    return user
+
+
+def _current_cache():
+    if has_app_context():
+        return current_app.extensions.get("identity_cache")
+    return None
+
+
+def _note_eviction(target, user_id):
+    """Remember ``user_id`` (None: every user) until the session commits."""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("identity_evictions", set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed(session):
+    evictions = session.info.pop("identity_evictions", None)
+    cache = _current_cache()
+    if not evictions or cache is None:
+        return
+    if None in evictions:
+        cache.invalidate()
+    else:
+        for user_id in evictions:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_evictions(session):
+    session.info.pop("identity_evictions", None)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _evict_user(mapper, connection, target):
+    _note_eviction(target, target.id)
+
+
+@event.listens_for(Student, "after_insert")
+@event.listens_for(Student, "after_update")
+@event.listens_for(Student, "after_delete")
+@event.listens_for(Parent, "after_insert")
+@event.listens_for(Parent, "after_update")
+@event.listens_for(Parent, "after_delete")
+@event.listens_for(Teacher, "after_insert")
+@event.listens_for(Teacher, "after_update")
+@event.listens_for(Teacher, "after_delete")
+@event.listens_for(Administrator, "after_insert")
+@event.listens_for(Administrator, "after_update")
+@event.listens_for(Administrator, "after_delete")
+def _evict_profile_owner(mapper, connection, target):
+    _note_eviction(target, target.user_id)
+
+
+@event.listens_for(Role, "after_update")
+@event.listens_for(Role, "after_delete")
+def _evict_all(mapper, connection, target):
+    _note_eviction(target, None)
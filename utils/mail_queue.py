@@ -0,0 +1,275 @@
+"""Background delivery queue for outgoing emails.
+
+Login and password reset requests only enqueue their message; worker
+threads perform the SMTP round trip. Every job is spooled to disk
+before it is queued so that messages still pending when the process
+stops are delivered on the next start.
+
+Each running queue spools into its own claim directory,
+``<MAIL_QUEUE_DIR>/<run id>/``, and holds an exclusive lock on
+``<run id>.lock`` for its whole life (``flock``, or ``msvcrt.locking``
+on Windows). The kernel releases the lock when the process dies, however
+it dies, so a queue that can take the lock of another run knows that run
+is gone and adopts its jobs. Unlike a process id, a lock cannot be
+mistaken for a live owner after a container restart reuses the pid.
+
+Spooled jobs hold live secrets (MFA codes, password reset links) in
+clear: the spool and claim directories are created ``0700`` and the job
+files ``0600``, and a job file is deleted as soon as its message is sent
+or given up on.
+"""
+import glob
+import json
+import os
+import queue
+import shutil
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from flask import current_app
+from flask_mail import Message
+
+
+def _try_lock(fh):
+    """Lock ``fh`` exclusively without waiting; False if another process holds it."""
+    try:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+class MailQueue:
+    """Deliver Flask-Mail messages asynchronously with retries."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._scheduled = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("MAIL_QUEUE_SYNC", False)
+        app.config.setdefault("MAIL_QUEUE_DIR", "mail_spool")
+        app.config.setdefault("MAIL_QUEUE_WORKERS", 2)
+        app.config.setdefault("MAIL_QUEUE_MAX_RETRIES", 5)
+        app.config.setdefault("MAIL_QUEUE_RETRY_BACKOFF", 2.0)
+
+        self.app = app
+        self.sync = app.config["MAIL_QUEUE_SYNC"]
+        self.spool_dir = app.config["MAIL_QUEUE_DIR"]
+        self.max_retries = app.config["MAIL_QUEUE_MAX_RETRIES"]
+        self.backoff = app.config["MAIL_QUEUE_RETRY_BACKOFF"]
+        app.extensions["mail_queue"] = self
+
+        if not self.sync:
+            self._claim()
+            self._recover()
+            for _ in range(app.config["MAIL_QUEUE_WORKERS"]):
+                worker = threading.Thread(target=self._work, daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    # Public API ---------------------------------------------------------
+
+    def enqueue(self, subject, recipients, body):
+        """Queue a plain-text message and return immediately."""
+        job = {
+            "id": uuid.uuid4().hex,
+            "subject": subject,
+            "recipients": list(recipients),
+            "body": body,
+            "attempts": 0,
+        }
+        if self.sync:
+            return self._send(job)
+        self._save(job)
+        self._queue.put(job)
+        return True
+
+    def depth(self):
+        """Number of messages waiting for delivery, including retries."""
+        with self._lock:
+            return self._queue.qsize() + self._scheduled
+
+    def metrics(self):
+        return {
+            "depth": self.depth(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+    def join(self):
+        """Block until every queued message has been processed."""
+        self._queue.join()
+
+    # Delivery -----------------------------------------------------------
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._deliver(job)
+            finally:
+                self._queue.task_done()
+
+    def _send(self, job):
+        with self.app.app_context():
+            mail = current_app.extensions.get("mail")
+            if not mail:
+                current_app.logger.error("Flask-Mail not initialized")
+                return False
+            try:
+                mail.send(
+                    Message(
+                        subject=job["subject"],
+                        recipients=job["recipients"],
+                        body=job["body"],
+                    )
+                )
+            except Exception as e:
+                current_app.logger.error(f"Error sending email {job['id']}: {e}")
+                return False
+        with self._lock:
+            self.sent += 1
+        return True
+
+    def _deliver(self, job):
+        if self._send(job):
+            self._discard(job)
+            return
+
+        job["attempts"] += 1
+        if job["attempts"] > self.max_retries:
+            self.app.logger.error(
+                f"Giving up on email {job['id']} after {job['attempts']} attempts"
+            )
+            with self._lock:
+                self.failed += 1
+            self._discard(job)
+            return
+
+        self._save(job)
+        delay = self.backoff * 2 ** (job["attempts"] - 1)
+        with self._lock:
+            self.retried += 1
+            self._scheduled += 1
+        timer = threading.Timer(delay, self._requeue, args=(job,))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, job):
+        with self._lock:
+            self._scheduled -= 1
+        self._queue.put(job)
+
+    # Spool --------------------------------------------------------------
+
+    def _claim(self):
+        """Create this run's claim directory and lock it until exit."""
+        os.makedirs(self.spool_dir, mode=0o700, exist_ok=True)
+        # makedirs leaves an existing directory as it is
+        os.chmod(self.spool_dir, 0o700)
+        run_id = uuid.uuid4().hex
+        lock_path = os.path.join(self.spool_dir, f"{run_id}.lock")
+        if fcntl:
+            # Lock before the file becomes visible under its final name
+            self._lock_file = open(lock_path + ".tmp", "w")
+            locked = _try_lock(self._lock_file)
+            os.replace(lock_path + ".tmp", lock_path)
+        else:
+            # An open file cannot be renamed on Windows; other queues
+            # ignore the lock until the claim directory exists
+            self._lock_file = open(lock_path, "x")
+            locked = _try_lock(self._lock_file)
+        if not locked:
+            raise RuntimeError(f"Could not lock the mail spool claim {lock_path}")
+        self.claim_dir = os.path.join(self.spool_dir, run_id)
+        os.makedirs(self.claim_dir, mode=0o700)
+
+    def _path(self, job_id):
+        return os.path.join(self.claim_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        path = self._path(job["id"])
+        tmp = path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, "w", encoding="utf-8") as fh:
+            json.dump(job, fh)
+        os.replace(tmp, path)
+
+    def _discard(self, job):
+        try:
+            os.remove(self._path(job["id"]))
+        except FileNotFoundError:
+            pass
+
+    def _adopt(self, paths):
+        """Move spooled jobs into this run's claim directory."""
+        jobs = []
+        for path in paths:
+            target = os.path.join(self.claim_dir, os.path.basename(path))
+            try:
+                # The rename is atomic: only one queue can adopt a job
+                os.rename(path, target)
+            except OSError:
+                continue
+            os.chmod(target, 0o600)
+            with open(target, encoding="utf-8") as fh:
+                jobs.append((os.path.getmtime(target), json.load(fh)))
+        return jobs
+
+    def _recover(self):
+        """Requeue spooled jobs left behind by runs that are gone."""
+        jobs = []
+        own = os.path.basename(self.claim_dir)
+        for lock_path in glob.glob(os.path.join(self.spool_dir, "*.lock")):
+            run_id = os.path.basename(lock_path)[:-5]
+            run_dir = os.path.join(self.spool_dir, run_id)
+            # No claim directory: that run is still starting (or left nothing)
+            if run_id == own or not os.path.isdir(run_dir):
+                continue
+            try:
+                fh = open(lock_path, "a")
+            except OSError:
+                continue
+            with fh:
+                if not _try_lock(fh):
+                    continue  # that run is alive
+                jobs += self._adopt(glob.glob(os.path.join(run_dir, "*.json")))
+                shutil.rmtree(run_dir, ignore_errors=True)
+            # Removed once closed: Windows cannot delete an open file
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+        for _, job in sorted(jobs, key=lambda item: item[0]):
+            self._queue.put(job)
+        if jobs:
+            self.app.logger.info(f"Recovered {len(jobs)} spooled emails")
+
+
+def enqueue_mail(subject, recipients, body):
+    """Queue an email through the application's mail queue."""
+    mail_queue = current_app.extensions.get("mail_queue")
+    if mail_queue is None:
+        current_app.logger.error("Mail queue not initialized")
+        return False
+    return mail_queue.enqueue(subject, recipients, body)
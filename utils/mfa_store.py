@@ -0,0 +1,197 @@
+"""Expiring store for emailed MFA codes.
+
+Codes live outside the ``users`` table so that a login attempt no
+longer writes to (and locks) the user row. Each user has at most one
+pending code, looked up by primary key. A code is consumed by its first
+successful verification and discarded after ``MFA_MAX_ATTEMPTS`` wrong
+guesses or once ``MFA_CODE_TTL`` seconds have passed.
+
+Two backends are available through ``MFA_CODE_BACKEND``: ``sql`` (the
+``mfa_codes`` table, the default) shares codes between processes and
+nodes, ``memory`` only works when a single process serves logins. Expired codes are purged by a
+background sweeper every ``MFA_SWEEP_INTERVAL`` seconds.
+"""
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, select, update
+
+VALID = "valid"
+INVALID = "invalid"
+EXPIRED = "expired"
+LOCKED = "locked"
+MISSING = "missing"
+
+
+def _digest(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+class MemoryCodeBackend:
+    """Process-local backend."""
+
+    def __init__(self):
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def put(self, user_id, code_hash, ttl):
+        with self._lock:
+            self._codes[user_id] = [code_hash, time.time() + ttl, 0]
+
+    def check(self, user_id, code_hash, max_attempts):
+        with self._lock:
+            entry = self._codes.get(user_id)
+            if entry is None:
+                return MISSING
+            stored_hash, expires_at, attempts = entry
+            if expires_at < time.time():
+                del self._codes[user_id]
+                return EXPIRED
+            if hmac.compare_digest(stored_hash, code_hash):
+                del self._codes[user_id]
+                return VALID
+            entry[2] = attempts + 1
+            if entry[2] >= max_attempts:
+                del self._codes[user_id]
+                return LOCKED
+            return INVALID
+
+    def discard(self, user_id):
+        with self._lock:
+            self._codes.pop(user_id, None)
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [uid for uid, entry in self._codes.items() if entry[1] < now]
+            for uid in expired:
+                del self._codes[uid]
+        return len(expired)
+
+
+class SQLCodeBackend:
+    """Backend shared by every process through the ``mfa_codes`` table."""
+
+    def put(self, user_id, code_hash, ttl):
+        from models import db, MFACode
+
+        table = MFACode.__table__
+        with db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.user_id == user_id))
+            conn.execute(table.insert().values(
+                user_id=user_id,
+                code_hash=code_hash,
+                expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+                attempts=0,
+            ))
+
+    def check(self, user_id, code_hash, max_attempts):
+        from models import db, MFACode
+
+        table = MFACode.__table__
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                select(table).where(table.c.user_id == user_id).with_for_update()
+            ).first()
+            if row is None:
+                return MISSING
+            if row.expires_at < datetime.utcnow():
+                conn.execute(delete(table).where(table.c.user_id == user_id))
+                return EXPIRED
+            if hmac.compare_digest(row.code_hash, code_hash):
+                conn.execute(delete(table).where(table.c.user_id == user_id))
+                return VALID
+            if row.attempts + 1 >= max_attempts:
+                conn.execute(delete(table).where(table.c.user_id == user_id))
+                return LOCKED
+            conn.execute(
+                update(table)
+                .where(table.c.user_id == user_id)
+                .values(attempts=table.c.attempts + 1)
+            )
+            return INVALID
+
+    def discard(self, user_id):
+        from models import db, MFACode
+
+        table = MFACode.__table__
+        with db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.user_id == user_id))
+
+    def sweep(self):
+        from models import db, MFACode
+
+        table = MFACode.__table__
+        with db.engine.begin() as conn:
+            result = conn.execute(delete(table).where(table.c.expires_at < datetime.utcnow()))
+        return result.rowcount
+
+
+BACKENDS = {
+    "memory": MemoryCodeBackend,
+    "sql": SQLCodeBackend,
+}
+
+
+class MFACodeStore:
+    """Issue and verify one-time MFA codes."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("MFA_CODE_BACKEND", "sql")
+        app.config.setdefault("MFA_CODE_TTL", 120)
+        app.config.setdefault("MFA_MAX_ATTEMPTS", 5)
+        app.config.setdefault("MFA_SWEEP_INTERVAL", 60)
+
+        self.app = app
+        self.backend = BACKENDS[app.config["MFA_CODE_BACKEND"]]()
+        if isinstance(self.backend, MemoryCodeBackend) and not (app.debug or app.testing):
+            app.logger.warning("MFA_CODE_BACKEND='memory' keeps codes per process: "
+                               "with several workers a code sent by one is unknown to the others")
+        self.ttl = app.config["MFA_CODE_TTL"]
+        self.max_attempts = app.config["MFA_MAX_ATTEMPTS"]
+        app.extensions["mfa_store"] = self
+
+        interval = app.config["MFA_SWEEP_INTERVAL"]
+        if interval:
+            threading.Thread(target=self._sweep_forever, args=(interval,),
+                             daemon=True).start()
+
+    def issue(self, user_id):
+        """Create a new code for the user, replacing any pending one."""
+        code = secrets.token_hex(6)
+        self.backend.put(user_id, _digest(code), self.ttl)
+        return code
+
+    def verify(self, user_id, code):
+        """Return VALID, INVALID, EXPIRED, LOCKED or MISSING."""
+        return self.backend.check(user_id, _digest(code or ""), self.max_attempts)
+
+    def discard(self, user_id):
+        self.backend.discard(user_id)
+
+    def sweep(self):
+        with self.app.app_context():
+            return self.backend.sweep()
+
+    def _sweep_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                self.app.logger.error(f"Error sweeping MFA codes: {e}")
+
+
+def current_mfa_store():
+    if has_app_context():
+        return current_app.extensions.get("mfa_store")
+    return None
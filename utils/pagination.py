@@ -0,0 +1,174 @@
+"""Keyset (cursor) pagination for the long listings.
+
+``OFFSET`` pagination reads and throws away every row before the
+requested page and needs a ``COUNT(*)`` over the whole result to number
+the pages, so deep pages get slower as tables grow. Keyset pagination
+instead remembers the sort key of the last row shown and asks for the
+rows that sort after it, which the composite indexes answer directly
+whatever the depth.
+
+A listing is ordered by a list of ``(column, descending)`` pairs whose
+last column is unique (the primary key), so the order is total and
+stable. Columns must be NOT NULL, or rows with a NULL key would drop out
+of every page; nullable table columns are rejected. A pair may carry a
+third element, a function reading the key from a result item, for
+columns of joined tables. Cursors are opaque URL-safe strings
+carrying the key of the boundary row and the direction; a malformed
+cursor falls back to the first page. Totals are optional: pass
+``count=True`` for an exact ``COUNT(*)`` or ``total=`` with a value the
+caller already has (maintained counters, aggregates).
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from operator import attrgetter
+
+from flask import request, url_for
+from sqlalchemy import and_, func, or_, select, tuple_
+
+from models import db
+
+PER_PAGE = 20
+
+
+class InvalidCursor(ValueError):
+    """The cursor could not be decoded for this ordering."""
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        raise InvalidCursor("unknown value type")
+    return value
+
+
+def encode_cursor(key, backwards=False):
+    """Opaque cursor for the row with sort ``key``."""
+    payload = json.dumps({"k": [_dump(v) for v in key], "b": backwards},
+                         separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    """``(key, backwards)`` from a cursor made for a ``size``-column ordering."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        key = [_load(v) for v in payload["k"]]
+        backwards = bool(payload.get("b"))
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError,
+            AttributeError) as e:
+        raise InvalidCursor(str(e)) from e
+    if len(key) != size or any(v is None for v in key):
+        raise InvalidCursor("key does not match the ordering")
+    return key, backwards
+
+
+def _after(order, key):
+    """Rows sorting strictly after ``key`` in ``order``."""
+    if len({descending for _, descending in order}) == 1:
+        # Uniform direction: a row-value comparison the index can range-scan
+        columns = tuple_(*(column for column, _ in order))
+        return columns < tuple_(*key) if order[0][1] else columns > tuple_(*key)
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        equal = [order[j][0] == key[j] for j in range(i)]
+        clauses.append(and_(*equal, column < key[i] if descending else column > key[i]))
+    return or_(*clauses)
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing.
+
+    Iterating the page yields its items, so templates written for a plain
+    list keep working.
+    """
+
+    def __init__(self, items, order, per_page, has_next, has_prev, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.total = total
+        self._getters = [entry[2] if len(entry) > 2 else attrgetter(entry[0].key)
+                         for entry in order]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def _key(self, item):
+        return [getter(item) for getter in self._getters]
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self._key(self.items[-1])) if self.has_next else None
+
+    @property
+    def prev_cursor(self):
+        return encode_cursor(self._key(self.items[0]), backwards=True) if self.has_prev else None
+
+    def url(self, cursor):
+        """The current page's URL with ``cursor`` (None for the first page)."""
+        args = {k: v for k, v in request.args.items() if k != "cursor"}
+        if cursor:
+            args["cursor"] = cursor
+        return url_for(request.endpoint, **request.view_args, **args)
+
+
+def keyset_paginate(stmt, order, cursor=None, per_page=PER_PAGE, params=None,
+                    count=False, total=None):
+    """Execute ``stmt`` for the page designated by ``cursor``.
+
+    ``order`` lists ``(column, descending[, getter])`` entries ending with
+    a unique column; any ``ORDER BY`` already on ``stmt`` is replaced. One
+    extra row is fetched to know whether there is a page beyond this one.
+    """
+    for column, *_ in order:
+        if getattr(getattr(column, "expression", column), "nullable", False):
+            raise ValueError(f"Keyset column {column} is nullable")
+
+    key, backwards = None, False
+    if cursor:
+        try:
+            key, backwards = decode_cursor(cursor, len(order))
+        except InvalidCursor:
+            key = None
+
+    scan = [(column, descending != backwards) for column, descending, *_ in order]
+    page_stmt = stmt.order_by(None).order_by(
+        *(column.desc() if descending else column.asc() for column, descending in scan)
+    )
+    if key is not None:
+        page_stmt = page_stmt.where(_after(scan, key))
+    rows = db.session.scalars(page_stmt.limit(per_page + 1), params or {}).unique().all()
+
+    more = len(rows) > per_page
+    items = rows[:per_page]
+    if backwards:
+        items.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, key is not None
+
+    if count:
+        total = db.session.scalar(
+            select(func.count()).select_from(stmt.order_by(None).subquery()), params or {}
+        )
+    return KeysetPage(items, order, per_page, has_next, has_prev, total)
@@ -0,0 +1,285 @@
+"""Named loaders shared by the blueprints and forms.
+
+Each loader pairs a query with the loading strategy its templates need:
+``joinedload`` for many-to-one relationships (fetched in the same row,
+no extra round trip) and plain column selects for form choices. The
+statements are built once at import time with bind parameters, so every
+call reuses the same statement object and SQLAlchemy's compiled cache
+serves it without re-compiling.
+
+Routes should load what a page renders through this module rather than
+building ad-hoc queries that fall back on lazy loading. Unbounded
+listings return a :class:`~utils.pagination.KeysetPage`.
+"""
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import configure_mappers, contains_eager, joinedload
+
+from models import (
+    db, Absence, Course, Grade, ParentStudent, Schedule, Student, Teacher, User,
+)
+from utils.pagination import PER_PAGE, keyset_paginate
+
+# Backref attributes (Grade.student, Schedule.course...) only exist once
+# the mappers are configured
+configure_mappers()
+
+_student_id = bindparam("student_id")
+_teacher_id = bindparam("teacher_id")
+_limit = bindparam("limit")
+
+# Keyset orderings: newest first, primary key as tie-breaker
+NEWEST_ABSENCES = [(Absence.date, True), (Absence.id, True)]
+USERS_BY_ID = [(User.id, False)]
+
+# --- Accounts ----------------------------------------------------------------
+
+_USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+
+
+def user_by_email(email):
+    return db.session.scalars(_USER_BY_EMAIL, {"email": email}).first()
+
+
+def user_by_id(user_id):
+    """User from the identity map when already loaded, else by primary key."""
+    return db.session.get(User, user_id)
+
+
+# --- Students and parents ----------------------------------------------------
+
+_GRADES_FOR_STUDENT = (
+    select(Grade)
+    .where(Grade.student_id == _student_id)
+    .options(joinedload(Grade.course))
+    .order_by(Grade.date_recorded.desc(), Grade.id.desc())
+)
+_RECENT_GRADES_FOR_STUDENT = _GRADES_FOR_STUDENT.limit(_limit)
+
+_ABSENCES_FOR_STUDENT = (
+    select(Absence)
+    .where(Absence.student_id == _student_id)
+    .order_by(Absence.date.desc(), Absence.id.desc())
+)
+_RECENT_ABSENCES_FOR_STUDENT = _ABSENCES_FOR_STUDENT.limit(_limit)
+
+_SCHEDULE_FOR_CLASS = (
+    select(Schedule)
+    .where(Schedule.class_group == bindparam("class_group"))
+    .options(joinedload(Schedule.course))
+    .order_by(Schedule.day_of_week, Schedule.start_time)
+)
+
+_STUDENTS_IN_CLASS = (
+    select(Student)
+    .join(Student.user)
+    .where(Student.class_name == bindparam("class_group"))
+    .options(contains_eager(Student.user))
+    .order_by(User.last_name, User.first_name, Student.id)
+)
+_CLASS_GROUPS = select(Student.class_name).distinct().order_by(Student.class_name)
+
+_CHILDREN_OF_PARENT = (
+    select(Student)
+    .join(ParentStudent)
+    .where(ParentStudent.parent_id == bindparam("parent_id"))
+    .options(joinedload(Student.user))
+    .order_by(Student.id)
+)
+_CHILD_OF_PARENT = _CHILDREN_OF_PARENT.where(Student.id == _student_id)
+
+
+def grades_for_student(student_id):
+    """Every grade of a student with its course, newest first."""
+    return db.session.scalars(_GRADES_FOR_STUDENT, {"student_id": student_id}).all()
+
+
+def recent_grades_for_student(student_id, limit):
+    return db.session.scalars(_RECENT_GRADES_FOR_STUDENT,
+                              {"student_id": student_id, "limit": limit}).all()
+
+
+def absences_for_student(student_id, cursor=None, per_page=PER_PAGE, total=None):
+    """A page of a student's absences, newest first."""
+    return keyset_paginate(_ABSENCES_FOR_STUDENT, NEWEST_ABSENCES, cursor, per_page,
+                           {"student_id": student_id}, total=total)
+
+
+def recent_absences_for_student(student_id, limit):
+    return db.session.scalars(_RECENT_ABSENCES_FOR_STUDENT,
+                              {"student_id": student_id, "limit": limit}).all()
+
+
+def schedule_for_class(class_group):
+    """Weekly slots of a class group with their courses."""
+    return db.session.scalars(_SCHEDULE_FOR_CLASS, {"class_group": class_group}).all()
+
+
+def students_in_class(class_group):
+    """Students of a class group with their user accounts, by name."""
+    return db.session.scalars(_STUDENTS_IN_CLASS, {"class_group": class_group}).all()
+
+
+def class_groups():
+    """Every class group with at least one student."""
+    return db.session.scalars(_CLASS_GROUPS).all()
+
+
+def children_of_parent(parent_id):
+    """Students linked to a parent, with their user accounts."""
+    return db.session.scalars(_CHILDREN_OF_PARENT, {"parent_id": parent_id}).all()
+
+
+def child_of_parent(parent_id, student_id):
+    """One of the parent's children, or None if the student is not theirs."""
+    return db.session.scalars(_CHILD_OF_PARENT,
+                              {"parent_id": parent_id, "student_id": student_id}).first()
+
+
+# --- Teachers ----------------------------------------------------------------
+
+_SCHEDULE_FOR_TEACHER = (
+    select(Schedule)
+    .join(Schedule.course)
+    .where(Course.teacher_id == _teacher_id)
+    .options(contains_eager(Schedule.course))
+    .order_by(Schedule.start_time, Schedule.class_group, Schedule.id)
+)
+_SLOT_FOR_TEACHER = _SCHEDULE_FOR_TEACHER.where(Schedule.id == bindparam("schedule_id"))
+
+_COURSES_FOR_TEACHER = (
+    select(Course).where(Course.teacher_id == _teacher_id).order_by(Course.name, Course.id)
+)
+_COURSE_FOR_TEACHER = select(Course).where(
+    Course.id == bindparam("course_id"), Course.teacher_id == _teacher_id
+)
+
+_STUDENTS_IN_COURSE = (
+    select(Student)
+    .where(Student.id.in_(
+        select(Grade.student_id).where(Grade.course_id == bindparam("course_id"))
+    ))
+    .options(joinedload(Student.user))
+    .order_by(Student.id)
+)
+
+_ABSENCES_FOR_TEACHER = (
+    select(Absence)
+    .where(Absence.teacher_id == _teacher_id)
+    .options(joinedload(Absence.student).joinedload(Student.user))
+    .order_by(Absence.date.desc(), Absence.id.desc())
+)
+
+_TEACHER_COUNTS = select(
+    select(func.count(func.distinct(Grade.student_id)))
+    .where(Grade.teacher_id == _teacher_id).scalar_subquery().label("total_students"),
+    select(func.count()).select_from(Grade)
+    .where(Grade.teacher_id == _teacher_id).scalar_subquery().label("total_grades"),
+    select(func.count()).select_from(Absence)
+    .where(Absence.teacher_id == _teacher_id).scalar_subquery().label("total_absences"),
+)
+
+
+def schedule_for_teacher(teacher_id):
+    """Weekly slots of the teacher's courses, by start time (days not ordered)."""
+    return db.session.scalars(_SCHEDULE_FOR_TEACHER, {"teacher_id": teacher_id}).all()
+
+
+def slot_for_teacher(schedule_id, teacher_id):
+    """A slot of one of the teacher's courses, or None."""
+    return db.session.scalars(_SLOT_FOR_TEACHER,
+                              {"schedule_id": schedule_id, "teacher_id": teacher_id}).first()
+
+
+def courses_for_teacher(teacher_id):
+    return db.session.scalars(_COURSES_FOR_TEACHER, {"teacher_id": teacher_id}).all()
+
+
+def course_for_teacher(course_id, teacher_id):
+    """A course taught by the teacher, or None."""
+    return db.session.scalars(_COURSE_FOR_TEACHER,
+                              {"course_id": course_id, "teacher_id": teacher_id}).first()
+
+
+def students_in_course(course_id):
+    """Students graded in a course, with their user accounts."""
+    return db.session.scalars(_STUDENTS_IN_COURSE, {"course_id": course_id}).all()
+
+
+def absences_for_teacher(teacher_id, cursor=None, per_page=PER_PAGE):
+    """A page of the absences marked by a teacher with the student user,
+    newest first."""
+    return keyset_paginate(_ABSENCES_FOR_TEACHER, NEWEST_ABSENCES, cursor, per_page,
+                           {"teacher_id": teacher_id})
+
+
+def teacher_counts(teacher_id):
+    """Distinct students graded, grades and absences of a teacher in one query."""
+    return db.session.execute(_TEACHER_COUNTS, {"teacher_id": teacher_id}).one()._asdict()
+
+
+# --- Administration ----------------------------------------------------------
+
+_USERS_WITH_ROLE = select(User).options(joinedload(User.role)).order_by(User.id)
+_RECENT_USERS = (
+    select(User).options(joinedload(User.role))
+    .order_by(User.created_at.desc(), User.id.desc()).limit(_limit)
+)
+_RECENT_GRADES = (
+    select(Grade)
+    .options(joinedload(Grade.course), joinedload(Grade.student).joinedload(Student.user))
+    .order_by(Grade.date_recorded.desc(), Grade.id.desc()).limit(_limit)
+)
+_COURSES_WITH_TEACHER = (
+    select(Course)
+    .options(joinedload(Course.teacher).joinedload(Teacher.user))
+    .order_by(Course.name, Course.id)
+)
+
+
+def users_page(cursor=None, per_page=PER_PAGE, total=None):
+    """A page of users with their roles, by id."""
+    return keyset_paginate(_USERS_WITH_ROLE, USERS_BY_ID, cursor, per_page, total=total)
+
+
+def recent_users(limit):
+    return db.session.scalars(_RECENT_USERS, {"limit": limit}).all()
+
+
+def recent_grades(limit):
+    return db.session.scalars(_RECENT_GRADES, {"limit": limit}).all()
+
+
+def courses_with_teacher():
+    """All courses with their teacher's user account."""
+    return db.session.scalars(_COURSES_WITH_TEACHER).all()
+
+
+# --- Form choices ------------------------------------------------------------
+
+_STUDENT_CHOICES = (
+    select(Student.id, User.first_name, User.last_name)
+    .join(User, Student.user_id == User.id)
+    .order_by(User.last_name, User.first_name, Student.id)
+)
+_TEACHER_CHOICES = (
+    select(Teacher.id, User.first_name, User.last_name)
+    .join(User, Teacher.user_id == User.id)
+    .order_by(User.last_name, User.first_name, Teacher.id)
+)
+_COURSE_CHOICES_FOR_TEACHER = (
+    select(Course.id, Course.name).where(Course.teacher_id == _teacher_id).order_by(Course.name)
+)
+
+
+def student_choices():
+    """``(id, "First Last")`` pairs for student select fields."""
+    return [(id_, f"{first} {last}") for id_, first, last in db.session.execute(_STUDENT_CHOICES)]
+
+
+def teacher_choices():
+    return [(id_, f"{first} {last}") for id_, first, last in db.session.execute(_TEACHER_CHOICES)]
+
+
+def course_choices_for_teacher(teacher_id):
+    return [tuple(row) for row in db.session.execute(_COURSE_CHOICES_FOR_TEACHER,
+                                                     {"teacher_id": teacher_id})]
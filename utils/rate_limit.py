@@ -0,0 +1,191 @@
+"""Sliding-window rate limiting for the authentication endpoints.
+
+Each key (``login:ip:1.2.3.4``, ``login:email:a@b.fr``...) keeps two
+counters: hits in the current fixed window and hits in the previous
+one. The sliding estimate weights the previous window by the share of it
+still inside the sliding interval, which bounds memory to O(1) per key
+while avoiding the bursts allowed at fixed-window boundaries.
+
+``RATELIMIT_BACKEND`` selects where counters live: ``sql`` (the
+default, the ``rate_limit_windows`` table) shares them between worker
+processes; ``memory`` is only right for a single process, since every
+worker would otherwise grant the full limit on its own. Keys idle for
+two windows are deleted every ``RATELIMIT_SWEEP_INTERVAL`` seconds.
+
+Per-IP keys use ``request.remote_addr``. Behind a reverse proxy, set
+``PROXY_FIX_X_FOR`` to the number of trusted proxies so that ProxyFix
+rewrites it from ``X-Forwarded-For``; a client-supplied header is never
+trusted on its own.
+"""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+# Purge idle memory keys after this many hits
+PURGE_EVERY = 10000
+
+
+def _slide(now, window, state):
+    """Roll ``(window_index, current, previous)`` forward to ``now``."""
+    index = int(now // window)
+    stored_index, current, previous = state
+    if index == stored_index:
+        return index, current, previous
+    if index == stored_index + 1:
+        return index, 0, current
+    return index, 0, 0
+
+
+def _estimate(now, window, current, previous):
+    elapsed = (now % window) / window
+    return previous * (1 - elapsed) + current
+
+
+class MemoryWindowBackend:
+    """Process-local counters."""
+
+    def __init__(self):
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    def hit(self, key, limit, window, now):
+        with self._lock:
+            state = self._windows.get(key, (0, 0, 0, 0))[:3]
+            index, current, previous = _slide(now, window, state)
+            allowed = _estimate(now, window, current, previous) < limit
+            if allowed:
+                current += 1
+            # Two windows later neither counter carries any weight
+            self._windows[key] = (index, current, previous, (index + 2) * window)
+            self._hits += 1
+            if self._hits % PURGE_EVERY == 0:
+                self._purge(now)
+            return allowed
+
+    def _purge(self, now):
+        for key in [k for k, state in self._windows.items() if state[3] <= now]:
+            del self._windows[key]
+
+    def sweep(self, now=None):
+        with self._lock:
+            before = len(self._windows)
+            self._purge(time.time() if now is None else now)
+            return before - len(self._windows)
+
+
+class SQLWindowBackend:
+    """Counters shared by every worker through ``rate_limit_windows``."""
+
+    def hit(self, key, limit, window, now):
+        from models import db, RateLimitWindow
+
+        table = RateLimitWindow.__table__
+        for _ in range(2):
+            try:
+                with db.engine.begin() as conn:
+                    row = conn.execute(
+                        select(table.c.window_index, table.c.current, table.c.previous)
+                        .where(table.c.key == key)
+                        .with_for_update()
+                    ).first()
+                    index, current, previous = _slide(now, window, row or (0, 0, 0))
+                    allowed = _estimate(now, window, current, previous) < limit
+                    if allowed:
+                        current += 1
+                    values = dict(window_index=index, current=current, previous=previous,
+                                  expires_at=(index + 2) * window)
+                    if row is None:
+                        conn.execute(table.insert().values(key=key, **values))
+                    else:
+                        conn.execute(update(table).where(table.c.key == key).values(**values))
+                    return allowed
+            except IntegrityError:
+                # Another process inserted the key first: retry as an update
+                continue
+        # Still conflicting: refuse rather than let the request through unlimited
+        current_app.logger.warning(f"Rate limit key {key} kept conflicting, refusing")
+        return False
+
+    def sweep(self, now=None):
+        from models import db, RateLimitWindow
+
+        table = RateLimitWindow.__table__
+        now = time.time() if now is None else now
+        with db.engine.begin() as conn:
+            result = conn.execute(delete(table).where(table.c.expires_at <= now))
+        return result.rowcount
+
+
+BACKENDS = {
+    "memory": MemoryWindowBackend,
+    "sql": SQLWindowBackend,
+}
+
+
+class RateLimiter:
+    """Apply the configured per-IP and per-email limits."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RATELIMIT_ENABLED", True)
+        app.config.setdefault("RATELIMIT_BACKEND", "sql")
+        app.config.setdefault("RATELIMIT_RULES", {})
+        app.config.setdefault("RATELIMIT_SWEEP_INTERVAL", 300)
+        self.app = app
+        self.backend = BACKENDS[app.config["RATELIMIT_BACKEND"]]()
+        if isinstance(self.backend, MemoryWindowBackend) and not (app.debug or app.testing):
+            app.logger.warning("RATELIMIT_BACKEND='memory' counts per process: "
+                               "with several workers each one grants the full limit")
+        app.extensions["rate_limiter"] = self
+
+        interval = app.config["RATELIMIT_SWEEP_INTERVAL"]
+        if interval:
+            threading.Thread(target=self._sweep_forever, args=(interval,),
+                             daemon=True).start()
+
+    def hit(self, scope, **identifiers):
+        """Count one request for ``scope``.
+
+        ``identifiers`` maps a rule dimension (``ip``, ``email``) to its
+        value for this request. Returns the number of seconds to wait
+        before retrying when a limit is exceeded, or 0 when allowed.
+        """
+        if not current_app.config["RATELIMIT_ENABLED"]:
+            return 0
+        now = time.time()
+        for dimension, limit, window in current_app.config["RATELIMIT_RULES"].get(scope, ()):
+            value = identifiers.get(dimension)
+            if not value:
+                continue
+            key = f"{scope}:{dimension}:{str(value).lower()}"
+            if not self.backend.hit(key, limit, window, now):
+                return int(window - now % window) + 1
+        return 0
+
+    def sweep(self):
+        """Delete the counters of keys idle for two windows."""
+        with self.app.app_context():
+            return self.backend.sweep()
+
+    def _sweep_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                self.app.logger.error(f"Error sweeping rate limit windows: {e}")
+
+
+def rate_limit(scope, **identifiers):
+    """Count a request against the application's rate limiter."""
+    limiter = current_app.extensions.get("rate_limiter")
+    if limiter is None:
+        return 0
+    return limiter.hit(scope, **identifiers)
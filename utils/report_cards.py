@@ -0,0 +1,196 @@
+"""Term report cards: course averages, credit-weighted averages and ranks.
+
+The grades of a term (one class group or the whole school) are read with
+a single query into NumPy columns; everything else is array arithmetic:
+
+* ``(student, course)`` pairs are factorised with ``np.unique`` and their
+  averages are ``bincount`` sums divided by ``bincount`` counts;
+* the general average is the mean of the course averages weighted by
+  ``Course.credits`` (1 when unset), again with ``bincount``;
+* ranks use a ``lexsort`` by group then descending average: tied
+  averages share the rank of the first of them (1, 2, 2, 4);
+* the percentile places a student within the class, 100 for the best
+  and 0 for the last.
+
+Results replace the term's previous rows in ``report_cards`` and
+``report_card_courses`` in bulk, so a term-end run costs a few queries
+whatever the number of students.
+"""
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.orm import contains_eager
+
+from models import db, Course, Grade, ReportCard, ReportCardCourse, Student
+from utils.bulk import insert_rows
+from utils.terms import term_bounds
+
+_GRADE_DTYPE = [("student", "i8"), ("course", "i8"), ("value", "f8"), ("credits", "f8")]
+INSERT_BATCH = 5000
+
+
+def load_grades(term, class_group=None):
+    """Grades of ``term`` as a structured array (student, course, value,
+    credits), plus the class group of each student id."""
+    start, end = term_bounds(term)
+    stmt = (
+        select(Grade.student_id, Grade.course_id, Grade.grade_value,
+               func.coalesce(Course.credits, 1))
+        .join(Course, Grade.course_id == Course.id)
+        .where(Grade.date_recorded >= start, Grade.date_recorded < end)
+    )
+    students = select(Student.id, Student.class_name)
+    if class_group:
+        stmt = stmt.join(Student, Grade.student_id == Student.id).where(
+            Student.class_name == class_group)
+        students = students.where(Student.class_name == class_group)
+    else:
+        students = students.where(Student.id.in_(stmt.with_only_columns(Grade.student_id)))
+    result = db.session.execute(stmt)
+    grades = np.fromiter(map(tuple, result), dtype=_GRADE_DTYPE)
+    return grades, dict(db.session.execute(students).all())
+
+
+def rank(groups, values):
+    """Competition rank of ``values`` (highest first) within ``groups``,
+    and the size of each element's group."""
+    n = len(values)
+    if not n:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    order = np.lexsort((-values, groups))
+    sorted_groups, sorted_values = groups[order], values[order]
+    positions = np.arange(n)
+    new_group = np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]
+    new_value = new_group | np.r_[True, sorted_values[1:] != sorted_values[:-1]]
+    group_start = np.maximum.accumulate(np.where(new_group, positions, 0))
+    tie_start = np.maximum.accumulate(np.where(new_value, positions, 0))
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[order] = tie_start - group_start + 1
+    _, group_index, sizes = np.unique(groups, return_inverse=True, return_counts=True)
+    return ranks, sizes[group_index]
+
+
+def compute(grades, classes):
+    """Report card columns from :func:`load_grades` output.
+
+    Returns ``(cards, courses)``, two dicts of equal-length arrays: one
+    entry per student, and one per student and course.
+    """
+    student_ids, student_index = np.unique(grades["student"], return_inverse=True)
+    course_ids, course_index = np.unique(grades["course"], return_inverse=True)
+    n_courses = max(len(course_ids), 1)
+
+    # Per (student, course) averages
+    pair_keys, pair_index = np.unique(student_index * n_courses + course_index,
+                                      return_inverse=True)
+    counts = np.bincount(pair_index)
+    averages = np.bincount(pair_index, weights=grades["value"]) / counts
+    pair_student = pair_keys // n_courses
+    pair_course = pair_keys % n_courses
+    credits = np.zeros(len(course_ids))
+    credits[course_index] = grades["credits"]
+    pair_credits = credits[pair_course]
+
+    # Credit-weighted general average (plain mean when no course has credits)
+    weights = np.bincount(pair_student, weights=pair_credits, minlength=len(student_ids))
+    weighted = np.bincount(pair_student, weights=averages * pair_credits,
+                           minlength=len(student_ids))
+    plain = (np.bincount(pair_student, weights=averages, minlength=len(student_ids))
+             / np.bincount(pair_student, minlength=len(student_ids)))
+    general = np.divide(weighted, weights, out=plain, where=weights > 0)
+
+    class_names, class_index = np.unique(
+        np.array([classes[sid] for sid in student_ids.tolist()], dtype=object).astype(str),
+        return_inverse=True)
+    class_rank, class_size = rank(class_index, general)
+    percentile = np.where(class_size > 1,
+                          100.0 * (class_size - class_rank) / np.maximum(class_size - 1, 1),
+                          100.0)
+    course_rank, course_size = rank(class_index[pair_student] * n_courses + pair_course,
+                                    averages)
+
+    cards = {
+        "student_id": student_ids,
+        "class_group": class_names[class_index],
+        "general_average": general,
+        "credits": np.rint(weights).astype(np.int64),
+        "class_rank": class_rank,
+        "class_size": class_size,
+        "percentile": percentile,
+    }
+    courses = {
+        "student_id": student_ids[pair_student],
+        "course_id": course_ids[pair_course],
+        "average": averages,
+        "grade_count": counts,
+        "class_rank": course_rank,
+        "class_size": course_size,
+    }
+    return cards, courses
+
+
+def _rows(columns, **extra):
+    names = list(columns)
+    for values in zip(*(columns[name].tolist() for name in names)):
+        yield dict(zip(names, values), **extra)
+
+
+def _insert(model, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == INSERT_BATCH:
+            insert_rows(model, batch)
+            batch = []
+    insert_rows(model, batch)
+
+
+def compute_report_cards(term, class_group=None):
+    """Compute and store the report cards of ``term`` for one class group
+    or the whole school; returns the number of report cards written."""
+    grades, classes = load_grades(term, class_group)
+    cards, courses = compute(grades, classes)
+
+    for model in (ReportCard, ReportCardCourse):
+        stmt = delete(model).where(model.term == term)
+        if class_group:
+            stmt = stmt.where(model.student_id.in_(
+                select(Student.id).where(Student.class_name == class_group)))
+        db.session.execute(stmt)
+    now = datetime.utcnow()
+    _insert(ReportCard, _rows(cards, term=term, computed_at=now))
+    _insert(ReportCardCourse, _rows(courses, term=term))
+    db.session.commit()
+    return len(cards["student_id"])
+
+
+def report_card_for(student_id, term):
+    """Stored report card of a student with its course lines (by course
+    name), or ``(None, [])``."""
+    card = db.session.scalar(select(ReportCard).where(ReportCard.term == term,
+                                                      ReportCard.student_id == student_id))
+    if card is None:
+        return None, []
+    lines = db.session.scalars(
+        select(ReportCardCourse).join(Course, ReportCardCourse.course_id == Course.id)
+        .options(contains_eager(ReportCardCourse.course))
+        .where(ReportCardCourse.term == term, ReportCardCourse.student_id == student_id)
+        .order_by(Course.name)
+    ).all()
+    return card, lines
+
+
+def report_card_terms(student_id):
+    """Terms with a stored report card for the student, newest first."""
+    return db.session.scalars(
+        select(ReportCard.term).where(ReportCard.student_id == student_id)
+        .order_by(ReportCard.term.desc())
+    ).all()
+
+
+@event.listens_for(Student, "before_delete")
+def _student_deleted(mapper, connection, target):
+    for model in (ReportCard, ReportCardCourse):
+        connection.execute(delete(model.__table__)
+                           .where(model.__table__.c.student_id == target.id))
@@ -0,0 +1,151 @@
+"""Role registry with precompiled permission bitsets.
+
+Roles change rarely, so the id/name mapping is loaded once and every
+role check becomes a dictionary lookup plus a bitwise AND. Inserting,
+updating or deleting a ``Role`` marks the registry stale; call
+:meth:`RoleRegistry.reload` to refresh it explicitly.
+"""
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.exc import SQLAlchemyError
+
+PERMISSIONS = (
+    "view_grades",
+    "view_schedule",
+    "view_profile",
+    "view_child_grades",
+    "view_child_schedule",
+    "view_child_absences",
+    "add_grades",
+    "mark_absences",
+    "view_classes",
+    "send_messages",
+    "manage_users",
+    "manage_courses",
+    "manage_schedule",
+    "view_dashboard",
+)
+
+PERMISSION_BITS = {name: 1 << i for i, name in enumerate(PERMISSIONS)}
+
+ROLE_PERMISSIONS = {
+    "student": ["view_grades", "view_schedule", "view_profile"],
+    "parent": [
+        "view_child_grades",
+        "view_child_schedule",
+        "view_child_absences",
+    ],
+    "teacher": ["add_grades", "mark_absences", "view_classes", "send_messages"],
+    "admin": [
+        "manage_users",
+        "manage_courses",
+        "manage_schedule",
+        "view_dashboard",
+    ],
+}
+
+
+def compile_permissions(names):
+    """Fold a list of permission names into a bitset."""
+    mask = 0
+    for name in names:
+        mask |= PERMISSION_BITS[name]
+    return mask
+
+
+ROLE_MASKS = {role: compile_permissions(names) for role, names in ROLE_PERMISSIONS.items()}
+
+# Minimum delay between reloads triggered by an unknown role id
+RELOAD_COOLDOWN = 5.0
+
+
+class RoleRegistry:
+    """In-memory mapping of role ids to names and permission bitsets."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._names = {}
+        self._ids = {}
+        self._masks = {}
+        self._choices = []
+        self._stale = True
+        self._loaded_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from models import Role
+
+        app.extensions["role_registry"] = self
+        for name in ("after_insert", "after_update", "after_delete"):
+            if not event.contains(Role, name, _mark_stale):
+                event.listen(Role, name, _mark_stale)
+
+        with app.app_context():
+            try:
+                self.reload()
+            except SQLAlchemyError:
+                # Tables not created yet: load lazily on first use
+                self._stale = True
+
+    def reload(self):
+        """Reload the role table into memory."""
+        from models import db, Role
+
+        rows = db.session.execute(select(Role.id, Role.name).order_by(Role.id)).all()
+        with self._lock:
+            self._names = {role_id: name for role_id, name in rows}
+            self._ids = {name: role_id for role_id, name in rows}
+            self._masks = {role_id: ROLE_MASKS.get(name, 0) for role_id, name in rows}
+            self._choices = [(role_id, name) for role_id, name in rows]
+            # An empty table usually means roles are not seeded yet
+            self._stale = not rows
+            self._loaded_at = time.monotonic()
+
+    def mark_stale(self):
+        self._stale = True
+
+    def _ensure(self, role_id=None):
+        if self._stale or (
+            role_id is not None
+            and role_id not in self._names
+            and time.monotonic() - self._loaded_at > RELOAD_COOLDOWN
+        ):
+            self.reload()
+
+    def name_for(self, role_id):
+        self._ensure(role_id)
+        return self._names.get(role_id)
+
+    def id_for(self, name):
+        self._ensure()
+        return self._ids.get(name)
+
+    def choices(self):
+        """``(id, name)`` pairs for role select fields."""
+        self._ensure()
+        return list(self._choices)
+
+    def can(self, role_id, permission):
+        self._ensure(role_id)
+        return bool(self._masks.get(role_id, 0) & PERMISSION_BITS.get(permission, 0))
+
+
+def current_role_registry():
+    if has_app_context():
+        return current_app.extensions.get("role_registry")
+    return None
+
+
+def role_choices():
+    """Role choices for forms, served from the registry."""
+    return current_app.extensions["role_registry"].choices()
+
+
+def _mark_stale(mapper, connection, target):
+    registry = current_role_registry()
+    if registry is not None:
+        registry.mark_stale()
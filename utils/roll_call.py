@@ -0,0 +1,73 @@
+"""Roll call: the absences of a class group for one timetable slot.
+
+A roll call lists the students of the slot's class group on a given day
+and records the ticked ones as absent with a single bulk insert. Rows
+carry the slot's ``schedule_id`` and ``(student_id, date, schedule_id)``
+is unique, so only missing absences are inserted and submitting the same
+roll call twice, even concurrently, records each absence once.
+"""
+from datetime import date, time, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Absence
+from utils.bulk import insert_absences
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+NOON = time(12)
+
+
+def slot_date(schedule, day=None):
+    """Date of the slot's latest occurrence on or before ``day`` (today)."""
+    day = day or date.today()
+    return day - timedelta(days=(day.weekday() - WEEKDAYS.index(schedule.day_of_week)) % 7)
+
+
+def slot_period(schedule):
+    """``Absence.period`` of a slot, as chosen in the single absence form."""
+    return "Morning" if schedule.start_time < NOON else "Afternoon"
+
+
+def recorded_absentees(schedule_id, day, student_ids=None, lock=False):
+    """Ids of the students already recorded absent for the slot on ``day``,
+    among ``student_ids`` when given.
+
+    ``lock`` makes it a locking read (``SELECT ... FOR UPDATE``): on
+    InnoDB it sees rows committed after the transaction's REPEATABLE READ
+    snapshot and holds them until commit.
+    """
+    stmt = select(Absence.student_id).where(Absence.schedule_id == schedule_id,
+                                            Absence.date == day)
+    if student_ids is not None:
+        stmt = stmt.where(Absence.student_id.in_(student_ids))
+    if lock:
+        stmt = stmt.with_for_update()
+    return set(db.session.scalars(stmt))
+
+
+def _insert_missing(schedule, day, student_ids, teacher_id, lock=False):
+    student_ids = set(student_ids)
+    missing = student_ids - recorded_absentees(schedule.id, day, student_ids, lock=lock)
+    return insert_absences([{
+        "student_id": student_id,
+        "date": day,
+        "period": slot_period(schedule),
+        "teacher_id": teacher_id,
+        "schedule_id": schedule.id,
+    } for student_id in sorted(missing)])
+
+
+def record_roll_call(schedule, day, student_ids, teacher_id):
+    """Record ``student_ids`` absent for the slot; returns how many were new.
+
+    The caller commits.
+    """
+    try:
+        with db.session.begin_nested():
+            return _insert_missing(schedule, day, student_ids, teacher_id)
+    except IntegrityError:
+        # A concurrent submission recorded some of them first. A plain
+        # re-read would still use the old snapshot on InnoDB and insert
+        # them again: lock the rows to read the committed ones.
+        return _insert_missing(schedule, day, student_ids, teacher_id, lock=True)
@@ -0,0 +1,310 @@
+"""Seeded synthetic school for load testing.
+
+:func:`generate_school` creates a school of any size (students, class
+groups, teachers, years of grade and absence history) with accounts,
+profiles, parent links, courses and a timetable. The same seed always
+produces the same data: each student draws from its own random stream,
+so the batch size does not change the result. Everything is written with the core bulk inserts
+of :mod:`utils.bulk` in batches of ``batch_size`` rows, each batch
+committed on its own, and every account of a role shares one password
+hash, so the key derivation runs four times whatever the size.
+
+Generated accounts use ``<role><n>.g<seed>@<domain>`` emails and
+``G<seed>-`` prefixed numbers, so several seeds can live side by side.
+"""
+import math
+import random
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import select
+
+from models import (db, GRADE_TYPES as FORM_GRADE_TYPES, Course, Parent, ParentStudent,
+                    Role, Schedule, Student, Teacher, User)
+from utils.admin import SAMPLE_PASSWORDS, sample_password_hashes
+from utils.bulk import insert_absences, insert_grades, insert_rows
+from utils.terms import term_bounds, term_for
+
+# Subjects taught to every class group, with their credits
+SUBJECTS = [
+    ("French", 4), ("Mathematics", 4), ("History-Geography", 3), ("Civics", 1),
+    ("Foreign Languages", 3), ("Biology", 2), ("Physics-Chemistry", 2),
+    ("Technology", 1), ("Physical Education", 2), ("Art", 1), ("Music", 1),
+]
+LEVELS = ["6", "5", "4", "3"]
+STUDENTS_PER_CLASS = 25
+CLASSES_PER_TEACHER = 6
+GRADES_PER_YEAR = 6  # per student and subject
+# The grade form's types, tests and homework drawn twice as often
+GRADE_TYPES = [value for value, _ in FORM_GRADE_TYPES
+               for _ in range(2 if value in ("Test", "Homework") else 1)]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+SLOTS = [time(hour) for hour in (8, 9, 10, 11, 13, 14, 15, 16)]
+PERIODS = ["Morning", "Afternoon", "Full day"]
+REASONS = ["Illness", "Medical appointment", "Family reason", None]
+
+
+def _letters(n):
+    """``A``, ``B``... ``Z``, ``AA``, ``AB``... (bijective base 26)."""
+    name = ""
+    n += 1
+    while n:
+        n, rest = divmod(n - 1, 26)
+        name = chr(ord("A") + rest) + name
+    return name
+
+
+def class_names(count):
+    """``count`` class group names spread over the four levels (6A, 5A...)."""
+    return [LEVELS[i % len(LEVELS)] + _letters(i // len(LEVELS)) for i in range(count)]
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Generator:
+    def __init__(self, seed, domain, batch_size, progress):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.tag = f"g{seed}"
+        self.prefix = f"G{seed}-"
+        self.domain = domain
+        self.batch_size = batch_size
+        self.progress = progress or (lambda message: None)
+        self.created = {}
+
+    def email(self, role, n):
+        return f"{role}{n}.{self.tag}@{self.domain}"
+
+    def student_rng(self, n, purpose):
+        """Random stream of student ``n`` for one ``purpose``."""
+        return random.Random(f"{self.seed}:{purpose}:{n}")
+
+    def count(self, name, rows):
+        self.created[name] = self.created.get(name, 0) + rows
+
+    def role_ids(self):
+        names = set(db.session.scalars(select(Role.name)))
+        for name in SAMPLE_PASSWORDS:
+            if name not in names:
+                db.session.add(Role(name=name, description=name.capitalize()))
+        db.session.flush()
+        return dict(db.session.execute(select(Role.name, Role.id)).all())
+
+    def insert_users(self, rows):
+        """Insert user dicts; returns their ids keyed by email."""
+        self.count("users", insert_rows(User, rows))
+        return dict(db.session.execute(
+            select(User.email, User.id).where(User.email.in_([row["email"] for row in rows]))
+        ).all())
+
+    def user_row(self, role, n, first_name, last_name, birthdate):
+        return {
+            "email": self.email(role, n),
+            "first_name": first_name,
+            "last_name": last_name,
+            "role_id": self.roles[role],
+            "password_hash": self.hashes[role],
+            "birthdate": birthdate,
+            "is_active": True,
+        }
+
+    def teachers(self, count, hire_date):
+        """Create the teachers and one course each; returns the course ids
+        by subject index (teacher ``n`` teaches subject ``n % len(SUBJECTS)``)."""
+        courses = {s: [] for s in range(len(SUBJECTS))}
+        for numbers in _batches(range(1, count + 1), self.batch_size):
+            user_ids = self.insert_users([
+                self.user_row("teacher", n, f"Teacher{n}", "Load", date(1985, 1, 1))
+                for n in numbers])
+            self.count("teachers", insert_rows(Teacher, [{
+                "user_id": user_ids[self.email("teacher", n)],
+                "employee_number": f"{self.prefix}T{n}",
+                "department": SUBJECTS[(n - 1) % len(SUBJECTS)][0],
+                "hire_date": hire_date,
+            } for n in numbers]))
+            teacher_ids = dict(db.session.execute(
+                select(Teacher.employee_number, Teacher.id)
+                .where(Teacher.employee_number.in_([f"{self.prefix}T{n}" for n in numbers]))
+            ).all())
+            self.count("courses", insert_rows(Course, [{
+                "name": SUBJECTS[(n - 1) % len(SUBJECTS)][0],
+                "code": f"{self.prefix}C{n}",
+                "description": f"Course on {SUBJECTS[(n - 1) % len(SUBJECTS)][0]}",
+                "credits": SUBJECTS[(n - 1) % len(SUBJECTS)][1],
+                "teacher_id": teacher_ids[f"{self.prefix}T{n}"],
+            } for n in numbers]))
+            db.session.commit()
+        rows = db.session.execute(
+            select(Course.code, Course.id, Course.teacher_id)
+            .where(Course.code.like(f"{self.prefix}C%"))
+        ).all()
+        by_number = {int(code[len(self.prefix) + 1:]): (course_id, teacher_id)
+                     for code, course_id, teacher_id in rows}
+        for n in sorted(by_number):
+            courses[(n - 1) % len(SUBJECTS)].append(by_number[n])
+        return courses
+
+    def timetable(self, groups, courses):
+        """One weekly slot per class group and subject; returns the
+        ``(course_id, teacher_id)`` of each subject for each group."""
+        taught = {}
+        rows = []
+        for c, group in enumerate(groups):
+            slots = self.rng.sample([(d, s) for d in DAYS for s in SLOTS], len(SUBJECTS))
+            taught[group] = []
+            for s, (day, start) in enumerate(slots):
+                course = courses[s][c % len(courses[s])]
+                taught[group].append(course)
+                rows.append({
+                    "course_id": course[0],
+                    "day_of_week": day,
+                    "start_time": start,
+                    "end_time": time(start.hour + 1),
+                    "classroom": f"{self.rng.randint(1, 40)}{self.rng.choice('ABC')}",
+                    "class_group": group,
+                })
+        for chunk in _batches(rows, self.batch_size):
+            self.count("schedules", insert_rows(Schedule, chunk))
+        db.session.commit()
+        return taught
+
+    def students(self, numbers, groups, enrollment_date):
+        """Create a batch of students, with one parent per two students;
+        returns ``(n, student_id, class_group)`` tuples."""
+        users = [self.user_row("student", n, f"Student{n}", "Load", date(2010, 1, 1)
+                               + timedelta(days=self.student_rng(n, "profile").randrange(4 * 365)))
+                 for n in numbers]
+        parents = sorted({(n + 1) // 2 for n in numbers})
+        users += [self.user_row("parent", p, f"Parent{p}", "Load", date(1980, 1, 1))
+                  for p in parents]
+        user_ids = self.insert_users(users)
+
+        self.count("students", insert_rows(Student, [{
+            "user_id": user_ids[self.email("student", n)],
+            "student_number": f"{self.prefix}S{n}",
+            "class_name": groups[(n - 1) % len(groups)],
+            "enrollment_date": enrollment_date,
+        } for n in numbers]))
+        self.count("parents", insert_rows(Parent, [
+            {"user_id": user_ids[self.email("parent", p)]} for p in parents
+        ]))
+        student_ids = dict(db.session.execute(
+            select(Student.student_number, Student.id)
+            .where(Student.student_number.in_([f"{self.prefix}S{n}" for n in numbers]))
+        ).all())
+        parent_ids = dict(db.session.execute(
+            select(Parent.user_id, Parent.id)
+            .where(Parent.user_id.in_([user_ids[self.email("parent", p)] for p in parents]))
+        ).all())
+        self.count("parent_links", insert_rows(ParentStudent, [{
+            "parent_id": parent_ids[user_ids[self.email("parent", (n + 1) // 2)]],
+            "student_id": student_ids[f"{self.prefix}S{n}"],
+            "relationship_type": "parent",
+        } for n in numbers]))
+        db.session.commit()
+        return [(n, student_ids[f"{self.prefix}S{n}"], groups[(n - 1) % len(groups)])
+                for n in numbers]
+
+    @staticmethod
+    def _day(rng, start, end):
+        return start + timedelta(days=rng.randrange(max((end - start).days, 1)))
+
+    def grade_rows(self, students, taught, school_years):
+        for n, student_id, group in students:
+            rng = self.student_rng(n, "grades")
+            level = rng.gauss(12, 3)
+            for start, end in school_years:
+                for course_id, teacher_id in taught[group]:
+                    for _ in range(GRADES_PER_YEAR):
+                        value = min(max(round(rng.gauss(level, 3) * 2) / 2, 0), 20)
+                        yield {
+                            "student_id": student_id,
+                            "course_id": course_id,
+                            "teacher_id": teacher_id,
+                            "grade_value": value,
+                            "grade_type": rng.choice(GRADE_TYPES),
+                            "date_recorded": datetime.combine(
+                                self._day(rng, start, end), rng.choice(SLOTS)),
+                            "comments": None,
+                        }
+
+    def absence_rows(self, students, taught, school_years):
+        for n, student_id, group in students:
+            rng = self.student_rng(n, "absences")
+            for start, end in school_years:
+                days = {self._day(rng, start, end) for _ in range(rng.randint(0, 6))}
+                for day in sorted(days):
+                    justified = rng.random() < 0.6
+                    yield {
+                        "student_id": student_id,
+                        "teacher_id": rng.choice(taught[group])[1],
+                        "date": day,
+                        "period": rng.choice(PERIODS),
+                        "is_justified": justified,
+                        "reason": rng.choice(REASONS) if justified else None,
+                    }
+
+    def history(self, students, taught, school_years):
+        for chunk in _chunked(self.grade_rows(students, taught, school_years), self.batch_size):
+            self.count("grades", insert_grades(chunk))
+            db.session.commit()
+        for chunk in _chunked(self.absence_rows(students, taught, school_years), self.batch_size):
+            self.count("absences", insert_absences(chunk))
+            db.session.commit()
+
+
+def school_years(years, today=None):
+    """``(start, end)`` of the last ``years`` school years up to ``today``,
+    oldest first; the current one ends today."""
+    today = today or date.today()
+    current = int(term_for(today).split("-")[0])
+    spans = []
+    for year in range(current - years + 1, current + 1):
+        start, _ = term_bounds(f"{year}-T1")
+        end, _ = term_bounds(f"{year + 1}-T1")
+        spans.append((start, min(end - timedelta(days=62), today)))  # no grades in summer
+    return spans
+
+
+def generate_school(students=1000, classes=None, teachers=None, years=1, seed=0,
+                    batch_size=5000, domain="load.test", today=None, progress=None):
+    """Create a synthetic school; returns the number of rows created per table.
+
+    ``classes`` defaults to one class group per 25 students and
+    ``teachers`` to one per six class groups and subject. Raises
+    ValueError when data was already generated with this seed.
+    """
+    generator = _Generator(seed, domain, batch_size, progress)
+    if db.session.scalar(select(User.id).where(User.email == generator.email("teacher", 1))):
+        raise ValueError(f"A school was already generated with seed {seed}.")
+    classes = classes or max(1, math.ceil(students / STUDENTS_PER_CLASS))
+    teachers = max(teachers or math.ceil(classes * len(SUBJECTS) / CLASSES_PER_TEACHER),
+                   len(SUBJECTS))
+    spans = school_years(years, today)
+
+    generator.roles = generator.role_ids()
+    generator.hashes = sample_password_hashes()
+    courses = generator.teachers(teachers, spans[0][0])
+    groups = class_names(classes)
+    taught = generator.timetable(groups, courses)
+    generator.progress(f"{teachers} teachers, {classes} class groups")
+
+    # Even batches keep both children of a parent in the same batch
+    for numbers in _batches(range(1, students + 1), batch_size + batch_size % 2):
+        batch = generator.students(numbers, groups, spans[0][0])
+        generator.history(batch, taught, spans)
+        generator.progress(f"{numbers[-1]}/{students} students")
+    return generator.created
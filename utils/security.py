@@ -1,26 +1,21 @@
 from flask import request
-from models import db, AuthLog
 from datetime import datetime
 
+from utils.audit import write_auth_log
+
 def log_auth_attempt(email, action, success, user_id=None, details=None):
     """Record an authentication attempt in the logs"""
-    log = AuthLog(
-        user_id=user_id,
-        email=email,
-        action=action,
-        ip_address=request.remote_addr,
-        user_agent=request.headers.get('User-Agent'),
-        success=success,
-        details=details
-    )
-    
-    db.session.add(log)
-    db.session.commit()
+    write_auth_log({
+        'user_id': user_id,
+        'email': email,
+        'action': action,
+        'ip_address': request.remote_addr,
+        'user_agent': request.headers.get('User-Agent'),
+        'timestamp': datetime.utcnow(),
+        'success': success,
+        'details': details
+    })
 
 def get_client_ip():
-    """Retrieve the client IP address accounting for proxies"""
-    if request.headers.getlist("X-Forwarded-For"):
-        ip = request.headers.getlist("X-Forwarded-For")[0]
-    else:
-        ip = request.remote_addr
-    return ip
\ No newline at end of file
+    """Retrieve the client IP address (rewritten by ProxyFix behind trusted proxies)"""
+    return request.remote_addr
@@ -0,0 +1,157 @@
+"""Opt-in per-request SQL instrumentation: statement counts, N+1 detection
+and query budgets.
+
+When ``SQL_INSPECT_ENABLED`` is set, every statement executed while a
+request is being handled is recorded through the engine's
+``before_cursor_execute`` event, together with the template or
+application line that triggered it. At the end of the request the
+statements are grouped by shape (the SQL text with bound values and
+``IN`` lists collapsed); a shape repeated at least
+``SQL_N_PLUS_ONE_THRESHOLD`` times is reported as a probable N+1
+pattern. Requests running more statements than their budget
+(``SQL_QUERY_BUDGETS`` per endpoint, ``SQL_QUERY_BUDGET`` otherwise) are
+logged, or raise :class:`QueryBudgetExceeded` when
+``SQL_BUDGET_ENFORCE`` is set, which makes tests fail.
+"""
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+
+from flask import current_app, g, has_request_context, request, template_rendered
+from flask.signals import before_render_template
+from sqlalchemy import event
+
+from models import db
+
+_PARAM = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_IN_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more SQL statements than its budget allows."""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(
+            f"{report.endpoint} ran {report.total} SQL statements "
+            f"(budget {report.budget})\n{report.summary()}"
+        )
+
+
+def statement_shape(statement):
+    """SQL text with whitespace and expanded ``IN`` lists normalised."""
+    return _IN_LIST.sub("(?)", _SPACES.sub(" ", statement).strip())
+
+
+class RequestReport:
+    """Statements of one request grouped by shape."""
+
+    def __init__(self, endpoint, statements, threshold, budget):
+        self.endpoint = endpoint
+        self.total = len(statements)
+        self.budget = budget
+        self.shapes = Counter(shape for shape, _ in statements)
+        self.origins = defaultdict(Counter)
+        for shape, origin in statements:
+            self.origins[shape][origin] += 1
+        self.n_plus_one = [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.total > self.budget
+
+    def summary(self, limit=5):
+        lines = []
+        for shape, count in self.shapes.most_common(limit):
+            origins = ", ".join(
+                f"{origin} ({n})" for origin, n in self.origins[shape].most_common(3)
+            )
+            lines.append(f"  {count}x {shape[:160]}\n      from {origins}")
+        return "\n".join(lines)
+
+
+class SQLInspector:
+    """Record the statements of each request and check them at the end."""
+
+    def __init__(self, app=None):
+        self.last_report = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SQL_INSPECT_ENABLED", False)
+        app.config.setdefault("SQL_N_PLUS_ONE_THRESHOLD", 5)
+        app.config.setdefault("SQL_QUERY_BUDGET", None)
+        app.config.setdefault("SQL_QUERY_BUDGETS", {})
+        app.config.setdefault("SQL_BUDGET_ENFORCE", False)
+        app.extensions["sql_inspector"] = self
+        if not app.config["SQL_INSPECT_ENABLED"]:
+            return
+
+        self.app = app
+        self.root = os.path.abspath(app.root_path) + os.sep
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute", self._record)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.sql_statements = []
+        g.sql_templates = []
+
+    def _template_started(self, sender, template, context, **extra):
+        if "sql_templates" in g:
+            g.sql_templates.append(template.name)
+
+    def _template_finished(self, sender, template, context, **extra):
+        if g.get("sql_templates"):
+            g.sql_templates.pop()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context() or "sql_statements" not in g:
+            return
+        g.sql_statements.append((statement_shape(statement), self._origin()))
+
+    def _origin(self):
+        """Template being rendered, else the innermost application line."""
+        if g.sql_templates:
+            return f"template {g.sql_templates[-1]}"
+        frame = sys._getframe(2)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if (filename.startswith(self.root) and filename != __file__
+                    and "site-packages" not in filename):
+                return f"{filename[len(self.root):]}:{frame.f_lineno}"
+            frame = frame.f_back
+        return "unknown"
+
+    def _finish(self, response):
+        statements = g.pop("sql_statements", None)
+        if statements is None:
+            return response
+        config = current_app.config
+        endpoint = request.endpoint or request.path
+        budget = config["SQL_QUERY_BUDGETS"].get(endpoint, config["SQL_QUERY_BUDGET"])
+        report = RequestReport(endpoint, statements, config["SQL_N_PLUS_ONE_THRESHOLD"], budget)
+        self.last_report = report
+        response.headers["X-SQL-Queries"] = str(report.total)
+
+        for shape, count in report.n_plus_one:
+            origins = ", ".join(origin for origin, _ in report.origins[shape].most_common(3))
+            current_app.logger.warning(
+                f"Probable N+1 on {endpoint}: {count}x {shape[:160]} from {origins}"
+            )
+        if report.over_budget:
+            if config["SQL_BUDGET_ENFORCE"]:
+                raise QueryBudgetExceeded(report)
+            current_app.logger.warning(
+                f"{endpoint} ran {report.total} SQL statements (budget {budget})\n{report.summary()}"
+            )
+        return response
@@ -0,0 +1,149 @@
+"""Row counts for the admin dashboards, kept in ``statistics_snapshot``.
+
+Counting ``grades`` or ``auth_logs``-sized tables on every page view is
+a full index scan on InnoDB. Instead, each insert or delete of a counted
+model adds +1/-1 to its counter in the same transaction, and the
+dashboards read every counter with one query. Writes that bypass the ORM
+call :func:`apply_count`; drift (raw SQL, restored backups...) is
+corrected by :func:`reconcile_statistics`, run every
+``STATS_RECONCILE_INTERVAL`` seconds and by ``flask reconcile-statistics``.
+
+A counter is split over ``SHARDS`` rows and each write adds its delta to
+a random one, so that concurrent transactions inserting grades do not
+all wait for the lock of a single row; reads sum the shards. Reads never
+write: a counter with no row at all is counted live until the next
+reconciliation creates it.
+"""
+import random
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, func, select, update
+
+from models import (
+    db, Absence, Course, Grade, Parent, Student, StatisticsSnapshot, Teacher, User,
+)
+from utils.counters import increment
+
+COUNTED = {
+    "total_users": User,
+    "total_students": Student,
+    "total_teachers": Teacher,
+    "total_parents": Parent,
+    "total_courses": Course,
+    "total_grades": Grade,
+    "total_absences": Absence,
+}
+_NAMES = {model: name for name, model in COUNTED.items()}
+SHARDS = 16
+
+
+def apply_count(conn, model, delta):
+    """Add ``delta`` to the counter of ``model`` on ``conn``."""
+    increment(conn, StatisticsSnapshot.__table__,
+              {"name": _NAMES[model], "shard": random.randrange(SHARDS)}, {"value": delta})
+
+
+def _inserted(mapper, connection, target):
+    apply_count(connection, mapper.class_, 1)
+
+
+def _deleted(mapper, connection, target):
+    apply_count(connection, mapper.class_, -1)
+
+
+for _model in COUNTED.values():
+    event.listen(_model, "after_insert", _inserted)
+    event.listen(_model, "after_delete", _deleted)
+
+
+def _totals():
+    table = StatisticsSnapshot.__table__
+    return dict(db.session.execute(
+        select(table.c.name, func.sum(table.c.value)).group_by(table.c.name)
+    ).all())
+
+
+def read_snapshot():
+    """Every counter in one query (plus a live count for missing ones)."""
+    totals = _totals()
+    missing = [name for name in COUNTED if name not in totals]
+    if missing:
+        current_app.logger.warning(
+            f"Statistics counters missing, counting live: {', '.join(missing)}")
+        for name in missing:
+            totals[name] = db.session.scalar(
+                select(func.count()).select_from(COUNTED[name].__table__))
+    return {name: int(totals[name]) for name in COUNTED}
+
+
+def reconcile_statistics():
+    """Recompute every counter from its table; returns the corrected drift.
+
+    The counts and the shards are read first with plain ``SELECT``s, which
+    read a consistent snapshot without locking the counted tables. Each
+    counter is then folded into its shard 0 by primary key: the other
+    shards are decreased by the values read, and shard 0 is adjusted so
+    that the total equals the count. The writes add deltas instead of
+    overwriting, so increments committed in the meantime are kept.
+    """
+    table = StatisticsSnapshot.__table__
+    counts = {name: db.session.scalar(select(func.count()).select_from(model.__table__))
+              for name, model in COUNTED.items()}
+    shards = db.session.execute(
+        select(table.c.name, table.c.shard, table.c.value).where(table.c.value != 0)
+    ).all()
+    before = {}
+    for name, shard, value in shards:
+        before[name] = before.get(name, 0) + value
+    now = datetime.utcnow()
+    conn = db.session.connection()
+    for name, shard, value in shards:
+        if shard != 0 and name in COUNTED:
+            db.session.execute(
+                update(table).where(table.c.name == name, table.c.shard == shard)
+                .values(value=table.c.value - value)
+            )
+    for name, count in counts.items():
+        folded = sum(value for n, shard, value in shards if n == name and shard != 0)
+        increment(conn, table, {"name": name, "shard": 0},
+                  {"value": count - before.get(name, 0) + folded},
+                  defaults={"reconciled_at": now}, assign={"reconciled_at": now})
+    db.session.commit()
+    return {name: count - before.get(name, 0)
+            for name, count in counts.items() if count != before.get(name, 0)}
+
+
+class StatisticsReconciler:
+    """Run :func:`reconcile_statistics` periodically in the background."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("STATS_RECONCILE_INTERVAL", 3600)
+        self.app = app
+        app.extensions["statistics_reconciler"] = self
+
+        interval = app.config["STATS_RECONCILE_INTERVAL"]
+        if interval:
+            threading.Thread(target=self._reconcile_forever, args=(interval,),
+                             daemon=True).start()
+
+    def reconcile(self):
+        with self.app.app_context():
+            drift = reconcile_statistics()
+        if drift:
+            self.app.logger.warning(f"Statistics snapshot drift corrected: {drift}")
+        return drift
+
+    def _reconcile_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.reconcile()
+            except Exception as e:
+                self.app.logger.error(f"Error reconciling statistics: {e}")
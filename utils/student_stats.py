@@ -0,0 +1,221 @@
+"""Incremental maintenance of the ``student_stats`` aggregates.
+
+Inserting, updating or deleting a ``Grade`` or ``Absence`` through the
+ORM adds the corresponding deltas to the student's row in the same
+transaction, so dashboards read one row instead of the whole history.
+The best grade is a running maximum: it is recomputed from ``grades``
+only when the current best is removed or lowered.
+
+Writes that bypass the ORM (core bulk inserts) must call
+:func:`apply_grade` / :func:`apply_absence` themselves, and
+:func:`rebuild_student_stats` repairs the table from scratch.
+"""
+from sqlalchemy import case, delete, event, func, literal, or_, select, update
+from sqlalchemy.orm.attributes import get_history
+
+from models import db, Absence, Grade, Student, StudentStats
+from utils.counters import increment, increment_many
+
+# Thresholds of the "good" and "to improve" grade counters (out of 20)
+HIGH_GRADE = 16
+LOW_GRADE = 10
+
+
+def _grade_deltas(value, sign):
+    return {
+        "grade_count": sign,
+        "grade_sum": sign * value,
+        "high_count": sign if value >= HIGH_GRADE else 0,
+        "low_count": sign if value <= LOW_GRADE else 0,
+    }
+
+
+def _add_grades(conn, student_id, values):
+    table = StudentStats.__table__
+    best, top = table.c.best_grade, max(values)
+    deltas = {"grade_count": 0, "grade_sum": 0, "high_count": 0, "low_count": 0}
+    for value in values:
+        for name, delta in _grade_deltas(value, 1).items():
+            deltas[name] += delta
+    increment(conn, table, {"student_id": student_id}, deltas,
+              defaults={"best_grade": top},
+              assign={"best_grade": case((or_(best.is_(None), best < top), literal(top)),
+                                         else_=best)})
+
+
+def apply_grade(conn, student_id, value, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) one grade on ``conn``."""
+    if sign > 0:
+        _add_grades(conn, student_id, [value])
+        return
+    table = StudentStats.__table__
+    increment(conn, table, {"student_id": student_id}, _grade_deltas(value, -1))
+    # The best grade may be gone: fall back on the remaining maximum
+    grades = Grade.__table__
+    conn.execute(
+        update(table)
+        .where(table.c.student_id == student_id, table.c.best_grade <= value)
+        .values(best_grade=select(func.max(grades.c.grade_value))
+                .where(grades.c.student_id == student_id)
+                .scalar_subquery())
+    )
+
+
+def apply_absence(conn, student_id, is_justified, sign=1):
+    """Add or remove one absence on ``conn``."""
+    increment(conn, StudentStats.__table__, {"student_id": student_id}, {
+        "absence_count": sign,
+        "unjustified_count": 0 if is_justified else sign,
+    })
+
+
+def apply_grades(conn, grades):
+    """Add many ``(student_id, value)`` grades, one update per student."""
+    by_student = {}
+    for student_id, value in grades:
+        by_student.setdefault(student_id, []).append(value)
+    for student_id, values in by_student.items():
+        _add_grades(conn, student_id, values)
+
+
+def apply_absences(conn, absences):
+    """Add many ``(student_id, is_justified)`` absences, one update per student."""
+    deltas = {}
+    for student_id, is_justified in absences:
+        counts = deltas.setdefault((student_id,), {"absence_count": 0, "unjustified_count": 0})
+        counts["absence_count"] += 1
+        counts["unjustified_count"] += 0 if is_justified else 1
+    increment_many(conn, StudentStats.__table__, ["student_id"], deltas)
+
+
+def _previous(target, *names):
+    """Committed values of ``names`` before the pending update."""
+    values = []
+    for name in names:
+        history = get_history(target, name)
+        values.append(history.deleted[0] if history.deleted else getattr(target, name))
+    return values
+
+
+def _changed(target, *names):
+    return any(get_history(target, name).has_changes() for name in names)
+
+
+@event.listens_for(Grade, "after_insert")
+def _grade_inserted(mapper, connection, target):
+    apply_grade(connection, target.student_id, target.grade_value)
+
+
+@event.listens_for(Grade, "after_update")
+def _grade_updated(mapper, connection, target):
+    if not _changed(target, "student_id", "grade_value"):
+        return
+    student_id, value = _previous(target, "student_id", "grade_value")
+    apply_grade(connection, student_id, value, -1)
+    apply_grade(connection, target.student_id, target.grade_value)
+
+
+@event.listens_for(Grade, "after_delete")
+def _grade_deleted(mapper, connection, target):
+    apply_grade(connection, target.student_id, target.grade_value, -1)
+
+
+@event.listens_for(Absence, "after_insert")
+def _absence_inserted(mapper, connection, target):
+    apply_absence(connection, target.student_id, target.is_justified)
+
+
+@event.listens_for(Absence, "after_update")
+def _absence_updated(mapper, connection, target):
+    if not _changed(target, "student_id", "is_justified"):
+        return
+    student_id, is_justified = _previous(target, "student_id", "is_justified")
+    apply_absence(connection, student_id, is_justified, -1)
+    apply_absence(connection, target.student_id, target.is_justified)
+
+
+@event.listens_for(Absence, "after_delete")
+def _absence_deleted(mapper, connection, target):
+    apply_absence(connection, target.student_id, target.is_justified, -1)
+
+
+@event.listens_for(Student, "before_delete")
+def _student_deleted(mapper, connection, target):
+    connection.execute(delete(StudentStats.__table__)
+                       .where(StudentStats.__table__.c.student_id == target.id))
+
+
+def empty_stats(student_id):
+    return StudentStats(student_id=student_id, grade_count=0, grade_sum=0,
+                        best_grade=None, high_count=0, low_count=0,
+                        absence_count=0, unjustified_count=0)
+
+
+def stats_for(student_id):
+    """Aggregates of one student, zeros when nothing was recorded yet."""
+    return db.session.get(StudentStats, student_id) or empty_stats(student_id)
+
+
+def stats_for_many(student_ids):
+    """Aggregates of several students in one query, keyed by student id."""
+    found = {}
+    if student_ids:
+        rows = StudentStats.query.filter(StudentStats.student_id.in_(student_ids)).all()
+        found = {row.student_id: row for row in rows}
+    return {sid: found.get(sid) or empty_stats(sid) for sid in student_ids}
+
+
+def rebuild_statement():
+    """``INSERT ... SELECT`` computing every row of ``student_stats``."""
+    g, a, s = Grade.__table__, Absence.__table__, Student.__table__
+    grades = (
+        select(
+            g.c.student_id,
+            func.count().label("grade_count"),
+            func.sum(g.c.grade_value).label("grade_sum"),
+            func.max(g.c.grade_value).label("best_grade"),
+            func.sum(case((g.c.grade_value >= HIGH_GRADE, 1), else_=0)).label("high_count"),
+            func.sum(case((g.c.grade_value <= LOW_GRADE, 1), else_=0)).label("low_count"),
+        )
+        .group_by(g.c.student_id)
+        .subquery()
+    )
+    absences = (
+        select(
+            a.c.student_id,
+            func.count().label("absence_count"),
+            func.sum(case((a.c.is_justified == True, 0), else_=1)).label("unjustified_count"),  # noqa: E712
+        )
+        .group_by(a.c.student_id)
+        .subquery()
+    )
+    query = (
+        select(
+            s.c.id,
+            func.coalesce(grades.c.grade_count, 0),
+            func.coalesce(grades.c.grade_sum, 0),
+            grades.c.best_grade,
+            func.coalesce(grades.c.high_count, 0),
+            func.coalesce(grades.c.low_count, 0),
+            func.coalesce(absences.c.absence_count, 0),
+            func.coalesce(absences.c.unjustified_count, 0),
+        )
+        .select_from(s)
+        .outerjoin(grades, grades.c.student_id == s.c.id)
+        .outerjoin(absences, absences.c.student_id == s.c.id)
+        .where(or_(grades.c.student_id.is_not(None), absences.c.student_id.is_not(None)))
+    )
+    table = StudentStats.__table__
+    return table.insert().from_select(
+        ["student_id", "grade_count", "grade_sum", "best_grade", "high_count",
+         "low_count", "absence_count", "unjustified_count"],
+        query,
+    )
+
+
+def rebuild_student_stats():
+    """Recompute the whole table in one transaction; returns the row count."""
+    db.session.execute(delete(StudentStats.__table__))
+    db.session.execute(rebuild_statement())
+    db.session.commit()
+    return StudentStats.query.count()
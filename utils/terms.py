@@ -0,0 +1,60 @@
+"""School terms (trimesters) identified as ``"<year>-T<n>"``.
+
+The school year starting in September ``year`` is split at the months
+of ``SCHOOL_TERM_START_MONTHS`` (September, December and March by
+default): ``2024-T2`` runs from 1 December 2024 to the end of February
+2025. Terms are derived from dates, nothing is stored.
+"""
+import re
+from datetime import date
+
+from flask import current_app
+
+_TERM_ID = re.compile(r"^(\d{4})-T(\d)$")
+
+
+def _start_months():
+    return current_app.config["SCHOOL_TERM_START_MONTHS"]
+
+
+def _month_start(year, month):
+    """First day of ``month`` counted from January of ``year`` (may exceed 12)."""
+    return date(year + (month - 1) // 12, (month - 1) % 12 + 1, 1)
+
+
+def _offsets():
+    """Months of the term starts counted from January of the school year."""
+    first = _start_months()[0]
+    return [m if m >= first else m + 12 for m in _start_months()]
+
+
+def term_bounds(term_id):
+    """``(start, end)`` dates of a term, ``end`` exclusive; ValueError if malformed."""
+    match = _TERM_ID.match(term_id or "")
+    if not match:
+        raise ValueError(f"Invalid term {term_id!r}, expected YYYY-Tn")
+    year, number = int(match.group(1)), int(match.group(2))
+    offsets = _offsets()
+    if not 1 <= number <= len(offsets):
+        raise ValueError(f"Invalid term {term_id!r}, the year has {len(offsets)} terms")
+    start = _month_start(year, offsets[number - 1])
+    end = _month_start(year, offsets[number] if number < len(offsets) else offsets[0] + 12)
+    return start, end
+
+
+def term_for(day):
+    """Id of the term containing ``day``."""
+    offsets = _offsets()
+    year = day.year if day.month >= offsets[0] else day.year - 1
+    month = day.month if day.month >= offsets[0] else day.month + 12
+    number = max(i for i, offset in enumerate(offsets, start=1) if offset <= month)
+    return f"{year}-T{number}"
+
+
+def recent_terms(count=6, day=None):
+    """Ids of the current term and the ``count - 1`` previous ones, newest first."""
+    terms = [term_for(day or date.today())]
+    while len(terms) < count:
+        start, _ = term_bounds(terms[-1])
+        terms.append(term_for(date.fromordinal(start.toordinal() - 1)))
+    return terms
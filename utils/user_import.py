@@ -0,0 +1,354 @@
+"""Streaming import of users with their profiles and parent links.
+
+Files are read row by row (``csv`` module, or openpyxl in read-only mode
+for ``.xlsx``) and processed in chunks of ``USER_IMPORT_CHUNK_SIZE``
+rows, so memory depends on the chunk size rather than the file size.
+Each row is validated with :class:`forms.UserImportRowForm`, the rules of
+the admin user form; emails and staff/student numbers must be unique in
+the database and in the file. For every chunk the passwords are hashed
+in parallel with ``PasswordHasher.hash_many``, then users, profiles and
+``parent_student`` links are written with one bulk insert per table and
+committed. Invalid rows are skipped and listed in the report.
+
+Parents reference their children by student number in the ``children``
+column (``;``-separated): the students must already exist or appear
+earlier in the file. A dry run validates everything and writes nothing.
+A CSV file that is not UTF-8 or a corrupt workbook raises
+:class:`ImportFileError` before any row is written.
+"""
+import codecs
+import csv
+import io
+import secrets
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from itertools import islice
+from zipfile import BadZipFile
+
+from flask import current_app
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+
+from forms import UserImportRowForm
+from models import db, Administrator, Parent, ParentStudent, Student, Teacher, User
+from utils.bulk import insert_rows
+from utils.hashing import hash_password
+from utils.roles import current_role_registry
+
+REQUIRED_COLUMNS = {"email", "first_name", "last_name", "role"}
+
+
+class ImportFileError(ValueError):
+    """The file cannot be read as a user import."""
+
+
+@dataclass
+class ImportReport:
+    """Outcome of an import: counters and the rejected rows."""
+
+    dry_run: bool = False
+    rows: int = 0
+    created: dict = field(default_factory=dict)
+    errors: list = field(default_factory=list)  # (line, email, message)
+
+    @property
+    def rejected(self):
+        """Number of rows with at least one error."""
+        return len({line for line, _, _ in self.errors})
+
+    @property
+    def valid(self):
+        return self.rows - self.rejected
+
+    def add_error(self, line, email, message):
+        self.errors.append((line, email, message))
+
+    def errors_csv(self):
+        out = io.StringIO()
+        self.write_errors(out)
+        return out.getvalue()
+
+    def write_errors(self, stream):
+        """Write the rejected rows as CSV (line, email, error)."""
+        writer = csv.writer(stream)
+        writer.writerow(["line", "email", "error"])
+        writer.writerows(self.errors)
+
+
+def _cell(value):
+    """XLSX cell value as the text a CSV would hold."""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _header(names):
+    header = [str(name or "").strip().lower() for name in names]
+    missing = REQUIRED_COLUMNS - set(header)
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(sorted(missing))}.")
+    return header
+
+
+def _not_utf8(line):
+    return ImportFileError(
+        f"Line {line} is not valid UTF-8: save the file as \"CSV UTF-8\" and retry.")
+
+
+def _check_utf8(stream):
+    """Decode the whole file once before any row is imported, then rewind."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    line = 1
+    for block in iter(lambda: stream.read(1 << 16), b""):
+        try:
+            decoder.decode(block)
+        except UnicodeDecodeError as e:
+            raise _not_utf8(line + e.object[:e.start].count(b"\n")) from None
+        line += block.count(b"\n")
+    try:
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise _not_utf8(line) from None
+    stream.seek(0)
+
+
+def _csv_rows(stream):
+    if stream.seekable():
+        _check_utf8(stream)
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    try:
+        header = _header(next(reader, []))
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield reader.line_num, dict(zip(header, (cell.strip() for cell in row)))
+    except UnicodeDecodeError:
+        raise _not_utf8(reader.line_num + 1) from None
+
+
+def _xlsx_rows(stream):
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException, KeyError, OSError):
+        raise ImportFileError("The file is not a valid .xlsx workbook.") from None
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _header(next(rows, ()))
+        for line, row in enumerate(rows, start=2):
+            values = [_cell(value) for value in row]
+            if any(values):
+                yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def read_rows(stream, filename):
+    """``(line, {column: text})`` pairs of a CSV or XLSX file, streamed."""
+    if filename.lower().endswith(".xlsx"):
+        return _xlsx_rows(stream)
+    if filename.lower().endswith(".csv"):
+        return _csv_rows(stream)
+    raise ImportFileError("Unsupported file type, expected .csv or .xlsx.")
+
+
+class _Importer:
+    """Validation state shared by the chunks of one import."""
+
+    def __init__(self, report):
+        self.report = report
+        self.emails = set()
+        self.student_numbers = set()
+        self.employee_numbers = set()
+        registry = current_role_registry()
+        self.role_ids = {name: registry.id_for(name)
+                         for name in ("student", "teacher", "parent", "admin")}
+
+    def _existing(self, column, values):
+        if not values:
+            return set()
+        return set(db.session.scalars(select(column).where(column.in_(values))))
+
+    def validate(self, chunk):
+        """Forms of the valid rows of ``chunk``; errors go to the report."""
+        forms = [(line, UserImportRowForm(MultiDict(row))) for line, row in chunk]
+        taken_emails = self._existing(User.email, [f.email.data for _, f in forms])
+        student_numbers = [f.student_number.data for _, f in forms if f.student_number.data]
+        employee_numbers = [f.employee_number.data for _, f in forms if f.employee_number.data]
+        taken_students = self.student_numbers | self._existing(
+            Student.student_number, student_numbers)
+        taken_employees = (self.employee_numbers
+                           | self._existing(Teacher.employee_number, employee_numbers)
+                           | self._existing(Administrator.employee_number, employee_numbers))
+        children = {n for _, f in forms if f.role.data == "parent" for n in f.child_numbers()}
+        known_children = self.student_numbers | self._existing(
+            Student.student_number, list(children - self.student_numbers))
+
+        valid = []
+        for line, form in forms:
+            errors = [] if form.validate() else [
+                f"{name}: {message}" for name, messages in form.errors.items()
+                for message in messages
+            ]
+            email, role = form.email.data, form.role.data
+            if role in self.role_ids and self.role_ids[role] is None:
+                errors.append(f"role: the {role} role does not exist.")
+            if email in taken_emails or email in self.emails:
+                errors.append("email: already in use.")
+            if role == "student" and form.student_number.data in taken_students:
+                errors.append("student_number: already in use.")
+            if role in ("teacher", "admin") and form.employee_number.data in taken_employees:
+                errors.append("employee_number: already in use.")
+            if role == "parent":
+                unknown = [n for n in form.child_numbers() if n not in known_children]
+                if unknown:
+                    errors.append(f"children: unknown student number(s) {', '.join(unknown)}.")
+            if errors:
+                for message in errors:
+                    self.report.add_error(line, email, message)
+                continue
+
+            self.emails.add(email)
+            if role == "student":
+                for numbers in (self.student_numbers, taken_students, known_children):
+                    numbers.add(form.student_number.data)
+            elif role in ("teacher", "admin"):
+                self.employee_numbers.add(form.employee_number.data)
+                taken_employees.add(form.employee_number.data)
+            form.line = line
+            valid.append(form)
+        return valid
+
+    def forget(self, forms):
+        """Release the emails and numbers of validated rows that could not
+        be saved, so that later rows neither clash with nor rely on them."""
+        for form in forms:
+            self.emails.discard(form.email.data)
+            if form.role.data == "student":
+                self.student_numbers.discard(form.student_number.data)
+            elif form.role.data in ("teacher", "admin"):
+                self.employee_numbers.discard(form.employee_number.data)
+
+    def write(self, forms):
+        """Bulk insert and commit the users, profiles and links of validated
+        rows; returns the number of rows created per table."""
+        hasher = current_app.extensions.get("password_hasher")
+        passwords = [f.password.data or secrets.token_urlsafe(16) for f in forms]
+        hashes = (hasher.hash_many(passwords) if hasher
+                  else [hash_password(p) for p in passwords])
+
+        created = {"users": insert_rows(User, [{
+            "email": f.email.data,
+            "first_name": f.first_name.data,
+            "last_name": f.last_name.data,
+            "phone": f.phone.data or None,
+            "address": f.address.data or None,
+            "birthdate": f.birthdate.data,
+            "role_id": self.role_ids[f.role.data],
+            "password_hash": pwhash,
+            "is_active": True,
+        } for f, pwhash in zip(forms, hashes)])}
+        user_ids = dict(db.session.execute(
+            select(User.email, User.id).where(User.email.in_([f.email.data for f in forms]))
+        ).all())
+
+        today = date.today()
+        by_role = {}
+        for f in forms:
+            by_role.setdefault(f.role.data, []).append(f)
+        created["students"] = insert_rows(Student, [{
+            "user_id": user_ids[f.email.data],
+            "student_number": f.student_number.data,
+            "class_name": f.class_name.data,
+            "enrollment_date": f.enrollment_date.data or today,
+        } for f in by_role.get("student", [])])
+        created["teachers"] = insert_rows(Teacher, [{
+            "user_id": user_ids[f.email.data],
+            "employee_number": f.employee_number.data,
+            "department": f.department.data,
+            "hire_date": f.hire_date.data or today,
+        } for f in by_role.get("teacher", [])])
+        created["administrators"] = insert_rows(Administrator, [{
+            "user_id": user_ids[f.email.data],
+            "employee_number": f.employee_number.data,
+            "position": f.position.data or "Administrator",
+        } for f in by_role.get("admin", [])])
+
+        parents = by_role.get("parent", [])
+        created["parents"] = insert_rows(Parent, [
+            {"user_id": user_ids[f.email.data]} for f in parents
+        ])
+        created["parent_links"] = 0
+        if parents:
+            parent_ids = dict(db.session.execute(
+                select(Parent.user_id, Parent.id)
+                .where(Parent.user_id.in_([user_ids[f.email.data] for f in parents]))
+            ).all())
+            numbers = {n for f in parents for n in f.child_numbers()}
+            student_ids = dict(db.session.execute(
+                select(Student.student_number, Student.id)
+                .where(Student.student_number.in_(numbers))
+            ).all()) if numbers else {}
+            created["parent_links"] = insert_rows(ParentStudent, [{
+                "parent_id": parent_ids[user_ids[f.email.data]],
+                "student_id": student_ids[number],
+                "relationship_type": f.relationship_type.data or "guardian",
+            } for f in parents for number in f.child_numbers()])
+        db.session.commit()
+        return created
+
+
+def _planned(forms):
+    """Rows a dry run would have created per table."""
+    roles = [f.role.data for f in forms]
+    return {
+        "users": len(forms),
+        "students": roles.count("student"),
+        "teachers": roles.count("teacher"),
+        "administrators": roles.count("admin"),
+        "parents": roles.count("parent"),
+        "parent_links": sum(len(f.child_numbers()) for f in forms if f.role.data == "parent"),
+    }
+
+
+def import_users(rows, dry_run=False, chunk_size=None):
+    """Validate and (unless ``dry_run``) create the users of ``rows``.
+
+    ``rows`` is an iterable of ``(line, {column: text})``, as produced by
+    :func:`read_rows`. Returns an :class:`ImportReport`.
+    """
+    chunk_size = chunk_size or current_app.config["USER_IMPORT_CHUNK_SIZE"]
+    report = ImportReport(dry_run=dry_run)
+    importer = _Importer(report)
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        report.rows += len(chunk)
+        forms = importer.validate(chunk)
+        if not forms:
+            continue
+        if dry_run:
+            created = _planned(forms)
+        else:
+            try:
+                created = importer.write(forms)
+            except IntegrityError as e:
+                # Rows created concurrently since validation: reject the chunk
+                db.session.rollback()
+                importer.forget(forms)
+                for form in forms:
+                    report.add_error(form.line, form.email.data, f"not saved: {e.orig}")
+                continue
+        for name, count in created.items():
+            report.created[name] = report.created.get(name, 0) + count
+    return report